@@ -0,0 +1,68 @@
+"""
+ベンチマーク共通処理。
+
+通信もDBも使わずに、関数1回あたりの実行時間とピークメモリを測る。
+"""
+import gc
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load_fixture(name: str, encoding: str) -> str:
+    """保存済みのHTMLを、実際の取得時と同じ文字コードで読み込む。"""
+    return (FIXTURES / name).read_bytes().decode(encoding, errors="replace")
+
+
+def measure(func: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    """
+    funcを繰り返し実行して1回あたりの時間（秒）を返す。
+    1ラウンドが min_time 以上になるよう回数を自動で決め、repeat ラウンドの中央値と最小値を取る。
+    """
+    # timeit と同じく、計測中はGCを止めて実行ごとのばらつきを減らす
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time or number >= 1_000_000:
+                break
+            number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+        rounds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            rounds.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {"median": statistics.median(rounds), "min": min(rounds), "loops": number}
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """funcを1回実行したときのピーク割り当て量（バイト）。"""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} µs"
@@ -0,0 +1,94 @@
+"""
+/combo の確率計算ベンチマーク。
+
+以前の包除原理（2^種類数 回の math.comb）と utils.probability.combo_probability を比べる。
+少ない種類数では全ての組み合わせで結果が一致することも確認する。
+
+    python -m benchmarks.bench_combo
+"""
+import itertools
+import math
+import random
+
+from benchmarks._harness import measure, format_seconds
+from utils.probability import combo_probability
+
+# =====================
+# 比較用：包除原理の実装（各カード1枚以上のみ対応）
+# =====================
+def inclusion_exclusion(deck_size: int, draw_count: int, copies):
+    N, n, k_list, m = deck_size, draw_count, copies, len(copies)
+    total_combinations = math.comb(N, n)
+    union_of_misses_numerator = 0
+    for i in range(1, m + 1):
+        for subset_indices in itertools.combinations(range(m), i):
+            sum_of_copies_in_subset = sum(k_list[j] for j in subset_indices)
+            term_numerator = math.comb(N - sum_of_copies_in_subset, n) if N - sum_of_copies_in_subset >= n else 0
+            union_of_misses_numerator += term_numerator if (i % 2) == 1 else -term_numerator
+    favorable_combinations = total_combinations - union_of_misses_numerator
+    return favorable_combinations / total_combinations if total_combinations > 0 else 0.0
+
+
+def brute_force(deck_size: int, draw_count: int, copies, minimums):
+    """小さな山札で全ての引き方を数える（必要枚数つきの検証用）。"""
+    deck = [i for i, c in enumerate(copies) for _ in range(c)] + [-1] * (deck_size - sum(copies))
+    hits = total = 0
+    for hand in itertools.combinations(range(deck_size), draw_count):
+        total += 1
+        drawn = [0] * len(copies)
+        for position in hand:
+            if deck[position] >= 0:
+                drawn[deck[position]] += 1
+        hits += all(d >= k for d, k in zip(drawn, minimums))
+    return hits / total
+
+
+def verify():
+    """小さな種類数で以前の実装・総当たりと一致することを確かめる。"""
+    checked = 0
+    for m in range(1, 6):
+        for copies in itertools.product(range(1, 5), repeat=m):
+            for draw_count in (5, 6, 13):
+                expected = inclusion_exclusion(40, draw_count, copies)
+                actual = combo_probability(40, draw_count, copies)
+                if not math.isclose(actual, expected, rel_tol=1e-12, abs_tol=1e-15):
+                    raise AssertionError(f"{copies} draw {draw_count}: {actual!r} != {expected!r}")
+                checked += 1
+
+    rng = random.Random(0)
+    for _ in range(200):
+        m = rng.randint(1, 3)
+        copies = [rng.randint(1, 3) for _ in range(m)]
+        minimums = [rng.randint(0, c) for c in copies]
+        deck_size = sum(copies) + rng.randint(0, 5)
+        draw_count = rng.randint(0, deck_size)
+        expected = brute_force(deck_size, draw_count, copies, minimums)
+        actual = combo_probability(deck_size, draw_count, copies, minimums)
+        if not math.isclose(actual, expected, rel_tol=1e-12, abs_tol=1e-15):
+            raise AssertionError(f"{copies} >= {minimums} in {deck_size} draw {draw_count}: {actual!r} != {expected!r}")
+        checked += 1
+    return checked
+
+
+def run():
+    """種類数ごとの計測結果を {名前: {...}} で返す。"""
+    results = {}
+    for m in (4, 8, 12, 16):
+        copies = [2] * m
+        results[f"combo.m{m}.inclusion_exclusion"] = measure(lambda: inclusion_exclusion(40, 30, copies))
+        results[f"combo.m{m}.dp"] = measure(lambda: combo_probability(40, 30, copies))
+    for m in (20, 30):
+        copies = [1] * m
+        results[f"combo.m{m}.dp"] = measure(lambda: combo_probability(40, 35, copies))
+    results["combo.minimums.dp"] = measure(lambda: combo_probability(40, 10, [4, 4, 4, 4, 2], [2, 1, 1, 1, 1]))
+    return results
+
+
+def main():
+    print(f"verified {verify()} cases against inclusion-exclusion / brute force")
+    for name, result in run().items():
+        print(f"{name:36s} {format_seconds(result['median']):>12s}/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+/draw の確率計算ベンチマーク。
+
+utils.probability の超幾何分布を、キャッシュが空の状態（起動直後・初めての山札）と
+キャッシュ済みの状態（同じ山札での2回目以降）で測る。
+math.comb で直接計算した分布と一致することも確認する。
+
+    python -m benchmarks.bench_draw
+"""
+import math
+
+from benchmarks._harness import measure, format_seconds
+from utils import probability
+from utils.probability import hypergeometric_pmf, at_least, draw_curve
+
+# (名前, 山札の枚数, 当たりの枚数, 引く枚数)
+CASES = [
+    ("opening", 40, 4, 5),
+    ("midgame", 30, 8, 12),
+    ("large_deck", 250, 20, 40),
+]
+
+
+def _clear_caches():
+    probability._pmf_table.cache_clear()
+    probability._pmf_cached.cache_clear()
+
+
+def exact_pmf(N: int, K: int, n: int):
+    total = math.comb(N, n)
+    return [math.comb(K, k) * math.comb(N - K, n - k) / total for k in range(min(n, K) + 1)]
+
+
+def verify() -> int:
+    """山札60枚までの全ての組み合わせを math.comb の計算と比べ、確認した件数を返す。"""
+    checked = 0
+    for N in range(1, 61):
+        for K in range(0, N + 1, 3):
+            for n in range(0, N + 1, 2):
+                actual, expected = hypergeometric_pmf(N, K, n), exact_pmf(N, K, n)
+                if any(abs(a - e) > 1e-12 for a, e in zip(actual, expected)):
+                    raise AssertionError(f"pmf({N}, {K}, {n}) differs: {actual} != {expected}")
+                checked += 1
+    return checked
+
+
+def _draw_command(deck_size: int, target_cards: int, draw_count: int, turns: int = 5):
+    """/draw 1回分の計算（分布・要求枚数以上の確率・ターンごとの推移）。"""
+    pmf = hypergeometric_pmf(deck_size, target_cards, draw_count)
+    return at_least(pmf, 1), draw_curve(deck_size, target_cards, draw_count, turns)
+
+
+def run():
+    """ケースごと・キャッシュの状態ごとの計測結果を {名前: {...}} で返す。"""
+    results = {}
+    for name, N, K, n in CASES:
+        def cold():
+            _clear_caches()
+            _draw_command(N, K, n)
+        results[f"draw.{name}.cold"] = measure(cold)
+        _clear_caches()
+        _draw_command(N, K, n)
+        results[f"draw.{name}.warm"] = measure(lambda: _draw_command(N, K, n))
+    _clear_caches()
+    return results
+
+
+def main():
+    print(f"verified {verify()} cases against math.comb")
+    for name, result in run().items():
+        print(f"{name:36s} {format_seconds(result['median']):>12s}/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+/gacha の抽選とメッセージ組み立てのベンチマーク。
+
+乱数のシードを固定した GachaEngine で、10連（1行ずつ表示）と1000連（集計表示）を測る。
+絵文字の置換は、カスタム絵文字を多数持つBotを想定した EmojiIndex で行う。
+
+    python -m benchmarks.bench_gacha
+"""
+import random
+
+from benchmarks._harness import measure, format_seconds
+from config import GACHA_RATES, GACHA_PRIZES
+from utils.gacha import GachaEngine, DETAIL_PULL_LIMIT
+from utils.helpers import EmojiIndex, _EMOJI_PATTERN
+
+EMOJI_COUNT = 2000
+
+
+class FakeEmoji:
+    """discord.Emoji の代わり（name と str() だけ使われる）。"""
+
+    def __init__(self, name: str, emoji_id: int):
+        self.name = name
+        self._text = f"<:{name}:{emoji_id}>"
+
+    def __str__(self) -> str:
+        return self._text
+
+
+def _emojis():
+    # 景品文に含まれる :name: は全て解決できるようにし、残りは無関係な絵文字で埋める
+    names = sorted({name for prizes in GACHA_PRIZES.values() for prize in prizes for name in _EMOJI_PATTERN.findall(prize)})
+    names += [f"filler_{i}" for i in range(max(0, EMOJI_COUNT - len(names)))]
+    return [FakeEmoji(name, 10**17 + i) for i, name in enumerate(names)]
+
+
+def _message(engine: GachaEngine, index: EmojiIndex, count: int) -> str:
+    """EconomyCog.gacha と同じ形のメッセージを組み立てる。"""
+    if count <= DETAIL_PULL_LIMIT:
+        return "\n".join(f"**【{pull.rarity}】** {index.format(pull.prize)}" for pull in engine.pull(count))
+    summary = engine.pull_summary(count)
+    lines = [f"【{rarity}】 × {n}" for rarity, n in summary.counts]
+    lines.append(f"最高レア: **【{summary.best.rarity}】** {index.format(summary.best.prize)}")
+    return "\n".join(lines)
+
+
+def run():
+    """抽選・絵文字索引の作り直し・メッセージ組み立ての計測結果を {名前: {...}} で返す。"""
+    engine = GachaEngine(GACHA_RATES, GACHA_PRIZES, rng=random.Random(1234))
+    emojis = _emojis()
+    index = EmojiIndex(static_texts=engine.prize_texts())
+    index.rebuild(emojis)
+
+    results = {
+        "gacha.pull10": measure(lambda: engine.pull(10)),
+        "gacha.pull_summary1000": measure(lambda: engine.pull_summary(1000)),
+        "gacha.message10": measure(lambda: _message(engine, index, 10)),
+        "gacha.message1000": measure(lambda: _message(engine, index, 1000)),
+        f"emoji.rebuild{EMOJI_COUNT}": measure(lambda: index.rebuild(emojis)),
+    }
+    # 景品文以外（事前置換されていない文字列）の置換
+    text = "今日の結果 :" + emojis[0].name + ": と :unknown_emoji: と :" + emojis[-1].name + ":"
+    results["emoji.format_dynamic"] = measure(lambda: index.format(text))
+    return results
+
+
+def main():
+    for name, result in run().items():
+        print(f"{name:36s} {format_seconds(result['median']):>12s}/call")
+
+
+if __name__ == "__main__":
+    main()
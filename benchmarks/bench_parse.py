@@ -0,0 +1,114 @@
+"""
+スクレイパーのHTML解析ベンチマーク。
+
+保存済みの schedulehost / scheduledetail / userresult ページを使い、
+以前の全体解析（BeautifulSoup(html, "html.parser")）と utils.scraper の解析を比べる。
+結果が一致することも確認する。
+
+    python -m benchmarks.bench_parse
+
+benchmarks/fixtures のページは capture_fixtures で実際のサイトから取り直せる
+（python -m benchmarks.capture_fixtures --player-id <DMPSプレイヤーID>）。
+"""
+import re
+from datetime import datetime
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from benchmarks._harness import load_fixture, measure, peak_memory, format_seconds
+from config import BASE_URL
+import utils.scraper as scraper
+
+# =====================
+# 比較用：全体を解析していた頃の実装
+# =====================
+def full_parse_schedule(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", id="main")
+    if not table:
+        return None
+    tournaments = []
+    for row in table.find_all("tr")[1:]:
+        cols = row.find_all("td")
+        if len(cols) < 8:
+            continue
+        onclick = row.get("onclick", "")
+        relative_url = onclick.split("'")[1] if "'" in onclick else ""
+        try:
+            tournaments.append({
+                "date": datetime.strptime(cols[0].get_text(strip=True), "%y/%m/%d").date(),
+                "name": cols[2].get_text(strip=True),
+                "format": cols[4].get_text(strip=True),
+                "capacity": cols[6].get_text(strip=True),
+                "time": cols[7].get_text(strip=True),
+                "url": urljoin(BASE_URL, relative_url),
+            })
+        except ValueError:
+            continue
+    return tournaments
+
+
+def full_parse_tonamel_url(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    for keyword in ("大会HP", "リモート使用アプリ"):
+        span = soup.find("span", string=re.compile(keyword))
+        if not span:
+            continue
+        td = span.find_parent("td")
+        if not td:
+            continue
+        a = td.find("a", href=True)
+        if a and "tonamel.com" in a["href"]:
+            return a["href"]
+    return ""
+
+
+def full_parse_dmps_stats(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    ranking_td = soup.find("td", class_="tx2022", align="left")
+    if not ranking_td:
+        return None
+    spans_20px = ranking_td.find_all("span", style="font-size:20px;")
+    if len(spans_20px) < 2:
+        return None
+    return {
+        "rank": int(re.sub(r"\D", "", spans_20px[0].get_text())),
+        "points": int(re.sub(r"\D", "", spans_20px[1].get_text())),
+    }
+
+
+PAGES = [
+    ("schedulehost", "schedulehost.html", "shift_jis", full_parse_schedule, scraper.parse_schedule),
+    ("scheduledetail", "scheduledetail.html", "cp932", full_parse_tonamel_url, scraper.parse_tonamel_url),
+    ("userresult", "userresult.html", "shift_jis", full_parse_dmps_stats, scraper.parse_dmps_stats),
+]
+
+
+def run():
+    """各ページ・各解析方法の計測結果を {名前: {...}} で返す。"""
+    results = {}
+    for page, fixture, encoding, full_parse, fast_parse in PAGES:
+        html = load_fixture(fixture, encoding)
+        expected = full_parse(html)
+        if not expected:
+            raise AssertionError(f"{page}: fixture did not parse")
+
+        timing = measure(lambda: full_parse(html))
+        results[f"parse.{page}.full"] = {**timing, "peak_bytes": peak_memory(lambda: full_parse(html))}
+
+        actual = fast_parse(html)
+        if actual != expected:
+            raise AssertionError(f"{page}: result differs from the full parse\n{actual!r}\n!=\n{expected!r}")
+        timing = measure(lambda: fast_parse(html))
+        results[f"parse.{page}.scraper"] = {**timing, "peak_bytes": peak_memory(lambda: fast_parse(html))}
+    return results
+
+
+def main():
+    for name, result in run().items():
+        print(f"{name:42s} {format_seconds(result['median']):>12s}/page   peak {result['peak_bytes'] / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+所得税の税額計算のベンチマーク（DB不要）。
+
+10万人分の「前回課税時からの増加額」に対して calculate_income_tax を適用する。
+徴収そのものは集合演算SQLで行っている（DB込みの計測は bench_tax_db）ので、
+calculate_income_tax は以前のPython実装を比較用に残したもの。
+ここでは税率表の当てはめ部分と、各区分の境界での税額が変わっていないことを確認する。
+
+    python -m benchmarks.bench_tax
+"""
+import random
+
+from benchmarks._harness import measure, format_seconds
+from config import TAX_BRACKETS
+
+USERS = 100_000
+
+# 各区分の上限とその1つ上での税額（税率表を変えたらここも更新する）
+EXPECTED = {
+    0: 0, 1: 0, 19500: 975, 19501: 980, 33000: 2330, 33001: 2330, 69500: 9630, 69501: 9625,
+    90000: 14340, 90001: 14340, 180000: 44040, 180001: 44040, 400000: 132040, 400001: 132040, 1000000: 402040,
+}
+
+
+def calculate_income_tax(increase: int) -> int:
+    """
+    以前の utils.helpers.calculate_income_tax（1ユーザーずつPythonで税額を出していた頃の実装）。
+    UserRepository._collect_income_tax のSQLはこれと同じ結果になるように書かれている。
+    """
+    if increase <= 0:
+        return 0
+    for upper_limit, tax_rate, deduction in TAX_BRACKETS:
+        if increase <= upper_limit:
+            return max(int((increase * tax_rate) - deduction), 0)
+    return 0
+
+
+def verify() -> int:
+    for increase, tax in EXPECTED.items():
+        actual = calculate_income_tax(increase)
+        if actual != tax:
+            raise AssertionError(f"calculate_income_tax({increase}) = {actual}, expected {tax}")
+    return len(EXPECTED)
+
+
+def _increases():
+    # 少額の利用者が多く、一部が大きく増えている分布
+    rng = random.Random(42)
+    return [int(rng.lognormvariate(9, 1.5)) - 2000 for _ in range(USERS)]
+
+
+def run():
+    increases = _increases()
+    return {
+        f"tax.calculate.{USERS // 1000}k_users": measure(lambda: sum(calculate_income_tax(x) for x in increases), repeat=3),
+        f"tax.boundaries{len(EXPECTED)}": measure(lambda: [calculate_income_tax(x) for x in EXPECTED]),
+    }
+
+
+def main():
+    print(f"verified {verify()} bracket boundaries")
+    for name, result in run().items():
+        print(f"{name:36s} {format_seconds(result['median']):>12s}/call")
+
+
+if __name__ == "__main__":
+    main()
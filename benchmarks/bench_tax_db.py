@@ -0,0 +1,168 @@
+"""
+週次所得税の徴収ベンチマーク（ローカルのPostgreSQLが必要）。
+
+専用スキーマに10万人分のユーザーを作り、以前の1ユーザー1UPDATE方式と
+UserRepository の集合演算SQLを同じデータで実行して、時間と結果を比べる。
+徴収総額・課税人数・全ユーザーの最終残高が一致しなければ失敗する。
+先に、集合演算SQLで各区分の境界の税額が bench_tax.EXPECTED と一致することも確認する。
+
+    python -m benchmarks.bench_tax_db --database-url postgresql://postgres@localhost/postgres [--users 100000]
+    （BENCH_DATABASE_URL 環境変数でも指定できる）
+
+BENCH_DATABASE_URL があれば run_all からも実行される（run() で集合演算SQLだけを計測する）。
+"""
+import argparse
+import os
+import statistics
+import time
+from typing import Dict
+
+import psycopg2
+import psycopg2.extras
+
+from benchmarks.bench_tax import EXPECTED, calculate_income_tax
+from utils.repository import UserRepository
+
+SCHEMA = "bench_tax"
+RUN_ALL_USERS = 20_000
+
+
+def legacy_collect_income_tax(conn):
+    """以前の EconomyCog.collect_income_tax と同じ、1ユーザーずつ UPDATE する方式。"""
+    total_tax_collected, users_taxed_count = 0, 0
+    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+        cur.execute("SELECT user_id, credits, last_taxed_credits FROM users WHERE credits > 0")
+        for user in cur.fetchall():
+            increase = user['credits'] - (user['last_taxed_credits'] or 0)
+            tax_amount = calculate_income_tax(increase)
+            if tax_amount > 0:
+                new_credits = user['credits'] - tax_amount
+                cur.execute("UPDATE users SET credits = %s, last_taxed_credits = %s WHERE user_id = %s", (new_credits, new_credits, user['user_id']))
+                total_tax_collected += tax_amount
+                users_taxed_count += 1
+            else:
+                cur.execute("UPDATE users SET last_taxed_credits = %s WHERE user_id = %s", (user['credits'], user['user_id']))
+    conn.commit()
+    return total_tax_collected, users_taxed_count
+
+
+def seed(conn, users: int):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path TO {SCHEMA}")
+        cur.execute("SELECT setseed(0.42)")
+        # 残高0・減少・各税率帯の増加がまんべんなく出るように分布させる
+        cur.execute("""
+            CREATE TABLE users_seed AS
+            SELECT g AS user_id,
+                   c AS credits,
+                   CASE WHEN random() < 0.2 THEN NULL ELSE GREATEST(c - (random() * 500000)::int + 50000, 0) END AS last_taxed_credits
+            FROM (SELECT g, (CASE WHEN random() < 0.1 THEN 0 ELSE (random() * 600000)::int END) AS c
+                  FROM generate_series(1, %s) g) s
+        """, (users,))
+    conn.commit()
+
+
+def verify(conn) -> int:
+    """seed() の後に呼ぶ。UserRepository._collect_income_tax のSQLで、各区分の境界の税額が EXPECTED どおりか確認する。"""
+    increases = list(EXPECTED)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS users")
+            cur.execute("CREATE TABLE users (user_id BIGINT PRIMARY KEY, credits BIGINT, last_taxed_credits BIGINT)")
+            psycopg2.extras.execute_values(cur, "INSERT INTO users VALUES %s",
+                                           [(i, increase, 0) for i, increase in enumerate(increases)])
+        UserRepository._collect_income_tax(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT user_id, credits FROM users")
+            after = dict(cur.fetchall())
+    finally:
+        conn.rollback()
+    for user_id, increase in enumerate(increases):
+        tax = increase - after[user_id]
+        if tax != EXPECTED[increase]:
+            raise AssertionError(f"income tax SQL for increase {increase} = {tax}, expected {EXPECTED[increase]}")
+    return len(increases)
+
+
+def reset_users(conn):
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS users")
+        cur.execute("CREATE TABLE users AS SELECT * FROM users_seed")
+        cur.execute("ALTER TABLE users ADD PRIMARY KEY (user_id)")
+        cur.execute("ANALYZE users")
+    conn.commit()
+
+
+def timed(func, conn):
+    start = time.perf_counter()
+    result = func(conn)
+    conn.commit()
+    return result, time.perf_counter() - start
+
+
+def drop_schema(conn):
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    conn.commit()
+
+
+def run(database_url: str, users: int = RUN_ALL_USERS, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """run_all 用。境界の税額を確認してから、集合演算SQLでの徴収を repeat 回（毎回データを戻して）測る。"""
+    conn = psycopg2.connect(database_url)
+    try:
+        seed(conn, users)
+        verify(conn)
+        rounds = []
+        for _ in range(repeat):
+            reset_users(conn)
+            rounds.append(timed(UserRepository._collect_income_tax, conn)[1])
+    finally:
+        drop_schema(conn)
+        conn.close()
+    return {f"tax_db.collect.{users // 1000}k_users": {"median": statistics.median(rounds), "min": min(rounds), "loops": 1}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url か BENCH_DATABASE_URL を指定してください。")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        print(f"Seeding {args.users} users...")
+        seed(conn, args.users)
+        print(f"Verified {verify(conn)} bracket boundaries against the income tax SQL.")
+
+        reset_users(conn)
+        legacy_result, legacy_seconds = timed(legacy_collect_income_tax, conn)
+        with conn.cursor() as cur:
+            cur.execute("ALTER TABLE users RENAME TO users_legacy")
+        conn.commit()
+
+        reset_users(conn)
+        set_based_result, set_based_seconds = timed(UserRepository._collect_income_tax, conn)
+
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT count(*) FROM users n FULL JOIN users_legacy o USING (user_id)
+                WHERE n.credits IS DISTINCT FROM o.credits OR n.last_taxed_credits IS DISTINCT FROM o.last_taxed_credits
+            """)
+            mismatched_rows = cur.fetchone()[0]
+
+        print(f"legacy (row by row) : {legacy_seconds:8.3f} s  total={legacy_result[0]} taxed={legacy_result[1]}")
+        print(f"set-based SQL       : {set_based_seconds:8.3f} s  total={set_based_result[0]} taxed={set_based_result[1]}")
+        print(f"speedup             : {legacy_seconds / set_based_seconds:8.1f}x")
+        if legacy_result != set_based_result or mismatched_rows:
+            raise SystemExit(f"Results differ! ({mismatched_rows} rows mismatched)")
+        print("Results match.")
+    finally:
+        drop_schema(conn)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
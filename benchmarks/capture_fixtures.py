@@ -0,0 +1,65 @@
+"""
+bench_parse 用のページを実際のサイトから取得して benchmarks/fixtures に保存する（要ネットワーク）。
+
+大会一覧（schedulehost）、その先頭の大会の詳細ページ（scheduledetail）、
+指定したプレイヤーの成績ページ（userresult）を、受け取ったバイト列のまま保存する。
+utils.scraper で解析できなかったページは保存しない。
+
+    python -m benchmarks.capture_fixtures --player-id 123456
+    python -m benchmarks.capture_fixtures --player-id 123456 --detail-url https://... --output-dir /tmp/fixtures
+
+userresult にはプレイヤー名が含まれるので、コミットする前に中身を確認すること。
+"""
+import argparse
+import asyncio
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+
+from benchmarks._harness import FIXTURES
+from config import BASE_URL, DMPS_BASE_URL
+from utils.scraper import USER_AGENT, parse_dmps_stats, parse_schedule, parse_tonamel_url
+
+
+async def _get(session: aiohttp.ClientSession, url: str) -> bytes:
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.read()
+
+
+async def capture(player_id: str, detail_url: Optional[str], output_dir: Path) -> List[str]:
+    async with aiohttp.ClientSession(headers={"User-Agent": USER_AGENT},
+                                     timeout=aiohttp.ClientTimeout(total=30)) as session:
+        schedule = await _get(session, BASE_URL)
+        tournaments = parse_schedule(schedule.decode("shift_jis", errors="replace"))
+        if not tournaments:
+            raise SystemExit("schedulehost: table#main not found")
+        detail_url = detail_url or tournaments[0]["url"]
+        detail = await _get(session, detail_url)
+        # 詳細ページにTonamelのリンクが無い大会もあるので、解析できること（例外が出ないこと）だけ確かめる
+        parse_tonamel_url(detail.decode("cp932", errors="replace"))
+        result = await _get(session, f"{DMPS_BASE_URL}?UserID={player_id}")
+        if parse_dmps_stats(result.decode("shift_jis", errors="replace")) is None:
+            raise SystemExit(f"userresult: no ranking found for player {player_id}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    saved = []
+    for name, data in (("schedulehost.html", schedule), ("scheduledetail.html", detail), ("userresult.html", result)):
+        (output_dir / name).write_bytes(data)
+        saved.append(f"{name} ({len(data) / 1024:.1f} KiB)")
+    return saved
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--player-id", required=True, help="userresult を取得するDMPSプレイヤーID")
+    parser.add_argument("--detail-url", help="保存する大会詳細ページ（既定は一覧の先頭の大会）")
+    parser.add_argument("--output-dir", type=Path, default=FIXTURES)
+    args = parser.parse_args(argv)
+    for line in asyncio.run(capture(args.player_id, args.detail_url, args.output_dir)):
+        print(f"saved {line}")
+
+
+if __name__ == "__main__":
+    main()
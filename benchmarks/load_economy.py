@@ -0,0 +1,472 @@
+"""
+経済コマンド（/daily, /gacha, /slot, /gift）の同時実行の負荷試験（ローカルのPostgreSQLが必要）。
+
+EconomyCog のハンドラを偽の Interaction で直接呼び出し、N人のユーザーが同時に
+コマンドを打ち続ける状況を再現する。DBは専用スキーマに最新のマイグレーションを適用して使う。
+/gift の一部を少数の「人気アカウント」に集中させ、行ロックの競合も起こせる。
+
+    python -m benchmarks.load_economy --database-url postgresql://postgres@localhost/postgres
+    python -m benchmarks.load_economy --users 500 --concurrency 200 --duration 20 --hotspot 0.8
+    python -m benchmarks.load_economy --balance-cache off     # 残高キャッシュ無し（毎回 SELECT ... FOR UPDATE）
+    （BENCH_DATABASE_URL 環境変数でも指定できる）
+
+スループット、コマンドごとのレイテンシのパーセンタイル（とそのうちのDB時間）、
+DBでロック待ちになっていた接続数・接続プールの空き待ち、デッドロック数を表示する。
+最後に残高がマイナスになったユーザーがいないことを確認する。
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import psycopg2
+
+from config import DB_POOL_MAX_SIZE, BALANCE_CACHE_IDLE_SECONDS
+from utils.animation import AnimationScheduler
+from utils.database import DatabasePool
+from utils.migrations import migrate
+from utils.perf import PerfRecorder
+from utils.repository import UserRepository, create_db_executor
+from utils.helpers import EmojiIndex
+from utils.gacha import gacha_engine
+import cogs.economy as economy
+
+SCHEMA = "bench_load"
+USER_ID_BASE = 10 ** 17
+COMMANDS = ("daily", "gacha", "slot", "gift")
+
+
+# =====================
+# 偽の Discord オブジェクト
+# =====================
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.display_name = f"user{user_id - USER_ID_BASE}"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+
+class FakeMessage:
+    _ids = itertools.count(1)
+
+    def __init__(self, content=None, embed=None, view=None):
+        self.id = next(self._ids)
+        self.content = content
+        self.embeds = [embed] if embed is not None else []
+        self.view = view
+
+    async def edit(self, **kwargs):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage()
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction", api_latency: float):
+        self._interaction = interaction
+        self._api_latency = api_latency
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+        if self._api_latency:
+            await asyncio.sleep(self._api_latency)
+
+    async def send_message(self, content=None, *, embed=None, view=None, ephemeral=False, **kwargs):
+        await self._respond()
+        self._interaction.sent = FakeMessage(content, embed, view)
+
+    async def edit_message(self, **kwargs):
+        await self._respond()
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+
+class FakeFollowup:
+    async def send(self, content=None, **kwargs):
+        return FakeMessage(content)
+
+
+class FakeInteraction:
+    def __init__(self, client, user: FakeUser, channel: FakeChannel, api_latency: float = 0.0):
+        self.client = client
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = None
+        self.response = FakeResponse(self, api_latency)
+        self.followup = FakeFollowup()
+        self.sent: Optional[FakeMessage] = None
+
+    async def original_response(self) -> FakeMessage:
+        return self.sent
+
+
+class LoadBot:
+    """EconomyCog と SlotView が使う部分だけを持つBotの代わり。"""
+
+    def __init__(self, user_repo: UserRepository, animations: AnimationScheduler):
+        self.user_repo = user_repo
+        self.animations = animations
+        self.emoji_index = EmojiIndex(static_texts=gacha_engine.prize_texts())
+        # seed() でマイグレーション済み
+        self.db_ready = asyncio.Event()
+        self.db_ready.set()
+
+    async def wait_until_ready(self):
+        pass
+
+    def get_channel(self, channel_id: int):
+        return None
+
+
+class LocalPool(DatabasePool):
+    """DATABASE_URL（sslmode=require）ではなく、指定したローカルDBの専用スキーマにつなぐプール。"""
+
+    def __init__(self, database_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.database_url = database_url
+
+    def _connect(self):
+        conn = psycopg2.connect(self.database_url, options=f"-c search_path={SCHEMA}")
+        with self._cond:
+            self._created += 1
+        return conn
+
+
+class PrintCounter(io.TextIOBase):
+    """ハンドラが print するエラーを画面に流さずに数える。"""
+
+    def __init__(self):
+        self.lines: Counter = Counter()
+
+    def write(self, text: str) -> int:
+        # print 1回が write 1回（と改行）になるので、複数行のメッセージは1行目で数える
+        if text.strip():
+            self.lines[text.strip().splitlines()[0][:100]] += 1
+        return len(text)
+
+
+# =====================
+# DBの準備と観測
+# =====================
+def seed(database_url: str, users: int, initial_credits: int):
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+    finally:
+        conn.close()
+
+    # migrate() はロールバックすることがあるので、SET ではなく接続時に search_path を指定する
+    conn = psycopg2.connect(database_url, options=f"-c search_path={SCHEMA}")
+    try:
+        migrate(conn)
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO users (user_id, credits) SELECT %s + g, %s FROM generate_series(0, %s - 1) g",
+                        (USER_ID_BASE, initial_credits, users))
+            cur.execute("ANALYZE users")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def deadlock_count(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+        return cur.fetchone()[0]
+
+
+class LockSampler:
+    """
+    別スレッドで一定間隔ごとに、DBで行ロック待ちになっている接続数と、接続プールの空き待ちの数を数える。
+    """
+
+    def __init__(self, database_url: str, pool: DatabasePool, interval: float = 0.02):
+        self.conn = psycopg2.connect(database_url)
+        self.conn.autocommit = True
+        self.pool = pool
+        self.interval = interval
+        self.db_waiting: List[int] = []
+        self.pool_waiting: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lock-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.conn.close()
+
+    def _run(self):
+        with self.conn.cursor() as cur:
+            while not self._stop.wait(self.interval):
+                cur.execute("""
+                    SELECT count(*) FROM pg_stat_activity
+                    WHERE datname = current_database() AND wait_event_type = 'Lock'
+                """)
+                self.db_waiting.append(cur.fetchone()[0])
+                self.pool_waiting.append(self.pool.stats()["waiting"])
+
+    def summary(self) -> Dict:
+        def describe(samples: List[int]) -> Dict:
+            if not samples:
+                return {"max": 0, "mean": 0.0, "busy_fraction": 0.0, "waiter_seconds": 0.0}
+            return {
+                "max": max(samples),
+                "mean": sum(samples) / len(samples),
+                "busy_fraction": sum(1 for s in samples if s) / len(samples),
+                # 待っていた接続数 × 時間 の概算
+                "waiter_seconds": sum(samples) * self.interval,
+            }
+        return {"db_lock_waits": describe(self.db_waiting), "pool_waits": describe(self.pool_waiting)}
+
+
+# =====================
+# 負荷
+# =====================
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in COMMANDS:
+            raise ValueError(f"unknown command in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadTest:
+    def __init__(self, args, cog, bot: LoadBot, recorder: PerfRecorder):
+        self.args = args
+        self.cog = cog
+        self.bot = bot
+        self.recorder = recorder
+        self.users = [FakeUser(USER_ID_BASE + i) for i in range(args.users)]
+        self.channels = [FakeChannel(1000 + i) for i in range(args.channels)]
+        mix = parse_mix(args.mix)
+        self.commands, self.weights = list(mix), list(mix.values())
+        self.operations = 0
+        self.interactions = 0
+
+    def _interaction(self, user: FakeUser, channel: FakeChannel) -> FakeInteraction:
+        self.interactions += 1
+        return FakeInteraction(self.bot, user, channel, self.args.api_latency_ms / 1000)
+
+    def _gift_target(self, rng: random.Random, sender: FakeUser) -> FakeUser:
+        if rng.random() < self.args.hotspot:
+            target = self.users[rng.randrange(self.args.hot_accounts)]
+            if target is not sender:
+                return target
+        while True:
+            target = rng.choice(self.users)
+            if target is not sender:
+                return target
+
+    async def _run_command(self, name: str, user: FakeUser, channel: FakeChannel, rng: random.Random):
+        interaction = self._interaction(user, channel)
+        with self.recorder.span("command", name):
+            if name == "daily":
+                await self.cog.daily_slash.callback(self.cog, interaction)
+            elif name == "gacha":
+                await self.cog.gacha_slash.callback(self.cog, interaction, self.args.gacha_count)
+            elif name == "slot":
+                await self.cog.slot_slash.callback(self.cog, interaction, self.args.slot_bet)
+            else:
+                await self.cog.gift_slash.callback(self.cog, interaction, self._gift_target(rng, user), self.args.gift_amount)
+        self.operations += 1
+
+        # スロットは3回ストップを押して精算まで行う
+        view = interaction.sent.view if name == "slot" and interaction.sent is not None else None
+        for _ in range(3 if view is not None else 0):
+            with self.recorder.span("command", "slot stop"):
+                await view.stop_callback(self._interaction(user, channel))
+
+    async def _user_loop(self, index: int, deadline: float):
+        rng = random.Random(self.args.seed * 100_003 + index)
+        user = self.users[index % len(self.users)]
+        channel = self.channels[index % len(self.channels)]
+        while time.monotonic() < deadline:
+            name = rng.choices(self.commands, weights=self.weights)[0]
+            await self._run_command(name, user, channel, rng)
+            if self.args.think_ms:
+                await asyncio.sleep(rng.expovariate(1000 / self.args.think_ms))
+
+    async def run(self) -> float:
+        started = time.monotonic()
+        deadline = started + self.args.duration
+        await asyncio.gather(*(self._user_loop(i, deadline) for i in range(self.args.concurrency)))
+        return time.monotonic() - started
+
+
+async def run_load(args) -> Dict:
+    seed(args.database_url, args.users, args.initial_credits)
+    pool = LocalPool(args.database_url, min_size=args.pool_size, max_size=args.pool_size)
+    executor = create_db_executor(pool)
+    journal_dir = tempfile.mkdtemp(prefix="load_economy_")
+    repo = UserRepository(
+        pool, executor,
+        balance_journal_path=os.path.join(journal_dir, "journal.jsonl") if args.balance_cache == "on" else None,
+        balance_idle_seconds=BALANCE_CACHE_IDLE_SECONDS
+    )
+    animations = AnimationScheduler()
+    bot = LoadBot(repo, animations)
+    recorder = PerfRecorder(sample_size=10_000_000, slow_threshold=math.inf)
+
+    await asyncio.to_thread(pool.warmup)
+    stats_conn = psycopg2.connect(args.database_url)
+    stats_conn.autocommit = True
+    deadlocks_before = deadlock_count(stats_conn)
+    sampler = LockSampler(args.database_url, pool)
+    printed = PrintCounter()
+    economy.last_slot_messages.clear()
+
+    with contextlib.redirect_stdout(printed):
+        # 残高キャッシュの定期反映ループも本番と同じく動かす
+        cog = economy.EconomyCog(bot)
+        test = LoadTest(args, cog, bot, recorder)
+        sampler.start()
+        try:
+            elapsed = await test.run()
+        finally:
+            sampler.stop()
+            cog.cog_unload()
+            await animations.close()
+            pending_entries = 0
+            if repo.balances is not None:
+                await repo.flush_balances()
+                pending_entries = repo.balances.stats()["pending_entries"]
+                repo.balances.journal.close()
+
+    # 他の接続の統計がpg_stat_databaseに反映されるのを待つ
+    await asyncio.sleep(1.1)
+    deadlocks = deadlock_count(stats_conn) - deadlocks_before
+    with stats_conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FILTER (WHERE credits < 0), sum(credits) FROM {SCHEMA}.users")
+        negative_balances, total_credits = cur.fetchone()
+    stats_conn.close()
+
+    await asyncio.to_thread(executor.shutdown)
+    pool.close()
+    shutil.rmtree(journal_dir, ignore_errors=True)
+    if not args.keep:
+        conn = psycopg2.connect(args.database_url)
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "database_url"},
+        "elapsed_seconds": elapsed,
+        "operations": test.operations,
+        "interactions": test.interactions,
+        "throughput_ops": test.operations / elapsed,
+        "throughput_interactions": test.interactions / elapsed,
+        "commands": recorder.summary("command"),
+        "locks": sampler.summary(),
+        "deadlocks": deadlocks,
+        "negative_balances": negative_balances,
+        "pending_entries": pending_entries,
+        "total_credits": int(total_credits or 0),
+        "errors": printed.lines.most_common(10),
+    }
+
+
+def print_report(report: Dict):
+    config = report["config"]
+    print(f"users={config['users']} concurrency={config['concurrency']} pool={config['pool_size']} "
+          f"balance_cache={config['balance_cache']} hotspot={config['hotspot']:.0%}→{config['hot_accounts']} "
+          f"mix={config['mix']} api_latency={config['api_latency_ms']}ms")
+    print(f"{report['operations']} commands / {report['interactions']} interactions in {report['elapsed_seconds']:.1f}s "
+          f"→ {report['throughput_ops']:.0f} commands/s ({report['throughput_interactions']:.0f} interactions/s)")
+    print()
+    print(f"{'command':12s} {'count':>8s} {'failed':>7s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'db mean':>9s}")
+    for row in sorted(report["commands"], key=lambda row: row["name"]):
+        failed = row["count"] - row["outcomes"].get("ok", 0)
+        print(f"{row['name']:12s} {row['count']:8d} {failed:7d} "
+              + " ".join(f"{row[key] * 1000:7.1f}ms" for key in ("p50", "p95", "p99", "db_mean")))
+    print()
+    for label, key in (("DB row-lock waiters", "db_lock_waits"), ("pool waiters", "pool_waits")):
+        waits = report["locks"][key]
+        print(f"{label:20s} max {waits['max']:4d}  mean {waits['mean']:6.2f}  "
+              f"non-zero {waits['busy_fraction']:6.1%} of samples  ≈{waits['waiter_seconds']:.1f} waiter-seconds")
+    print(f"{'deadlocks':20s} {report['deadlocks']}")
+    print(f"{'negative balances':20s} {report['negative_balances']}")
+    print(f"{'unflushed entries':20s} {report['pending_entries']}")
+    if report["errors"]:
+        print("\nhandler output (most common):")
+        for line, count in report["errors"]:
+            print(f"  {count:6d} × {line}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--users", type=int, default=200, help="登録済みユーザー数")
+    parser.add_argument("--concurrency", type=int, default=50, help="同時にコマンドを打ち続けるユーザー数")
+    parser.add_argument("--duration", type=float, default=10.0, help="秒")
+    parser.add_argument("--mix", default="daily=1,gacha=3,slot=2,gift=4", help="コマンドの比率")
+    parser.add_argument("--hotspot", type=float, default=0.5, help="/gift のうち人気アカウント宛ての割合")
+    parser.add_argument("--hot-accounts", type=int, default=1, help="人気アカウントの数")
+    parser.add_argument("--pool-size", type=int, default=DB_POOL_MAX_SIZE)
+    parser.add_argument("--balance-cache", choices=("on", "off"), default="on")
+    parser.add_argument("--channels", type=int, default=20, help="スロットを回すチャンネル数")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Discordへの応答1回にかかる時間の想定")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="ユーザーがコマンドの間に空ける平均時間")
+    parser.add_argument("--initial-credits", type=int, default=1_000_000)
+    parser.add_argument("--gacha-count", type=int, default=1)
+    parser.add_argument("--slot-bet", type=int, default=100)
+    parser.add_argument("--gift-amount", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    parser.add_argument("--keep", action="store_true", help="終了後も専用スキーマを残す")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url か BENCH_DATABASE_URL を指定してください。")
+    if not 1 <= args.hot_accounts <= args.users or args.users < 2:
+        parser.error("--users は2以上、--hot-accounts は1以上 --users 以下にしてください。")
+    parse_mix(args.mix)
+
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    if report["negative_balances"] or report["pending_entries"]:
+        raise SystemExit(f"{report['negative_balances']} negative balance(s), "
+                         f"{report['pending_entries']} unflushed ledger entries!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+オフラインのベンチマークをまとめて実行し、コミット間で比較できるJSONに保存する。
+
+通信は使わない（スクレイパーは benchmarks/fixtures の保存済みHTMLを使う）。
+DBが必要なスイート（tax_db）は BENCH_DATABASE_URL がある時だけ実行し、無ければ skipped と表示する。
+比較には各計測の最小値（min）を使う。ノイズで遅くなることはあっても速くなることは無いため。
+各スイートは --repeat 回（既定3回）実行し、最も速かった回を残す。
+
+    python -m benchmarks.run_all                                  # 実行して表示
+    python -m benchmarks.run_all --output before.json             # 結果を保存
+    python -m benchmarks.run_all --compare before.json            # 保存した結果と比べる
+    python -m benchmarks.run_all --only parse,tax --threshold 0.2 # 一部だけ、20%以上の悪化で失敗
+
+--compare で threshold を超えて遅くなった計測があれば終了コード1で終わる。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks import bench_combo, bench_draw, bench_gacha, bench_parse, bench_tax, bench_tax_db
+from benchmarks._harness import format_seconds
+
+# (名前, 正しさの確認, 計測)。確認が無いものは計測の中で確認している
+SUITES = [
+    ("parse", None, bench_parse.run),
+    ("draw", bench_draw.verify, bench_draw.run),
+    ("combo", bench_combo.verify, bench_combo.run),
+    ("gacha", None, bench_gacha.run),
+    ("tax", bench_tax.verify, bench_tax.run),
+    # 実際に徴収する集合演算SQL（境界の税額の確認は run の中で行う）
+    ("tax_db", None, lambda: bench_tax_db.run(os.environ["BENCH_DATABASE_URL"])),
+]
+# BENCH_DATABASE_URL が無い時は実行しないスイート
+DB_SUITES = {"tax_db"}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suites(names: List[str], repeat: int = 1) -> Dict:
+    """repeat 回実行し、計測ごとに最小値の一番小さい回を残す（他のプロセスの影響を受けた回を捨てる）。"""
+    results, ran, skipped = {}, [], []
+    for name, verify, run in SUITES:
+        if name not in names:
+            continue
+        if name in DB_SUITES and not os.getenv("BENCH_DATABASE_URL"):
+            print(f"[{name}] skipped (BENCH_DATABASE_URL is not set)", file=sys.stderr)
+            skipped.append(name)
+            continue
+        ran.append(name)
+        if verify is not None:
+            verify()
+        for attempt in range(repeat):
+            print(f"[{name}] {attempt + 1}/{repeat}", file=sys.stderr)
+            for key, value in run().items():
+                if key not in results or value["min"] < results[key]["min"]:
+                    results[key] = {**value, "suite": name}
+    return {
+        "commit": _git_commit(),
+        "suites": ran,
+        "skipped": skipped,
+        "repeat": repeat,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """threshold を超えて遅くなった計測の名前を返し、比較表を表示する。"""
+    regressions = []
+    print(f"{'benchmark':42s} {'before':>12s} {'after':>12s} {'change':>8s}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:42s} {'-':>12s} {format_seconds(result['min']):>12s} {'new':>8s}")
+            continue
+        change = result["min"] / before["min"] - 1 if before["min"] else 0.0
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = "  ⚠ slower"
+        print(f"{name:42s} {format_seconds(before['min']):>12s} {format_seconds(result['min']):>12s} {change:+8.1%}{mark}")
+    # --only で実行しなかったスイートは比べない
+    for name, before in sorted(baseline["results"].items()):
+        if name not in current["results"] and before.get("suite") in current["suites"]:
+            print(f"{name:42s} (missing from this run)")
+    for suite in current.get("skipped", []):
+        print(f"{suite:42s} (skipped)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    suite_names = [name for name, _, _ in SUITES]
+    parser = argparse.ArgumentParser(description="オフラインのベンチマークをまとめて実行する")
+    parser.add_argument("--only", help=f"実行するスイート（カンマ区切り）: {', '.join(suite_names)}")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    parser.add_argument("--compare", help="比較する以前の結果（--output で保存したJSON）")
+    parser.add_argument("--repeat", type=int, default=3, help="各スイートを実行する回数（最も速かった回を使う）")
+    parser.add_argument("--threshold", type=float, default=0.25, help="この割合を超えて遅くなったら失敗（既定 0.25 = 25%%）")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else suite_names
+    unknown = set(names) - set(suite_names)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    report = run_suites(names, max(1, args.repeat))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved {len(report['results'])} results to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"comparing {baseline.get('commit') or '?'} -> {report['commit'] or '?'}")
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for name, result in report["results"].items():
+            print(f"{name:42s} {format_seconds(result['median']):>12s}  (min {format_seconds(result['min'])})")
+        for suite in report["skipped"]:
+            print(f"{suite:42s} {'skipped':>12s}  (BENCH_DATABASE_URL is not set)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,31 @@
 import os
+import asyncio
+import hashlib
+import json
+import time
 import discord
 from discord.ext import commands
-import threading
-from flask import Flask
+from datetime import timedelta
 
-from utils.database import setup_database
+from config import (
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_HEALTHCHECK_SECONDS, SCHEDULE_REFRESH_MINUTES,
+    TONAMEL_CACHE_TTL_DAYS, TONAMEL_NEGATIVE_CACHE_TTL_HOURS,
+    BALANCE_CACHE_ENABLED, BALANCE_JOURNAL_PATH, BALANCE_CACHE_IDLE_SECONDS,
+    ANIMATION_FRAME_INTERVAL_MS, ANIMATION_CHANNEL_EDITS_PER_5S, ANIMATION_GLOBAL_EDITS_PER_SECOND,
+    FORCE_COMMAND_SYNC, HEALTH_PORT, HEALTH_DB_TIMEOUT_MS, HEALTH_DB_CACHE_SECONDS, HEALTH_SCHEDULE_MAX_AGE_MINUTES,
+    LOOP_MONITOR_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS
+)
+from utils.database import DatabasePool, set_active_pool, setup_database
+from utils.repository import UserRepository, TonamelUrlRepository, BotStateRepository, create_db_executor
+from utils.scraper import http_client
+from utils.schedule_store import ScheduleStore
+from utils.helpers import EmojiIndex
+from utils.gacha import gacha_engine
+from utils.animation import AnimationScheduler
+from utils.health import HealthServer, bot_metrics_collector
+from utils.metrics import metrics
+from utils.command_tree import BotCommandTree
+from utils.loop_monitor import LoopMonitor
 
 # =====================
 # 環境変数
@@ -13,20 +34,7 @@ TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
 RENDER = os.getenv("RENDER")  # Renderなら自動で入る
 
-# --- Flask (Keep Alive) ---
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    return "Discord bot is running!"
-
-def run_flask():
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port)
-
-def keep_alive_thread():
-    t = threading.Thread(target=run_flask, daemon=True)
-    t.start()
+COMMAND_TREE_FINGERPRINT_KEY = "command_tree_fingerprint"
 
 # --- Bot ---
 class MyBot(commands.Bot):
@@ -34,38 +42,182 @@ class MyBot(commands.Bot):
         intents = discord.Intents.default()
         intents.members = True
         intents.message_content = True
-        super().__init__(command_prefix="!", intents=intents)
+        super().__init__(command_prefix="!", intents=intents, tree_cls=BotCommandTree)
+
+        # DB接続プール（Botが所有し、db_connection() から使われる）
+        self.db_pool = DatabasePool(
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            healthcheck_seconds=DB_POOL_HEALTHCHECK_SECONDS
+        )
+        set_active_pool(self.db_pool)
+        # 非同期データアクセス層（DB呼び出しはプールと同じ上限の専用スレッドで実行）
+        self.db_executor = create_db_executor(self.db_pool)
+        # クレジットの増減は残高キャッシュでメモリ上で処理し、EconomyCogが定期的にDBへ反映する
+        self.user_repo = UserRepository(
+            self.db_pool, self.db_executor,
+            balance_journal_path=BALANCE_JOURNAL_PATH if BALANCE_CACHE_ENABLED else None,
+            balance_idle_seconds=BALANCE_CACHE_IDLE_SECONDS
+        )
+        # 再起動をまたいで保持する値（コマンド同期のフィンガープリント）
+        self.bot_state = BotStateRepository(self.db_pool, self.db_executor)
+        # DBのマイグレーションと未反映クレジットの再送が終わったら立つ（失敗した時も立てる）。
+        # Cogは並行に読み込まれ、定期処理がすぐ始まるので、DBを使う定期処理は before_loop でこれを待つ
+        self.db_ready = asyncio.Event()
+        # 起動処理の各段階にかかった秒数（setup_hookで記録）
+        self.startup_timings = {}
+        # 大会スケジュールのスナップショット（TournamentCogが定期更新する）
+        self.schedule_store = ScheduleStore(
+            refresh_interval=SCHEDULE_REFRESH_MINUTES * 60,
+            url_cache=TonamelUrlRepository(
+                self.db_pool, self.db_executor,
+                ttl=timedelta(days=TONAMEL_CACHE_TTL_DAYS),
+                negative_ttl=timedelta(hours=TONAMEL_NEGATIVE_CACHE_TTL_HOURS)
+            )
+        )
+
+        # カスタム絵文字の索引（EventsCogが絵文字・サーバーの変化に合わせて作り直す）
+        self.emoji_index = EmojiIndex(static_texts=gacha_engine.prize_texts())
+        # 全スロットの回転表示を駆動する共通スケジューラ
+        self.animations = AnimationScheduler(
+            frame_interval=ANIMATION_FRAME_INTERVAL_MS / 1000,
+            channel_rate=ANIMATION_CHANNEL_EDITS_PER_5S / 5,
+            global_rate=ANIMATION_GLOBAL_EDITS_PER_SECOND
+        )
+        # Keep Alive・ヘルスチェック・メトリクス用のHTTPサーバー（Botと同じイベントループで動く）
+        self.health_server = HealthServer(
+            self, host="0.0.0.0", port=HEALTH_PORT,
+            db_timeout=HEALTH_DB_TIMEOUT_MS / 1000,
+            db_cache_seconds=HEALTH_DB_CACHE_SECONDS,
+            schedule_max_age=HEALTH_SCHEDULE_MAX_AGE_MINUTES * 60
+        )
+        # イベントループを止めている処理を見つけるための監視
+        self.loop_monitor = LoopMonitor(
+            interval=LOOP_MONITOR_INTERVAL_MS / 1000,
+            threshold=LOOP_BLOCK_THRESHOLD_MS / 1000
+        )
+        metrics.add_collector(bot_metrics_collector(self))
 
     async def setup_hook(self):
         """起動時に1回だけ呼ばれる"""
+        started = time.perf_counter()
+        timings = {}
 
-        # ---- Cogsロード ----
-        for filename in os.listdir("./cogs"):
-            if filename.endswith(".py") and not filename.startswith("__"):
-                try:
-                    await self.load_extension(f"cogs.{filename[:-3]}")
-                    print(f"Loaded cog: {filename[:-3]}")
-                except Exception as e:
-                    print(f"Failed to load cog {filename[:-3]}: {e}")
+        # 起動処理の中の同期呼び出しも記録できるよう、最初に監視を始める
+        self.loop_monitor.start()
 
-        # ---- DBセットアップ ----
+        # ---- HTTPサーバー ----
+        # ホスティングのポート確認に間に合うよう、最初に起動する
         try:
-            setup_database()
-            print("Database setup successful.")
-        except Exception as e:
-            print(f"Database setup failed: {e}")
+            await self.health_server.start()
+        except OSError as e:
+            print(f"[ERROR] Failed to start health server: {e}")
+
+        async def timed(name, coro):
+            phase_started = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                timings[name] = time.perf_counter() - phase_started
+
+        # ---- CogsロードとDBセットアップ ----
+        # 並行に行う（DBはスレッドで待つだけなので、その間にCogを読み込める）。
+        # Cogの定期処理のうちDBを使うものは、self.db_ready が立つまで始まらない
+        _, database_ready = await asyncio.gather(
+            timed("cogs", self._load_cogs()),
+            timed("database", self._setup_database())
+        )
 
         # ---- スラッシュコマンド同期 ----
         # ⚠ Renderでは絶対にsyncしない
         if not RENDER:
-            try:
-                synced = await self.tree.sync()
-                print(f"Synced {len(synced)} command(s)")
-            except Exception as e:
-                print(f"Command sync failed: {e}")
+            await timed("command_sync", self._sync_commands(database_ready))
         else:
             print("Render環境のため command sync をスキップしました")
 
+        timings["total"] = time.perf_counter() - started
+        self.startup_timings = timings
+        print("[LOG] Startup " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items()))
+
+    async def _load_cogs(self):
+        names = sorted(
+            filename[:-3] for filename in os.listdir("./cogs")
+            if filename.endswith(".py") and not filename.startswith("__")
+        )
+        results = await asyncio.gather(
+            *(self.load_extension(f"cogs.{name}") for name in names),
+            return_exceptions=True
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                print(f"Failed to load cog {name}: {result}")
+            else:
+                print(f"Loaded cog: {name}")
+
+    async def _setup_database(self) -> bool:
+        try:
+            await asyncio.to_thread(self.db_pool.warmup)
+            print(f"Database pool warmed up: {self.db_pool.stats()}")
+            await asyncio.to_thread(setup_database)
+            print("Database setup successful.")
+            # 前回の終了時にDBへ反映できなかったクレジット変動を反映する
+            if self.user_repo.balances is not None:
+                await self.user_repo.balances.replay()
+            return True
+        except Exception as e:
+            print(f"Database setup failed: {e}")
+            return False
+        finally:
+            # 失敗した時は、定期処理はそれぞれの実行時にエラーを記録して次回に再試行する
+            self.db_ready.set()
+
+    def command_tree_fingerprint(self) -> str:
+        """登録されているスラッシュコマンド定義のハッシュ。定義が変わらなければ同じ値になる。"""
+        payload = sorted(
+            (command.to_dict(self.tree) for command in self.tree.get_commands()),
+            key=lambda data: (data.get("type", 1), data["name"])
+        )
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+    async def _sync_commands(self, database_ready: bool):
+        """前回同期した定義から変わっていない時は sync を省く（FORCE_COMMAND_SYNC で強制できる）。"""
+        fingerprint = self.command_tree_fingerprint()
+        if database_ready and not FORCE_COMMAND_SYNC:
+            try:
+                if await self.bot_state.get(COMMAND_TREE_FINGERPRINT_KEY) == fingerprint:
+                    print("Command tree unchanged; skipped command sync")
+                    return
+            except Exception as e:
+                print(f"[ERROR] Failed to read command tree fingerprint: {e}")
+        try:
+            synced = await self.tree.sync()
+            print(f"Synced {len(synced)} command(s)")
+        except Exception as e:
+            print(f"Command sync failed: {e}")
+            return
+        if database_ready:
+            try:
+                await self.bot_state.set(COMMAND_TREE_FINGERPRINT_KEY, fingerprint)
+            except Exception as e:
+                print(f"[ERROR] Failed to save command tree fingerprint: {e}")
+
+    async def close(self):
+        await self.health_server.close()
+        await self.loop_monitor.close()
+        await self.animations.close()
+        await super().close()
+        # 残高キャッシュの未反映分を書き込んでからDBを閉じる（失敗してもジャーナルから次回反映される）
+        if self.user_repo.balances is not None:
+            try:
+                await self.user_repo.flush_balances()
+            except Exception as e:
+                print(f"[ERROR] Failed to flush balance cache on shutdown: {e}")
+            self.user_repo.balances.journal.close()
+        await http_client.close()
+        await asyncio.to_thread(self.db_executor.shutdown)
+        set_active_pool(None)
+        self.db_pool.close()
+
     async def on_ready(self):
         print(f"Logged in as {self.user} (ID: {self.user.id})")
         print("------")
@@ -77,6 +229,5 @@ if __name__ == "__main__":
     elif not DATABASE_URL:
         print("エラー: DATABASE_URL が未設定です")
     else:
-        keep_alive_thread()
         bot = MyBot()
         bot.run(TOKEN)
@@ -0,0 +1,122 @@
+import discord
+from discord import app_commands, Interaction, Embed
+from discord.ext import commands
+
+from config import ADMIN_ROLES
+from utils.perf import perf
+
+class AdminCog(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(name="status", description="[管理者] Botの内部状態を表示します。")
+    @app_commands.checks.has_any_role(*ADMIN_ROLES)
+    async def status_slash(self, interaction: Interaction):
+        embed = Embed(title="🛠 Botステータス", color=discord.Color.dark_grey())
+
+        pool_stats = self.bot.db_pool.stats()
+        embed.add_field(
+            name="DB接続プール",
+            value=(f"使用中: `{pool_stats['in_use']}` / 上限: `{pool_stats['max_size']}`\n"
+                   f"アイドル: `{pool_stats['idle']}` / 待機中: `{pool_stats['waiting']}`\n"
+                   f"作成数: `{pool_stats['created']}` / 破棄数: `{pool_stats['discarded']}`"),
+            inline=False
+        )
+
+        schedule = self.bot.schedule_store.status()
+        if schedule["age_seconds"] is None:
+            schedule_text = "まだ取得できていません"
+        else:
+            schedule_text = (f"{schedule['count']}件 / 取得から `{int(schedule['age_seconds'] // 60)}`分経過\n"
+                             f"取得時刻: {schedule['fetched_at'].strftime('%m/%d %H:%M')}")
+        if schedule["refreshing"]:
+            schedule_text += "\n更新中..."
+        if schedule["consecutive_failures"]:
+            schedule_text += (f"\n⚠ 連続失敗: `{schedule['consecutive_failures']}`回 "
+                              f"(最終: {schedule['last_error_at'].strftime('%m/%d %H:%M')})")
+        embed.add_field(name="大会スケジュール", value=schedule_text, inline=False)
+
+        balances = self.bot.user_repo.balances
+        if balances is not None:
+            balance_stats = balances.stats()
+            embed.add_field(
+                name="残高キャッシュ",
+                value=(f"キャッシュ中: `{balance_stats['cached_users']}`人 / 未反映: `{balance_stats['pending_entries']}`件\n"
+                       f"反映回数: `{balance_stats['flushes']}` / 反映件数: `{balance_stats['flushed_entries']}`\n"
+                       f"直近の反映: `{balance_stats['last_flush_seconds'] * 1000:.1f}`ms"),
+                inline=False
+            )
+
+        animation_stats = self.bot.animations.stats()
+        embed.add_field(
+            name="スロットのアニメーション",
+            value=(f"稼働中: `{animation_stats['active']}`台 / `{animation_stats['channels']}`チャンネル\n"
+                   f"描画: `{animation_stats['frames_rendered']}` / 予算待ちで省略: `{animation_stats['frames_skipped']}` / "
+                   f"429: `{animation_stats['rate_limited']}`"),
+            inline=False
+        )
+
+        loop_stats = self.bot.loop_monitor.stats()
+        embed.add_field(
+            name="イベントループ",
+            value=(f"直近1分の遅延: p50 `{loop_stats['p50'] * 1000:.0f}`ms / p99 `{loop_stats['p99'] * 1000:.0f}`ms / "
+                   f"最大 `{loop_stats['max'] * 1000:.0f}`ms\n"
+                   f"止まった回数: `{loop_stats['blocked']}` (`{loop_stats['sites']}`か所、詳細は /loop_report)"),
+            inline=False
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="perf", description="[管理者] コマンド・定期処理の所要時間（p50/p95/p99）を表示します。")
+    @app_commands.checks.has_any_role(*ADMIN_ROLES)
+    async def perf_slash(self, interaction: Interaction):
+        embed = Embed(title="⏱ 所要時間", color=discord.Color.dark_grey(),
+                      description=f"直近{perf.sample_size}件ごとの集計 / 遅い処理のしきい値: `{perf.slow_threshold * 1000:.0f}`ms")
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.0f}"
+
+        for kind, title in (("command", "コマンド"), ("task", "定期処理")):
+            rows = perf.summary(kind)
+            if not rows:
+                embed.add_field(name=title, value="まだ記録がありません", inline=False)
+                continue
+            lines = []
+            for row in rows[:12]:
+                failures = row["count"] - row["outcomes"].get("ok", 0)
+                name = f"/{row['name']}" if kind == "command" else row["name"]
+                lines.append(f"`{name}` {row['count']}回{f' (失敗 {failures})' if failures else ''}\n"
+                             f"　p50 `{ms(row['p50'])}` / p95 `{ms(row['p95'])}` / p99 `{ms(row['p99'])}` ms"
+                             f"（DB平均 `{ms(row['db_mean'])}` / HTTP平均 `{ms(row['http_mean'])}`）")
+            embed.add_field(name=title, value="\n".join(lines)[:1024], inline=False)
+
+        if perf.slow_log:
+            slow_lines = [f"{entry.at.strftime('%m/%d %H:%M:%S')} `{entry.name}` `{ms(entry.seconds)}`ms "
+                          f"(DB `{ms(entry.db_seconds)}` / HTTP `{ms(entry.http_seconds)}`){'' if entry.outcome == 'ok' else ' ⚠'}"
+                          for entry in reversed(perf.slow_log)]
+            embed.add_field(name="遅かった処理（新しい順）", value="\n".join(slow_lines[:8]), inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="loop_report", description="[管理者] イベントループを止めていた処理と、その時のスタックを表示します。")
+    @app_commands.describe(reset="表示した後に記録を消す")
+    @app_commands.checks.has_any_role(*ADMIN_ROLES)
+    async def loop_report_slash(self, interaction: Interaction, reset: bool = False):
+        monitor = self.bot.loop_monitor
+        sites = monitor.report(limit=5)
+        embed = Embed(title="🐢 イベントループを止めていた処理", color=discord.Color.dark_grey(),
+                      description=f"`{monitor.threshold * 1000:.0f}`ms 以上止まった時のスタックを、止まっていた時間の合計が長い順に表示するぞ。")
+        if not sites:
+            embed.description += "\n\nまだ記録がありません。"
+        for site in sites:
+            stack = "\n".join(site.stack[-6:])
+            embed.add_field(
+                name=f"{site.location}"[:256],
+                value=(f"`{site.count}`回 / 合計 `{site.total_seconds * 1000:.0f}`ms / 最大 `{site.max_seconds * 1000:.0f}`ms"
+                       f" / 最終 {site.last_seen.strftime('%m/%d %H:%M:%S')}\n```{stack[-900:]}```"),
+                inline=False
+            )
+        if reset:
+            monitor.reset()
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(AdminCog(bot))
@@ -2,13 +2,15 @@ import discord
 from discord import app_commands, Interaction, Embed
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta
-import random
-import psycopg2.extras
 
-from config import JST, GACHA_PRIZES, GACHA_RATES, ADMIN_ROLES, TAX_BRACKETS, TAX_COLLECTION_TIME, BIRTHDAY_CHANNEL_ID
-from utils.database import get_db_connection
+from config import (
+    JST, ADMIN_ROLES, TAX_COLLECTION_TIME, BIRTHDAY_CHANNEL_ID,
+    BALANCE_FLUSH_INTERVAL_MS, CREDIT_LEDGER_RETENTION_DAYS
+)
 from utils.helpers import format_emojis
-from utils.ui_views import SlotView
+from utils.gacha import gacha_engine, DETAIL_PULL_LIMIT, MAX_PULLS
+from utils.ui_views import SlotView, LeaderboardView
+from utils.perf import perf, mark_failed
 
 # チャンネルごとの最後のスロットメッセージを記録する辞書
 last_slot_messages = {}
@@ -17,87 +19,87 @@ class EconomyCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.collect_income_tax.start()
+        self.flush_balances.start()
+        self.prune_credit_ledger.start()
 
     def cog_unload(self):
         self.collect_income_tax.cancel()
+        self.flush_balances.cancel()
+        self.prune_credit_ledger.cancel()
 
     @app_commands.command(name="daily", description="1日1回、500 GTVクレジットを獲得します。")
     async def daily_slash(self, interaction: Interaction):
         user_id = interaction.user.id
         now = datetime.now(JST)
         
-        conn = get_db_connection()
         try:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("INSERT INTO users (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING;", (user_id,))
-                cur.execute("SELECT credits, last_daily FROM users WHERE user_id = %s;", (user_id,))
-                user_data = cur.fetchone()
-
-                if user_data['last_daily'] is None or user_data['last_daily'].astimezone(JST).date() < now.date():
-                    new_credits = (user_data['credits'] or 0) + 500
-                    cur.execute("UPDATE users SET credits = %s, last_daily = %s WHERE user_id = %s;", (new_credits, now, user_id))
-                    await interaction.response.send_message(f"🎉 デイリーボーナス！ 500 GTVクレジットを獲得したぞ！\n現在の所持クレジット: `{new_credits}` GTV")
-                else:
-                    next_bonus_time = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=JST)
-                    time_remaining = next_bonus_time - now
-                    hours, rem = divmod(time_remaining.seconds, 3600)
-                    mins, _ = divmod(rem, 60)
-                    await interaction.response.send_message(f"次のデイリーボーナスは明日までお預けだ！\nあと {hours}時間{mins}分 だぞ。", ephemeral=True)
-            conn.commit()
+            claimed, new_credits = await self.bot.user_repo.claim_daily(user_id, now, 500)
         except Exception as e:
-            conn.rollback()
+            mark_failed()
             print(f"DB Error on /daily command: {e}")
             await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
-        finally:
-            conn.close()
+            return
+
+        if claimed:
+            await interaction.response.send_message(f"🎉 デイリーボーナス！ 500 GTVクレジットを獲得したぞ！\n現在の所持クレジット: `{new_credits}` GTV")
+        else:
+            next_bonus_time = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=JST)
+            time_remaining = next_bonus_time - now
+            hours, rem = divmod(time_remaining.seconds, 3600)
+            mins, _ = divmod(rem, 60)
+            await interaction.response.send_message(f"次のデイリーボーナスは明日までお預けだ！\nあと {hours}時間{mins}分 だぞ。", ephemeral=True)
 
     @app_commands.command(name="gacha", description="1000GTVを消費してガチャを回します。")
-    @app_commands.describe(count="回す回数を指定します (1-10)。デフォルトは1回です。")
-    async def gacha_slash(self, interaction: Interaction, count: app_commands.Range[int, 1, 10] = 1):
+    @app_commands.describe(count=f"回す回数を指定します (1-{MAX_PULLS})。{DETAIL_PULL_LIMIT}回を超えると結果は集計で表示されます。")
+    async def gacha_slash(self, interaction: Interaction, count: app_commands.Range[int, 1, MAX_PULLS] = 1):
         user_id = interaction.user.id
         total_cost = 1000 * count
 
-        conn = get_db_connection()
         try:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT credits FROM users WHERE user_id = %s FOR UPDATE;", (user_id,))
-                user_data = cur.fetchone()
-                current_credits = user_data['credits'] if user_data else 0
-
-                if current_credits < total_cost:
-                    await interaction.response.send_message(f"GTVクレジットが足りないぞ！ {total_cost} GTV必要だ。\n所持クレジット: `{current_credits}` GTV", ephemeral=True)
-                    return
-
-                new_credits = current_credits - total_cost
-                cur.execute("UPDATE users SET credits = %s WHERE user_id = %s;", (new_credits, user_id))
-                
-                results = []
-                for _ in range(count):
-                    rarities, weights = zip(*GACHA_RATES.items())
-                    chosen_rarity = random.choices(rarities, weights=weights, k=1)[0]
-                    prize_message = random.choice(GACHA_PRIZES.get(chosen_rarity, ["エラー"]))
-                    results.append({"rarity": chosen_rarity, "message": prize_message})
-
-                rarity_order = ["MAS", "LEG", "VIC", "SR", "VR", "R", "UC", "C"]
-                results.sort(key=lambda x: rarity_order.index(x["rarity"]))
-
-                message_lines = [f"ガチャ結果 ({count}連)", "--------------------"]
-                for res in results:
-                    prize = res['message'].replace(f"【{res['rarity']}】", "").lstrip()
-                    formatted_prize = format_emojis(prize, self.bot)
-                    message_lines.append(f"**【{res['rarity']}】** {formatted_prize}")
-                
-                message_lines.append("--------------------")
-                message_lines.append(f"{interaction.user.display_name} | 残り: {new_credits} GTV")
-                
-                await interaction.response.send_message("\n".join(message_lines))
-            conn.commit()
+            paid, new_credits = await self.bot.user_repo.spend_credits(user_id, total_cost, reason="gacha")
         except Exception as e:
-            if conn: conn.rollback()
+            mark_failed()
             print(f"Error on /gacha command: {e}")
             await interaction.response.send_message("ガチャ処理中にエラーが発生したぞ。クレジットは消費されていない。", ephemeral=True)
-        finally:
-            if conn: conn.close()
+            return
+
+        if not paid:
+            await interaction.response.send_message(f"GTVクレジットが足りないぞ！ {total_cost} GTV必要だ。\n所持クレジット: `{new_credits}` GTV", ephemeral=True)
+            return
+
+        try:
+            message_lines = [f"ガチャ結果 ({count}連)", "--------------------"]
+            if count <= DETAIL_PULL_LIMIT:
+                for pull in gacha_engine.pull(count):
+                    message_lines.append(f"**【{pull.rarity}】** {format_emojis(pull.prize, self.bot)}")
+            else:
+                summary = gacha_engine.pull_summary(count)
+                for rarity, hits in summary.counts:
+                    if hits:
+                        message_lines.append(f"**【{rarity}】** × {hits} ({hits / count:.1%})")
+                message_lines.append("--------------------")
+                message_lines.append(f"最高レア: **【{summary.best.rarity}】** {format_emojis(summary.best.prize, self.bot)}")
+
+            message_lines.append("--------------------")
+            message_lines.append(f"{interaction.user.display_name} | 残り: {new_credits} GTV")
+            
+            await interaction.response.send_message("\n".join(message_lines))
+        except Exception as e:
+            mark_failed()
+            print(f"Error on /gacha command: {e}")
+            # 結果を届けられなかったので消費分を返却する
+            try:
+                await self.bot.user_repo.add_credits(user_id, total_cost, reason="gacha_refund")
+                refunded = True
+            except Exception as refund_error:
+                refunded = False
+                print(f"[ERROR] Failed to refund /gacha for user {user_id} ({total_cost} GTV): {refund_error}")
+            if not interaction.response.is_done():
+                if refunded:
+                    message = "ガチャ処理中にエラーが発生したぞ。クレジットは消費されていない。"
+                else:
+                    message = f"ガチャ処理中にエラーが発生したぞ。消費した `{total_cost}` GTV の返却にも失敗したので、管理者に連絡してくれ。"
+                await interaction.response.send_message(message, ephemeral=True)
 
     @app_commands.command(name="slot", description="スロットを回します。")
     @app_commands.describe(bet="ベットするGTVクレジットの額 (1以上)")
@@ -110,23 +112,20 @@ class EconomyCog(commands.Cog):
                 await old_message.delete()
             except discord.NotFound: pass
 
-        conn = get_db_connection()
         try:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, 0) ON CONFLICT (user_id) DO NOTHING;", (user_id,))
-                cur.execute("SELECT credits FROM users WHERE user_id = %s FOR UPDATE;", (user_id,))
-                user_data = cur.fetchone()
-                current_credits = user_data['credits'] or 0
-
-                if current_credits < bet:
-                    await interaction.response.send_message(f"GTVクレジットが足りないぞ！\n所持クレジット: `{current_credits}` GTV", ephemeral=True)
-                    return
+            paid, new_credits = await self.bot.user_repo.spend_credits(user_id, bet, reason="slot_bet")
+        except Exception as e:
+            mark_failed()
+            print(f"Error on /slot command: {e}")
+            await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
+            return
 
-                new_credits = current_credits - bet
-                cur.execute("UPDATE users SET credits = %s WHERE user_id = %s;", (new_credits, user_id))
-            conn.commit()
+        if not paid:
+            await interaction.response.send_message(f"GTVクレジットが足りないぞ！\n所持クレジット: `{new_credits}` GTV", ephemeral=True)
+            return
 
-            view = SlotView(user_id=user_id, bet=bet, original_interaction=interaction)
+        try:
+            view = SlotView(user_id=user_id, bet=bet, interaction=interaction)
             embed = Embed(title="🎰 スロットゲーム 🎰", color=discord.Color.gold(), description=f"**> `{' | '.join(view.result)}` <**")
             embed.add_field(name="ベット額", value=f"`{bet}` GTV")
             embed.add_field(name="現在の所持クレジット", value=f"`{new_credits}` GTV")
@@ -135,54 +134,35 @@ class EconomyCog(commands.Cog):
             await interaction.response.send_message(embed=embed, view=view)
             message = await interaction.original_response()
             last_slot_messages.setdefault(channel_id, {})[user_id] = message.id
-            await view.start_game()
+            await view.start()
 
         except Exception as e:
-            if conn: conn.rollback()
+            mark_failed()
             print(f"Error on /slot command: {e}")
             # Attempt to refund
             try:
-                refund_conn = get_db_connection()
-                with refund_conn.cursor() as cur:
-                    cur.execute("UPDATE users SET credits = credits + %s WHERE user_id = %s;", (bet, user_id))
-                refund_conn.commit()
-                refund_conn.close()
+                await self.bot.user_repo.add_credits(user_id, bet, reason="slot_refund")
                 await interaction.followup.send("エラーが発生したためベット額を返却したぞ。", ephemeral=True)
             except Exception as refund_e:
+                mark_failed()
                 print(f"Failed to refund bet: {refund_e}")
                 await interaction.followup.send("重大なエラーが発生した。管理者に連絡してくれ。", ephemeral=True)
-        finally:
-            if conn and not conn.closed: conn.close()
 
     @app_commands.command(name="leaderboard", description="GTVクレジットの所持数ランキングを表示するぞ！")
     async def leaderboard_slash(self, interaction: Interaction):
-        conn = get_db_connection()
         try:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT user_id, credits FROM users WHERE credits > 0 ORDER BY credits DESC LIMIT 10;")
-                leaderboard_data = cur.fetchall()
+            view = LeaderboardView(self.bot.user_repo, guild=interaction.guild)
+            embed = await view.build_embed()
 
-            if not leaderboard_data:
+            if embed is None:
                 await interaction.response.send_message("まだ誰もGTVクレジットを持っていないみたいだな。", ephemeral=True)
                 return
 
-            embed = Embed(title="🏆 GTVクレジット ランキング 🏆", color=discord.Color.gold())
-            description = []
-            rank_emojis = {1: '🥇', 2: '🥈', 3: '🥉'}
-            
-            for i, record in enumerate(leaderboard_data, 1):
-                member = interaction.guild.get_member(record['user_id'])
-                name = member.display_name if member else f"不明なユーザー"
-                rank_emoji = rank_emojis.get(i, f"`{i}.`")
-                description.append(f"{rank_emoji} **{name}** - `{record['credits']}` GTV")
-
-            embed.description = "\n".join(description)
-            await interaction.response.send_message(embed=embed)
+            await interaction.response.send_message(embed=embed, view=view)
         except Exception as e:
+            mark_failed()
             print(f"Error on /leaderboard command: {e}")
             await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
-        finally:
-            if conn: conn.close()
 
     @app_commands.command(name="gift", description="他のユーザーにGTVクレジットを渡します。")
     @app_commands.describe(user="クレジットを渡す相手", amount="渡すクレジットの額 (1以上)")
@@ -192,26 +172,18 @@ class EconomyCog(commands.Cog):
             return
 
         sender_id, receiver_id = interaction.user.id, user.id
-        conn = get_db_connection()
         try:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT credits FROM users WHERE user_id = %s FOR UPDATE;", (sender_id,))
-                sender_credits = (cur.fetchone() or {}).get('credits', 0)
-
-                if sender_credits < amount:
-                    await interaction.response.send_message(f"GTVクレジットが足りません！\n所持クレジット: `{sender_credits}` GTV", ephemeral=True)
-                    return
-
-                cur.execute("UPDATE users SET credits = credits - %s WHERE user_id = %s;", (amount, sender_id))
-                cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET credits = users.credits + %s;", (receiver_id, amount, amount))
-            conn.commit()
-            await interaction.response.send_message(f"✅ {interaction.user.display_name}が{user.display_name}さんに `{amount}` GTVクレジットを渡しました。")
+            sent, sender_credits = await self.bot.user_repo.transfer_credits(sender_id, receiver_id, amount)
         except Exception as e:
-            if conn: conn.rollback()
+            mark_failed()
             print(f"DB Error on /gift command: {e}")
             await interaction.response.send_message("エラーが発生し、処理はキャンセルされました。", ephemeral=True)
-        finally:
-            if conn: conn.close()
+            return
+
+        if not sent:
+            await interaction.response.send_message(f"GTVクレジットが足りません！\n所持クレジット: `{sender_credits}` GTV", ephemeral=True)
+            return
+        await interaction.response.send_message(f"✅ {interaction.user.display_name}が{user.display_name}さんに `{amount}` GTVクレジットを渡しました。")
 
     # --- 管理者用クレジット操作コマンドグループ ---
     admin_credit = app_commands.Group(name="admin_credit", description="管理者用のクレジット操作コマンド", guild_only=True)
@@ -219,103 +191,92 @@ class EconomyCog(commands.Cog):
     @admin_credit.command(name="set", description="ユーザーのGTVクレジットを指定した額に設定します。")
     @app_commands.checks.has_any_role(*ADMIN_ROLES)
     async def admin_credit_set(self, interaction: Interaction, user: discord.Member, amount: app_commands.Range[int, 0]):
-        conn = get_db_connection()
         try:
-            with conn.cursor() as cur:
-                cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET credits = %s;", (user.id, amount, amount))
-            conn.commit()
+            await self.bot.user_repo.set_credits(user.id, amount)
             await interaction.response.send_message(f"{user.display_name}さんのクレジットを `{amount}` GTVに設定しました。", ephemeral=True)
         except Exception as e:
-            if conn: conn.rollback()
+            mark_failed()
             print(f"DB Error on /admin_credit set: {e}")
             await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
-        finally:
-            if conn: conn.close()
 
     @admin_credit.command(name="add", description="ユーザーのGTVクレジットを指定した額だけ増やします。")
     @app_commands.checks.has_any_role(*ADMIN_ROLES)
     async def admin_credit_add(self, interaction: Interaction, user: discord.Member, amount: app_commands.Range[int, 1]):
-        # `gift` と同様のロジックで実装
-        conn = get_db_connection()
         try:
-            with conn.cursor() as cur:
-                cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET credits = users.credits + %s;", (user.id, amount, amount))
-            conn.commit()
+            await self.bot.user_repo.add_credits(user.id, amount, reason="admin_add")
             await interaction.response.send_message(f"{user.display_name}さんのクレジットに `{amount}` GTVを追加しました。", ephemeral=True)
         except Exception as e:
-            if conn: conn.rollback()
+            mark_failed()
             print(f"DB Error on /admin_credit add: {e}")
             await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
-        finally:
-            if conn: conn.close()
 
     @admin_credit.command(name="remove", description="ユーザーのGTVクレジットを指定した額だけ減らします。")
     @app_commands.checks.has_any_role(*ADMIN_ROLES)
     async def admin_credit_remove(self, interaction: Interaction, user: discord.Member, amount: app_commands.Range[int, 1]):
-        conn = get_db_connection()
         try:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT credits FROM users WHERE user_id = %s FOR UPDATE;", (user.id,))
-                current_credits = (cur.fetchone() or {}).get('credits', 0)
-                if current_credits < amount:
-                    await interaction.response.send_message(f"残高不足です。{user.display_name}さんの所持クレジットは `{current_credits}` GTVです。", ephemeral=True)
-                    return
-                cur.execute("UPDATE users SET credits = credits - %s WHERE user_id = %s;", (amount, user.id))
-            conn.commit()
+            removed, current_credits = await self.bot.user_repo.spend_credits(user.id, amount, reason="admin_remove")
+            if not removed:
+                await interaction.response.send_message(f"残高不足です。{user.display_name}さんの所持クレジットは `{current_credits}` GTVです。", ephemeral=True)
+                return
             await interaction.response.send_message(f"{user.display_name}さんのクレジットから `{amount}` GTVを削除しました。", ephemeral=True)
         except Exception as e:
-            if conn: conn.rollback()
+            mark_failed()
             print(f"DB Error on /admin_credit remove: {e}")
             await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
-        finally:
-            if conn: conn.close()
 
     @tasks.loop(time=TAX_COLLECTION_TIME)
+    @perf.job("collect_income_tax")
     async def collect_income_tax(self):
         if datetime.now(JST).weekday() != 0: return # 月曜日のみ実行
 
         await self.bot.wait_until_ready()
-        conn = None
-        total_tax_collected, users_taxed_count = 0, 0
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT user_id, credits, last_taxed_credits FROM users WHERE credits > 0")
-                all_users = cur.fetchall()
-                if not all_users: return
-
-                for user in all_users:
-                    increase = user['credits'] - (user['last_taxed_credits'] or 0)
-                    if increase <= 0:
-                        cur.execute("UPDATE users SET last_taxed_credits = %s WHERE user_id = %s", (user['credits'], user['user_id']))
-                        continue
-
-                    tax_rate, deduction = 0, 0
-                    for bracket in TAX_BRACKETS:
-                        if increase <= bracket[0]:
-                            tax_rate, deduction = bracket[1], bracket[2]
-                            break
-                    
-                    tax_amount = int((increase * tax_rate) - deduction)
-                    if tax_amount > 0:
-                        new_credits = user['credits'] - tax_amount
-                        cur.execute("UPDATE users SET credits = %s, last_taxed_credits = %s WHERE user_id = %s", (new_credits, new_credits, user['user_id']))
-                        total_tax_collected += tax_amount
-                        users_taxed_count += 1
-                    else:
-                        cur.execute("UPDATE users SET last_taxed_credits = %s WHERE user_id = %s", (user['credits'], user['user_id']))
-            conn.commit()
+            total_tax_collected, users_taxed_count = await self.bot.user_repo.collect_income_tax()
             
             if users_taxed_count > 0 and BIRTHDAY_CHANNEL_ID:
                 if channel := self.bot.get_channel(BIRTHDAY_CHANNEL_ID):
                     await channel.send(f"今週の所得税として、合計 `{total_tax_collected}` GTV を {users_taxed_count} 名から徴収したぞ。")
         except Exception as e:
-            if conn: conn.rollback()
+            mark_failed()
             print(f"DB Error in income tax task: {e}")
-        finally:
-            if conn: conn.close()
+
+    @collect_income_tax.before_loop
+    async def before_collect_income_tax(self):
+        await self.bot.db_ready.wait()
+
+    @tasks.loop(seconds=BALANCE_FLUSH_INTERVAL_MS / 1000)
+    @perf.job("flush_balances")
+    async def flush_balances(self):
+        try:
+            await self.bot.user_repo.flush_balances()
+        except Exception as e:
+            mark_failed()
+            # 未反映分はキャッシュとジャーナルに残り、次回に再送される
+            print(f"DB Error in balance flush task: {e}")
+
+    @flush_balances.before_loop
+    async def before_flush_balances(self):
+        # ジャーナルの再送（replay）とマイグレーションが済む前に反映を始めない
+        await self.bot.db_ready.wait()
+
+    @tasks.loop(hours=24)
+    @perf.job("prune_credit_ledger")
+    async def prune_credit_ledger(self):
+        if self.bot.user_repo.balances is None:
+            return
+        try:
+            deleted = await self.bot.user_repo.prune_ledger(timedelta(days=CREDIT_LEDGER_RETENTION_DAYS))
+            if deleted:
+                print(f"[LOG] Pruned {deleted} credit ledger rows.")
+        except Exception as e:
+            mark_failed()
+            print(f"DB Error in credit ledger prune task: {e}")
+
+    @prune_credit_ledger.before_loop
+    async def before_prune_credit_ledger(self):
+        await self.bot.wait_until_ready()
+        await self.bot.db_ready.wait()
 
 async def setup(bot: commands.Bot):
     cog = EconomyCog(bot)
-    bot.tree.add_command(cog.admin_credit)
     await bot.add_cog(cog)
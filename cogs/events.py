@@ -1,26 +1,31 @@
 
-from discord import Interaction
-from discord.app_commands import AppCommandError, MissingAnyRole
 from discord.ext import commands
 
 class EventsCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        # bot.tree.error デコレータはCog内では直接使えないため、リスナーとして追加
-        self.bot.tree.on_error = self.on_app_command_error
-
-    async def on_app_command_error(self, interaction: Interaction, error: AppCommandError):
-        """スラッシュコマンドのエラーを処理するグローバルハンドラ"""
-        if isinstance(error, MissingAnyRole):
-            await interaction.response.send_message("このコマンドを実行する権限がないぞ！", ephemeral=True)
-        else:
-            # 予期しないエラーはコンソールに出力
-            print(f"An unhandled app command error occurred: {error}")
-            # ユーザーには汎用的なメッセージを返す
-            if not interaction.response.is_done():
-                await interaction.response.send_message("コマンドの実行中に予期せぬエラーが発生したぞ。", ephemeral=True)
-            else:
-                await interaction.followup.send("コマンドの実行中に予期せぬエラーが発生したぞ。", ephemeral=True)
+        # スラッシュコマンドのエラー処理は utils/command_tree.py の BotCommandTree.on_error で行う
+
+    # ---- 絵文字索引の更新 ----
+    def _rebuild_emoji_index(self):
+        self.bot.emoji_index.rebuild(self.bot.emojis)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._rebuild_emoji_index()
+        print(f"[LOG] Emoji index built: {len(self.bot.emoji_index)} emojis")
+
+    @commands.Cog.listener()
+    async def on_guild_emojis_update(self, guild, before, after):
+        self._rebuild_emoji_index()
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self._rebuild_emoji_index()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self._rebuild_emoji_index()
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(EventsCog(bot))
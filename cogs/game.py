@@ -1,51 +1,81 @@
 
 import discord
 from discord import app_commands, Interaction, Embed
-import random
-import math
-import itertools
+from discord.ext import commands
+import asyncio
+from typing import Optional
+
+from config import SIMULATION_MAX_TRIALS, SIMULATION_TIME_BUDGET_MS
+from utils.probability import combo_probability, hypergeometric_pmf, at_least, draw_curve
+from utils.simulation import simulate, parse_condition
+from utils.dice import parse_expression, roll as roll_dice, histogram, DETAIL_LIMIT
 
 class GameCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
-    @app_commands.command(name="roll", description="サイコロを振ります (例: 3d6)")
-    @app_commands.describe(dice="サイコロの形式 (例: 3d6)")
+    @app_commands.command(name="roll", description="サイコロを振ります (例: 3d6, 4d6kh3, 2d20+5)")
+    @app_commands.describe(dice="ダイス式 (例: 3d6, 4d6kh3 → 高い3つを残す, 2d20+5, 1000000d6)")
     async def roll_dice_slash(self, interaction: Interaction, dice: str):
         try:
-            num_dice, num_sides = map(int, dice.lower().split('d'))
-            if not (0 < num_dice <= 100 and num_sides > 0):
-                await interaction.response.send_message("サイコロの数(1-100)と面の数(1以上)を正しく指定してくれ！", ephemeral=True); return
-            rolls = [random.randint(1, num_sides) for _ in range(num_dice)]
-            await interaction.response.send_message(f"{interaction.user.mention} が `{dice}` を振ったぞ！\n出目: {', '.join(map(str, rolls))}")
-        except ValueError:
-            await interaction.response.send_message("サイコロの形式が正しくないぞ！例: `3d6`", ephemeral=True)
+            terms, _ = parse_expression(dice)
+            if sum(term.count for term in terms) > DETAIL_LIMIT:
+                # ダイス数が多いときは集計に時間がかかることがあるので別スレッドで振る
+                result = await asyncio.to_thread(roll_dice, dice)
+            else:
+                result = roll_dice(dice)
+        except ValueError as e:
+            await interaction.response.send_message(f"{e}\n例: `3d6`, `4d6kh3`, `2d20+5`", ephemeral=True); return
+
+        lines = [f"{interaction.user.mention} が `{result.expression}` を振ったぞ！"]
+        for term_result in result.terms:
+            term = term_result.term
+            prefix = "-" if term.sign < 0 else ""
+            if term_result.rolls is not None:
+                rolls = ", ".join(f"~~{r}~~" if i in term_result.dropped else str(r) for i, r in enumerate(term_result.rolls))
+                lines.append(f"{prefix}`{term.notation}` 出目: {rolls} (計 {term_result.total})")
+            else:
+                mean = term_result.total / term.kept
+                lines.append(f"{prefix}`{term.notation}` 計 `{term_result.total:,}` / 平均 `{mean:.3f}` / 最小 `{term_result.low}` / 最大 `{term_result.high}`")
+                if term_result.face_counts is not None:
+                    bins = [(f"{low}" if low == high else f"{low}-{high}", count) for low, high, count in histogram(term_result.face_counts)]
+                    peak = max(count for _, count in bins) or 1
+                    width = max(len(label) for label, _ in bins)
+                    for label, count in bins:
+                        lines.append(f"　`{label:>{width}}` {'█' * round(10 * count / peak):<10} {count / term.kept:.2%}")
+        if result.modifier:
+            lines.append(f"補正: `{result.modifier:+d}`")
+        if len(result.terms) > 1 or result.modifier or not result.detailed:
+            lines.append(f"合計: **{result.total:,}**")
+
+        message = "\n".join(lines)
+        if len(message) > 2000:
+            message = "\n".join(lines[:1] + [f"合計: **{result.total:,}**"])
+        await interaction.response.send_message(message)
 
     @app_commands.command(name="draw", description="山札からカードを引く確率を計算します。")
     @app_commands.describe(
         deck_size="非公開領域の枚数 (山札の枚数)",
         target_cards="当たりカードの枚数",
         draw_count="引く枚数",
-        required_hits="当たりを引く要求枚数 (デフォルト: 1枚以上)"
+        required_hits="当たりを引く要求枚数 (デフォルト: 1枚以上)",
+        turns="その後1ターン1枚ずつ引いたときの推移を何ターン分表示するか (デフォルト: 5)"
     )
     async def draw_chance_slash(
         self, interaction: Interaction,
         deck_size: app_commands.Range[int, 1],
         target_cards: app_commands.Range[int, 0],
         draw_count: app_commands.Range[int, 1],
-        required_hits: app_commands.Range[int, 1] = 1
+        required_hits: app_commands.Range[int, 1] = 1,
+        turns: app_commands.Range[int, 0, 20] = 5
     ):
         if not (target_cards <= deck_size and draw_count <= deck_size and required_hits <= target_cards and required_hits <= draw_count):
             await interaction.response.send_message("入力値が不正だぞ。各値の関係性を確認してくれ。", ephemeral=True); return
 
         try:
-            denominator = math.comb(deck_size, draw_count)
-            if denominator == 0: raise ValueError("組み合わせが0通りになるぞ。")
-
-            total_probability = 0.0
-            for i in range(required_hits, min(draw_count, target_cards) + 1):
-                numerator = math.comb(target_cards, i) * math.comb(deck_size - target_cards, draw_count - i)
-                total_probability += numerator / denominator
+            pmf = hypergeometric_pmf(deck_size, target_cards, draw_count)
+            total_probability = at_least(pmf, required_hits)
+            curve = draw_curve(deck_size, target_cards, draw_count, turns, required_hits)
         except ValueError as e:
             await interaction.response.send_message(f"計算エラー: {e}", ephemeral=True); return
 
@@ -54,19 +84,39 @@ class GameCog(commands.Cog):
         embed.add_field(name="当たりカードの枚数", value=f"`{target_cards}`枚", inline=True)
         embed.add_field(name="引く枚数", value=f"`{draw_count}`枚", inline=True)
         embed.add_field(name="要求枚数", value=f"`{required_hits}`枚以上", inline=True)
+
+        # 当たり枚数ごとの確率（行が多すぎる時は0.01%未満を省略）
+        distribution = [(k, p) for k, p in enumerate(pmf) if p > 0]
+        if len(distribution) > 15:
+            distribution = [(k, p) for k, p in distribution if p >= 0.0001]
+        embed.add_field(
+            name="当たり枚数の分布",
+            value="\n".join(f"`{k}`枚: `{p:.2%}`" for k, p in distribution[:40]),
+            inline=False
+        )
+        if len(curve) > 1:
+            curve_lines = [f"{'初手' if i == 0 else f'{i}ターン目'} ({n}枚): `{p:.2%}`" for i, (n, p) in enumerate(curve)]
+            embed.add_field(name=f"{required_hits}枚以上引けている確率の推移", value="\n".join(curve_lines), inline=False)
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="combo", description="指定した複数種類のカードを同時に引く確率を計算します。")
-    @app_commands.describe(deck_size="山札の枚数", draw_count="引く枚数", copies="各カードの採用枚数をカンマ区切りで入力 (例: 4,4,2)")
+    @app_commands.describe(
+        deck_size="山札の枚数", draw_count="引く枚数", copies="各カードの採用枚数をカンマ区切りで入力 (例: 4,4,2)",
+        required="各カードを何枚以上引きたいかをカンマ区切りで入力 (例: 2,1,1)。省略すると全て1枚以上"
+    )
     async def combo_chance_slash(
         self, interaction: Interaction,
         deck_size: app_commands.Range[int, 1],
         draw_count: app_commands.Range[int, 1],
-        copies: str
+        copies: str,
+        required: Optional[str] = None
     ):
         try:
             copies_list = [int(c.strip()) for c in copies.split(',')]
             if not copies_list or any(c <= 0 for c in copies_list): raise ValueError("カード枚数は1以上の整数で入力してくれ。")
+            required_list = [int(k.strip()) for k in required.split(',')] if required else [1] * len(copies_list)
+            if len(required_list) != len(copies_list): raise ValueError("必要枚数はカードの種類数と同じ数だけ入力してくれ。")
+            if any(k < 1 or k > c for c, k in zip(copies_list, required_list)): raise ValueError("必要枚数は1以上、採用枚数以下で入力してくれ。")
         except ValueError as e:
             await interaction.response.send_message(f"カード枚数の入力形式が正しくないぞ。例: `4, 4, 2`\nエラー: {e}", ephemeral=True); return
 
@@ -74,27 +124,63 @@ class GameCog(commands.Cog):
             await interaction.response.send_message("カードの合計枚数や引く枚数が、山札の枚数を超えているぞ。", ephemeral=True); return
 
         try:
-            N, n, k_list, m = deck_size, draw_count, copies_list, len(copies_list)
-            total_combinations = math.comb(N, n)
-            union_of_misses_numerator = 0
-            
-            for i in range(1, m + 1):
-                for subset_indices in itertools.combinations(range(m), i):
-                    sum_of_copies_in_subset = sum(k_list[j] for j in subset_indices)
-                    term_numerator = math.comb(N - sum_of_copies_in_subset, n) if N - sum_of_copies_in_subset >= n else 0
-                    union_of_misses_numerator += term_numerator if (i % 2) == 1 else -term_numerator
-            
-            favorable_combinations = total_combinations - union_of_misses_numerator
-            probability = favorable_combinations / total_combinations if total_combinations > 0 else 0.0
+            probability = combo_probability(deck_size, draw_count, copies_list, required_list)
         except (ValueError, TypeError) as e:
             await interaction.response.send_message(f"計算エラーが発生しました: {e}", ephemeral=True); return
 
-        card_fields_text = [f"カード{chr(65+i)}: `{c}`枚" for i, c in enumerate(copies_list)]
-        embed = Embed(title="🃏 コンボ確率計算結果", color=discord.Color.green(), description=f"**`{probability:.2%}`** の確率で、指定した**{m}種類**のカードを全て1枚以上引けるぞ。")
+        m = len(copies_list)
+        card_fields_text = [f"カード{chr(65+i)}: `{c}`枚中 `{k}`枚以上" for i, (c, k) in enumerate(zip(copies_list, required_list))]
+        condition = "全て1枚以上" if all(k == 1 for k in required_list) else "全て必要枚数以上"
+        embed = Embed(title="🃏 コンボ確率計算結果", color=discord.Color.green(), description=f"**`{probability:.2%}`** の確率で、指定した**{m}種類**のカードを{condition}引けるぞ。")
         embed.add_field(name="山札の枚数", value=f"`{deck_size}`枚", inline=True)
         embed.add_field(name="引く枚数", value=f"`{draw_count}`枚", inline=True)
         embed.add_field(name="各カードの枚数", value="\n".join(card_fields_text), inline=False)
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(name="simulate", description="シールド5枚・手札5枚から始まる対戦開始をシミュレーションして確率を求めます。")
+    @app_commands.describe(
+        copies="各カードの採用枚数をカンマ区切りで入力 (例: 4,4,2 → カードA,B,C)",
+        condition="条件 (例: `A|B, C:2, S:D` → AかBを1枚以上、Cを2枚以上、シールドにD)",
+        turns="何ターン目まで調べるか (デフォルト: 5)",
+        going_first="先攻なら1ターン目はドローしない (デフォルト: 先攻)",
+        deck_size="デッキの枚数 (デフォルト: 40)"
+    )
+    async def simulate_slash(
+        self, interaction: Interaction,
+        copies: str,
+        condition: str,
+        turns: app_commands.Range[int, 0, 10] = 5,
+        going_first: bool = True,
+        deck_size: app_commands.Range[int, 20, 60] = 40
+    ):
+        try:
+            copies_list = [int(c.strip()) for c in copies.split(',')]
+            if not copies_list or len(copies_list) > 26 or any(c <= 0 for c in copies_list): raise ValueError("カード枚数は1以上の整数で、26種類までにしてくれ。")
+            terms = parse_condition(condition, len(copies_list))
+        except ValueError as e:
+            await interaction.response.send_message(f"入力形式が正しくないぞ。\nエラー: {e}", ephemeral=True); return
+
+        await interaction.response.defer(thinking=True)
+        try:
+            # NumPyの計算は別スレッドで行い、イベントループを止めない
+            result = await asyncio.to_thread(
+                simulate, deck_size, copies_list, terms, turns, going_first,
+                max_trials=SIMULATION_MAX_TRIALS, time_budget=SIMULATION_TIME_BUDGET_MS / 1000
+            )
+        except ValueError as e:
+            await interaction.followup.send(f"計算エラー: {e}", ephemeral=True); return
+
+        lines = []
+        for turn, seen, p, low, high in result.rows():
+            label = "初手" if turn == 0 else f"{turn}ターン目"
+            lines.append(f"{label} ({seen}枚): **`{p:.2%}`** ({low:.2%} – {high:.2%})")
+        card_text = " / ".join(f"{chr(65+i)}: `{c}`枚" for i, c in enumerate(copies_list))
+        embed = Embed(title="🎲 対戦開始シミュレーション", color=discord.Color.purple(), description="\n".join(lines))
+        embed.add_field(name="条件", value=f"`{condition}`", inline=False)
+        embed.add_field(name="採用カード", value=card_text, inline=False)
+        embed.add_field(name="設定", value=f"{deck_size}枚デッキ / {'先攻' if going_first else '後攻'}", inline=True)
+        embed.set_footer(text=f"{result.trials:,}回試行 ({result.elapsed:.2f}秒) / 括弧内は95%信頼区間")
+        await interaction.followup.send(embed=embed)
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(GameCog(bot))
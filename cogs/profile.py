@@ -6,8 +6,8 @@ from discord.ext import commands
 from typing import Optional
 
 from config import PROFILE_ITEMS, NUMERIC_ITEMS, ADMIN_ROLES
-from utils.database import get_db_connection, get_user_profile
 from utils.ui_views import RegisterView
+from utils.perf import mark_failed
 import re
 
 class ProfileCog(commands.Cog):
@@ -22,7 +22,7 @@ class ProfileCog(commands.Cog):
     @app_commands.describe(user="情報を表示したいメンバー (指定がなければ自分)")
     async def profile_slash(self, interaction: Interaction, user: Optional[discord.Member] = None):
         target_user = user or interaction.user
-        user_data = get_user_profile(target_user.id)
+        user_data = await self.bot.user_repo.get_profile(target_user.id)
         
         if not user_data or not any(user_data.get(key) for key in PROFILE_ITEMS):
             message = f"{target_user.display_name}の情報はまだ登録されていないぞ。" + ("\n`/register`で登録してみよう！" if target_user == interaction.user else "")
@@ -71,14 +71,10 @@ class ProfileCog(commands.Cog):
                 processed_value = value
 
         try:
-            conn = get_db_connection()
-            with conn.cursor() as cur:
-                sql = f"INSERT INTO users (user_id, {item_key}) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET {item_key} = %s;"
-                cur.execute(sql, (user_id, processed_value, processed_value))
-            conn.commit()
-            conn.close()
+            await self.bot.user_repo.set_profile_item(user_id, item_key, processed_value)
             await interaction.response.send_message(f"{user.display_name}の「{item_name}」を更新しました。", ephemeral=True)
         except Exception as e:
+            mark_failed()
             print(f"DB Error on admin set: {e}")
             await interaction.response.send_message("DBエラーにより更新できませんでした。", ephemeral=True)
 
@@ -87,17 +83,13 @@ class ProfileCog(commands.Cog):
     @app_commands.checks.has_any_role(*ADMIN_ROLES)
     async def profile_admin_delete(self, interaction: Interaction, user: discord.Member):
         try:
-            conn = get_db_connection()
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM users WHERE user_id = %s", (user.id,))
-            conn.commit()
-            conn.close()
+            await self.bot.user_repo.delete_user(user.id)
             await interaction.response.send_message(f"{user.display_name}のプロフィール情報を削除しました。", ephemeral=True)
         except Exception as e:
+            mark_failed()
             print(f"DB Error on admin delete: {e}")
             await interaction.response.send_message("DBエラーにより削除できませんでした。", ephemeral=True)
 
 async def setup(bot: commands.Bot):
     cog = ProfileCog(bot)
-    bot.tree.add_command(cog.profile_admin)
     await bot.add_cog(cog)
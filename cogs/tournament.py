@@ -4,25 +4,30 @@ import discord
 from discord import app_commands, Interaction
 from discord.ext import commands, tasks
 from datetime import datetime
+import asyncio
+import time
 
-from config import JST, NOTIFY_TIME, CHANNEL_ID, DMPS_UPDATE_TIME, BIRTHDAY_CHANNEL_ID
-from utils.database import get_db_connection, get_user_profile
-from utils.scraper import fetch_and_parse_tournaments, fetch_dmps_user_stats
+from config import JST, NOTIFY_TIME, CHANNEL_ID, DMPS_UPDATE_TIME, BIRTHDAY_CHANNEL_ID, SCHEDULE_REFRESH_MINUTES
+from utils.scraper import dmps_stats_cache
+from utils.perf import perf, mark_failed
 
 class TournamentCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.refresh_schedule.start()
         self.check_tournaments_today.start()
         self.update_dmps_points_task.start()
 
     def cog_unload(self):
+        self.refresh_schedule.cancel()
         self.check_tournaments_today.cancel()
         self.update_dmps_points_task.cancel()
 
     @app_commands.command(name="next", description="直近の大会情報を表示します。")
     async def next_tournament_slash(self, interaction: Interaction):
+        # 通常はメモリ上のスナップショットから即答する（未取得の起動直後のみ取得を待つ）
         await interaction.response.defer()
-        all_tournaments = fetch_and_parse_tournaments()
+        all_tournaments = await self.bot.schedule_store.get()
         if not all_tournaments:
             await interaction.followup.send("大会情報が取得できなかったぞ！"); return
         
@@ -42,7 +47,7 @@ class TournamentCog(commands.Cog):
     @app_commands.command(name="load", description="DMPS大会成績を更新します。")
     async def load_dmps_stats_slash(self, interaction: Interaction):
         user_id = interaction.user.id
-        user_data = get_user_profile(user_id)
+        user_data = await self.bot.user_repo.get_profile(user_id)
 
         if not user_data or not user_data.get('dmps_player_id'):
             await interaction.response.send_message("DMPSプレイヤーIDが登録されていません。`/register`コマンドで個人情報を登録してください。", ephemeral=True)
@@ -51,33 +56,43 @@ class TournamentCog(commands.Cog):
         dmps_player_id = user_data['dmps_player_id']
         await interaction.response.defer(ephemeral=True)
 
-        stats = await fetch_dmps_user_stats(dmps_player_id)
+        # 直近に取得済みならその値を即座に使う（同時の /load や定期更新とは取得を共有する）
+        stats, fetched_at = await dmps_stats_cache.get(dmps_player_id)
 
         if stats:
             new_rank, new_points = stats['rank'], stats['points']
-            conn = get_db_connection()
             try:
-                with conn.cursor() as cur:
-                    cur.execute("UPDATE users SET dmps_rank = %s, dmps_points = %s WHERE user_id = %s;", (new_rank, new_points, user_id))
-                conn.commit()
-                await interaction.followup.send(f"DMPS大会成績を更新したぞ！\n現在のランキング: `{new_rank}`位\n現在のポイント: `{new_points}`pt", ephemeral=True)
+                await self.bot.user_repo.update_dmps_stats(user_id, new_rank, new_points)
+                await interaction.followup.send(f"DMPS大会成績を更新したぞ！\n現在のランキング: `{new_rank}`位\n現在のポイント: `{new_points}`pt\n"
+                                                f"（{fetched_at.strftime('%H:%M')} 時点の成績）", ephemeral=True)
             except Exception as e:
-                if conn: conn.rollback()
+                mark_failed()
                 print(f"DB Error on /load command for user {user_id}: {e}")
                 await interaction.followup.send("成績の更新中にエラーが発生しました。", ephemeral=True)
-            finally:
-                if conn: conn.close()
         else:
             await interaction.followup.send("DMPS大会成績の取得に失敗しました。プレイヤーIDが正しいか、またはサイトにアクセスできるか確認してください。", ephemeral=True)
 
+    @tasks.loop(minutes=SCHEDULE_REFRESH_MINUTES)
+    @perf.job("refresh_schedule")
+    async def refresh_schedule(self):
+        await self.bot.schedule_store.refresh()
+
+    @refresh_schedule.before_loop
+    async def before_refresh_schedule(self):
+        # URLキャッシュのテーブルがマイグレーションで作られるまで待つ
+        await self.bot.db_ready.wait()
+
     @tasks.loop(time=NOTIFY_TIME)
+    @perf.job("check_tournaments_today")
     async def check_tournaments_today(self):
         await self.bot.wait_until_ready()
         if not (channel := self.bot.get_channel(CHANNEL_ID)):
             print(f"Error: Channel ID {CHANNEL_ID} not found.")
             return
 
-        all_tournaments = fetch_and_parse_tournaments()
+        # 通知前に最新化を試み、失敗しても前回のスナップショットで通知する
+        await self.bot.schedule_store.refresh()
+        all_tournaments = self.bot.schedule_store.tournaments
         if not all_tournaments: return
         
         today = datetime.now(JST).date()
@@ -93,57 +108,75 @@ class TournamentCog(commands.Cog):
                                    f"大会HP: {t['url']}\n")
             await channel.send("".join(message_parts))
 
+    @check_tournaments_today.before_loop
+    async def before_check_tournaments_today(self):
+        await self.bot.db_ready.wait()
+
     @tasks.loop(time=DMPS_UPDATE_TIME)
+    @perf.job("update_dmps_points_task")
     async def update_dmps_points_task(self):
         await self.bot.wait_until_ready()
-        conn = None
-        granted_notifications = []
+        started = time.perf_counter()
         
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=discord.psycopg2.extras.DictCursor) as cur:
-                cur.execute("SELECT user_id, dmps_player_id, dmps_points FROM users WHERE dmps_player_id IS NOT NULL;")
-                users_to_update = cur.fetchall()
-
-                if not users_to_update:
-                    print("[LOG] No users with DMPS Player ID registered.")
-                    return
-
-                for user_data in users_to_update:
-                    user_id, dmps_player_id = user_data['user_id'], user_data['dmps_player_id']
-                    old_points = user_data['dmps_points'] or 0
-                    stats = await fetch_dmps_user_stats(dmps_player_id)
-
-                    if stats:
-                        new_rank, new_points = stats['rank'], stats['points']
-                        point_increase = new_points - old_points
-                        credits_to_grant = point_increase * 10 if point_increase > 0 else 0
-
-                        if credits_to_grant > 0:
-                            if member := self.bot.get_user(user_id):
-                                granted_notifications.append(f"{member.display_name}さん: +{credits_to_grant} GTV ({point_increase} pts up)")
-                            else:
-                                granted_notifications.append(f"ユーザーID {user_id}: +{credits_to_grant} GTV ({point_increase} pts up)")
-
-                        cur.execute("UPDATE users SET dmps_rank = %s, dmps_points = %s, credits = credits + %s WHERE user_id = %s;",
-                                    (new_rank, new_points, credits_to_grant, user_id))
-                    else:
-                        print(f"[LOG] Failed to fetch DMPS stats for UserID: {dmps_player_id}")
-            
-            conn.commit()
+            users_to_update = await self.bot.user_repo.list_dmps_players()
+        except Exception as e:
+            mark_failed()
+            print(f"DB Error in update_dmps_points_task: {e}")
+            return
+
+        if not users_to_update:
+            print("[LOG] No users with DMPS Player ID registered.")
+            return
+
+        # 1. 取得（DBトランザクションは開かない。同時数は共有HTTPクライアントが制限する）
+        results = await asyncio.gather(*(dmps_stats_cache.get(u['dmps_player_id'], max_age=0) for u in users_to_update))
+        fetched_at = time.perf_counter()
+
+        # 2. 集約
+        fetched_stats, failed_count = [], 0
+        for user_data, (stats, _) in zip(users_to_update, results):
+            if stats:
+                fetched_stats.append((user_data['user_id'], stats['rank'], stats['points']))
+            else:
+                failed_count += 1
+                print(f"[LOG] Failed to fetch DMPS stats for UserID: {user_data['dmps_player_id']}")
+
+        # 3. 短いトランザクション1回でまとめて書き込む
+        try:
+            applied = await self.bot.user_repo.apply_dmps_stats(fetched_stats, credits_per_point=10)
+        except Exception as e:
+            mark_failed()
+            print(f"DB Error in update_dmps_points_task: {e}")
+            return
+        written_at = time.perf_counter()
+
+        print(f"[LOG] DMPS refresh: {len(users_to_update)} players, {failed_count} failed fetches, "
+              f"fetch {fetched_at - started:.2f}s, write {written_at - fetched_at:.2f}s")
 
+        granted_notifications = []
+        for row in applied:
+            if row['credits_granted'] <= 0:
+                continue
+            user_id, credits_to_grant, point_increase = row['user_id'], row['credits_granted'], row['point_increase']
+            if member := self.bot.get_user(user_id):
+                granted_notifications.append(f"{member.display_name}さん: +{credits_to_grant} GTV ({point_increase} pts up)")
+            else:
+                granted_notifications.append(f"ユーザーID {user_id}: +{credits_to_grant} GTV ({point_increase} pts up)")
+
+        try:
             if granted_notifications and BIRTHDAY_CHANNEL_ID:
                 if channel := self.bot.get_channel(BIRTHDAY_CHANNEL_ID):
                     message = "トーナメントランキングポイント増加によるGTV付与だぞ！みんなお疲れ様だ！\n" + "\n".join(granted_notifications)
                     await channel.send(message)
             elif not granted_notifications:
                 print("[LOG] No DMPS points increased today.")
+        except discord.HTTPException as e:
+            print(f"Failed to send DMPS notification: {e}")
 
-        except Exception as e:
-            if conn: conn.rollback()
-            print(f"DB Error in update_dmps_points_task: {e}")
-        finally:
-            if conn: conn.close()
+    @update_dmps_points_task.before_loop
+    async def before_update_dmps_points_task(self):
+        await self.bot.db_ready.wait()
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(TournamentCog(bot))
@@ -75,3 +75,58 @@ TAX_BRACKETS = [
     (400000, 0.40, 27960),
     (float('inf'), 0.45, 47960)
 ]
+
+# --- データベース接続プール ---
+DB_POOL_MIN_SIZE = _get_int_env("DB_POOL_MIN_SIZE", 1)
+DB_POOL_MAX_SIZE = _get_int_env("DB_POOL_MAX_SIZE", 5)
+DB_POOL_HEALTHCHECK_SECONDS = _get_int_env("DB_POOL_HEALTHCHECK_SECONDS", 30)
+
+# --- スクレイピングのHTTP設定 ---
+SCRAPER_CONCURRENCY = _get_int_env("SCRAPER_CONCURRENCY", 6)
+SCRAPER_HOST_INTERVAL_MS = _get_int_env("SCRAPER_HOST_INTERVAL_MS", 100)
+SCRAPER_TIMEOUT_SECONDS = _get_int_env("SCRAPER_TIMEOUT_SECONDS", 10)
+
+# --- 大会スケジュールのキャッシュ ---
+SCHEDULE_REFRESH_MINUTES = _get_int_env("SCHEDULE_REFRESH_MINUTES", 30)
+TONAMEL_CACHE_TTL_DAYS = _get_int_env("TONAMEL_CACHE_TTL_DAYS", 30)
+TONAMEL_NEGATIVE_CACHE_TTL_HOURS = _get_int_env("TONAMEL_NEGATIVE_CACHE_TTL_HOURS", 6)
+
+# --- DMPS成績のキャッシュ ---
+DMPS_STATS_FRESH_MINUTES = _get_int_env("DMPS_STATS_FRESH_MINUTES", 10)
+
+# --- 残高のライトビハインドキャッシュ ---
+# 0にするとキャッシュを使わず、毎回DBを直接更新する
+BALANCE_CACHE_ENABLED = _get_int_env("BALANCE_CACHE_ENABLED", 1)
+BALANCE_JOURNAL_PATH = os.getenv("BALANCE_JOURNAL_PATH", "data/credit_journal.jsonl")
+BALANCE_FLUSH_INTERVAL_MS = _get_int_env("BALANCE_FLUSH_INTERVAL_MS", 1000)
+BALANCE_CACHE_IDLE_SECONDS = _get_int_env("BALANCE_CACHE_IDLE_SECONDS", 600)
+CREDIT_LEDGER_RETENTION_DAYS = _get_int_env("CREDIT_LEDGER_RETENTION_DAYS", 90)
+
+# --- スロットのアニメーション（メッセージ編集の予算） ---
+ANIMATION_FRAME_INTERVAL_MS = _get_int_env("ANIMATION_FRAME_INTERVAL_MS", 1200)
+ANIMATION_CHANNEL_EDITS_PER_5S = _get_int_env("ANIMATION_CHANNEL_EDITS_PER_5S", 4)
+ANIMATION_GLOBAL_EDITS_PER_SECOND = _get_int_env("ANIMATION_GLOBAL_EDITS_PER_SECOND", 5)
+
+# --- /simulate（モンテカルロ） ---
+SIMULATION_MAX_TRIALS = _get_int_env("SIMULATION_MAX_TRIALS", 200000)
+SIMULATION_TIME_BUDGET_MS = _get_int_env("SIMULATION_TIME_BUDGET_MS", 2000)
+
+# --- 起動処理 ---
+# 1にするとコマンド定義が前回から変わっていなくても毎回 sync する
+FORCE_COMMAND_SYNC = _get_int_env("FORCE_COMMAND_SYNC", 0)
+
+# --- ヘルスチェック・メトリクスのHTTPサーバー ---
+HEALTH_PORT = _get_int_env("PORT", 5000)  # Renderなどのホスティングが PORT を渡してくる
+HEALTH_DB_TIMEOUT_MS = _get_int_env("HEALTH_DB_TIMEOUT_MS", 2000)
+HEALTH_DB_CACHE_SECONDS = _get_int_env("HEALTH_DB_CACHE_SECONDS", 5)
+# 大会スケジュールがこれより古いと /readyz を失敗にする（既定は更新間隔の3回分）
+HEALTH_SCHEDULE_MAX_AGE_MINUTES = _get_int_env("HEALTH_SCHEDULE_MAX_AGE_MINUTES", SCHEDULE_REFRESH_MINUTES * 3)
+
+# --- コマンドの所要時間の計測（/perf） ---
+PERF_SAMPLE_SIZE = _get_int_env("PERF_SAMPLE_SIZE", 1000)        # コマンドごとに保持する直近の件数
+PERF_SLOW_COMMAND_MS = _get_int_env("PERF_SLOW_COMMAND_MS", 2000)  # これ以上かかったらログに残す
+PERF_SLOW_LOG_SIZE = _get_int_env("PERF_SLOW_LOG_SIZE", 50)
+
+# --- イベントループの遅延の監視 ---
+LOOP_MONITOR_INTERVAL_MS = _get_int_env("LOOP_MONITOR_INTERVAL_MS", 100)
+LOOP_BLOCK_THRESHOLD_MS = _get_int_env("LOOP_BLOCK_THRESHOLD_MS", 250)  # これ以上止まったらスタックを記録する
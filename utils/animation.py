@@ -0,0 +1,215 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Deque, List
+
+import discord
+
+# =====================
+# メッセージ編集アニメーションの一括スケジューラ
+# =====================
+class _Bucket:
+    """トークンバケット。rate は1秒あたりの補充数。"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> bool:
+        return now >= self.paused_until and self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = time.monotonic() + seconds
+        self.tokens = 0
+
+    def full(self, now: float) -> bool:
+        return now >= self.paused_until and self.tokens >= self.burst
+
+
+class _State:
+    __slots__ = ("channel_id", "busy", "last_edit", "throttled")
+
+    def __init__(self, channel_id: int):
+        self.channel_id = channel_id
+        self.busy = False
+        self.last_edit = time.monotonic()
+        self.throttled = False      # 描画の時刻なのに予算が無くて待っている
+
+
+class AnimationScheduler:
+    """
+    スロットなどのメッセージ編集アニメーションをまとめて駆動する。
+
+    アニメーション側は channel_id 属性と async animate() -> bool（1フレーム描画。Falseなら終了）を持つ。
+    フレームは編集の直前に最新の状態から描画するので、溜まったフレームは自然に1回へまとまる。
+    編集回数はチャンネルごと・全体（メッセージ編集のルート）のトークンバケットで配分し、
+    予算が無い時はそのフレームを飛ばす。起動後のタスク数は台数に関係なく一定
+    （計画役1本 + 編集役 workers 本）。
+    """
+
+    def __init__(self, frame_interval: float = 1.2, channel_rate: float = 0.8, global_rate: float = 5.0,
+                 tick: float = 0.1, workers: int = 4):
+        self.frame_interval = frame_interval
+        self.channel_rate = channel_rate
+        self.global_rate = global_rate
+        self.tick = tick
+        self.workers = workers
+
+        self._states: Dict[object, _State] = {}
+        self._channels: "OrderedDict[int, Deque[object]]" = OrderedDict()
+        self._channel_buckets: Dict[int, _Bucket] = {}
+        self._global = _Bucket(global_rate, burst=max(global_rate, 1))
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+        # 統計
+        self.frames_rendered = 0
+        self.frames_skipped = 0     # 予算が無くて描画を見送ったフレーム数（アニメーションごと・フレームごとに1回）
+        self.rate_limited = 0
+
+    # ---- 登録 ----
+    def register(self, animation):
+        if animation in self._states:
+            return
+        channel_id = animation.channel_id
+        self._states[animation] = _State(channel_id)
+        self._channels.setdefault(channel_id, deque()).append(animation)
+        if channel_id not in self._channel_buckets:
+            self._channel_buckets[channel_id] = _Bucket(self.channel_rate, burst=1)
+        self._ensure_started()
+        self._wakeup.set()
+
+    def unregister(self, animation):
+        state = self._states.pop(animation, None)
+        if state is None:
+            return
+        ring = self._channels.get(state.channel_id)
+        if ring is not None:
+            try:
+                ring.remove(animation)
+            except ValueError:
+                pass
+            if not ring:
+                # バケットは残す（すぐ次のゲームが始まっても予算は満タンに戻らない）。
+                # 満タンまで回復したものは _plan_once で捨てる
+                del self._channels[state.channel_id]
+
+    def touch(self, animation):
+        """スケジューラ外（インタラクション応答など）で編集した直後に呼び、次のフレームを遅らせる。"""
+        state = self._states.get(animation)
+        if state is not None:
+            state.last_edit = time.monotonic()
+
+    # ---- 実行 ----
+    def _ensure_started(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._plan()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._work()))
+
+    async def _plan(self):
+        while True:
+            if not self._states:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            self._plan_once(time.monotonic())
+            await asyncio.sleep(self.tick)
+
+    def _plan_once(self, now: float):
+        self._global.refill(now)
+        served = []
+        for channel_id, ring in self._channels.items():
+            bucket = self._channel_buckets[channel_id]
+            bucket.refill(now)
+            for _ in range(len(ring)):
+                animation = ring[0]
+                state = self._states[animation]
+                if state.busy or now - state.last_edit < self.frame_interval:
+                    ring.rotate(-1)
+                    continue
+                if not (bucket.available(now) and self._global.available(now)):
+                    # 予算が無いのでこのフレームは飛ばす（次のtickで最新の状態を描く）
+                    self._skip_due(ring, now)
+                    break
+                bucket.take()
+                self._global.take()
+                state.busy = True
+                state.throttled = False
+                ring.rotate(-1)
+                self._queue.put_nowait(animation)
+                served.append(channel_id)
+        # 全体の予算を一部のチャンネルが使い切らないよう、描画したチャンネルは後ろに回す
+        for channel_id in served:
+            self._channels.move_to_end(channel_id)
+        # 動いているアニメーションが無く、予算が満タンまで回復したチャンネルのバケットを捨てる
+        idle = []
+        for channel_id, bucket in self._channel_buckets.items():
+            if channel_id not in self._channels:
+                bucket.refill(now)
+                if bucket.full(now):
+                    idle.append(channel_id)
+        for channel_id in idle:
+            del self._channel_buckets[channel_id]
+
+    def _skip_due(self, ring: Deque[object], now: float):
+        """描画の時刻なのに描けなかったアニメーションを数える（同じフレームが何tick待っても1回）。"""
+        for animation in ring:
+            state = self._states[animation]
+            if not state.busy and not state.throttled and now - state.last_edit >= self.frame_interval:
+                state.throttled = True
+                self.frames_skipped += 1
+
+    async def _work(self):
+        while True:
+            animation = await self._queue.get()
+            state = self._states.get(animation)
+            if state is None:
+                continue
+            keep = True
+            try:
+                keep = await animation.animate()
+                self.frames_rendered += 1
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    self.rate_limited += 1
+                    bucket = self._channel_buckets.get(state.channel_id)
+                    if bucket is not None:
+                        bucket.pause(5)
+                else:
+                    keep = False
+            except Exception as e:
+                print(f"[ERROR] Animation frame failed: {e}")
+                keep = False
+            finally:
+                state.busy = False
+                state.last_edit = time.monotonic()
+            if not keep:
+                self.unregister(animation)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": len(self._states),
+            "channels": len(self._channels),
+            "tasks": len(self._tasks),
+            "frames_rendered": self.frames_rendered,
+            "frames_skipped": self.frames_skipped,
+            "rate_limited": self.rate_limited,
+        }
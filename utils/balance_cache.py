@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, List, Tuple, Iterable
+
+# =====================
+# クレジット変動の記録
+# =====================
+@dataclass
+class LedgerEntry:
+    """1回のクレジット変動。entry_idでDBへの反映を冪等にする。"""
+    entry_id: str
+    user_id: int
+    delta: int
+    reason: str
+    created_at: float
+
+    @classmethod
+    def new(cls, user_id: int, delta: int, reason: str) -> "LedgerEntry":
+        return cls(uuid.uuid4().hex, user_id, delta, reason, time.time())
+
+
+class CreditJournal:
+    """
+    DBに未反映のクレジット変動を書き留めるローカルの追記ファイル（JSON Lines）。
+    同時に来た追記はまとめて1回のfsyncで永続化する（グループコミット）。
+    DBへの反映が済んだ行は compact() で取り除く。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # 書き込みと圧縮の順序を保つため、ファイル操作は1本のスレッドで行う
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._buffer: List[Tuple[str, asyncio.Future]] = []
+        self._writer: Optional[asyncio.Task] = None
+
+    async def append(self, entries: Iterable[LedgerEntry]):
+        """entriesがディスクに永続化されるまで待つ。"""
+        data = "".join(json.dumps(asdict(entry), separators=(",", ":")) + "\n" for entry in entries)
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((data, future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+        await future
+
+    async def _write_pending(self):
+        loop = asyncio.get_running_loop()
+        while self._buffer:
+            batch, self._buffer = self._buffer, []
+            try:
+                await loop.run_in_executor(self._executor, self._write, "".join(data for data, _ in batch))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _write(self, data: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read_all(self) -> List[LedgerEntry]:
+        """ジャーナル内の全エントリ。クラッシュで途中まで書かれた行は読み飛ばす。"""
+        entries = []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(LedgerEntry(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    async def compact(self, applied_ids: Iterable[str]):
+        """DBに反映済みのエントリをジャーナルから取り除く。"""
+        applied = set(applied_ids)
+        if applied:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._compact, applied)
+
+    def _compact(self, applied: set):
+        remaining = [entry for entry in self.read_all() if entry.entry_id not in applied]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in remaining:
+                f.write(json.dumps(asdict(entry), separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+# =====================
+# 残高のライトビハインドキャッシュ
+# =====================
+class BalanceCache:
+    """
+    よく使われるユーザーの残高をメモリに置き、ガチャ・スロット・送金などの
+    増減をメモリ上で処理する。変動はジャーナルにfsyncしてから応答し、
+    flush() で credit_ledger とusersテーブルにまとめて反映する。
+
+    - 残高チェックと減算は await を挟まずに行うので二重消費は起きない
+    - クラッシュしてもジャーナルを再生すれば反映漏れは無く、entry_idで二重反映も防ぐ
+    - キャッシュ外でクレジットを直接更新する処理は exclusive() / exclusive_all() の中で行う
+
+    1プロセスで動かす前提（同じDBに複数のBotを繋ぐ構成には対応しない）。
+    """
+
+    def __init__(self, store, journal: CreditJournal, idle_seconds: float = 600):
+        # store: load_balance(user_id) と apply_ledger(entries) を持つオブジェクト（UserRepository）
+        self.store = store
+        self.journal = journal
+        self.idle_seconds = idle_seconds
+
+        self._balances: Dict[int, int] = {}
+        self._last_used: Dict[int, float] = {}
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._pending: List[LedgerEntry] = []
+        self._flush_lock = asyncio.Lock()
+
+        # exclusive_all() 用のゲート
+        self._open = asyncio.Event()
+        self._open.set()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._active = 0
+        self._exclusive_lock = asyncio.Lock()
+
+        # 統計
+        self.operations = 0
+        self.flushes = 0
+        self.flushed_entries = 0
+        self.last_flush_seconds = 0.0
+
+    # ---- 内部処理 ----
+    def _lock_for(self, user_id: int) -> asyncio.Lock:
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def _operation(self):
+        while not self._open.is_set():
+            await self._open.wait()
+        self._active += 1
+        self._drained.clear()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self._drained.set()
+
+    @asynccontextmanager
+    async def _locked(self, user_ids: Iterable[int]):
+        # デッドロックを避けるため常にID順でロックする
+        locks = [self._lock_for(user_id) for user_id in sorted(set(user_ids))]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    async def _ensure_loaded(self, user_id: int) -> int:
+        if user_id not in self._balances:
+            self._balances[user_id] = await self.store.load_balance(user_id)
+        self._last_used[user_id] = time.monotonic()
+        return self._balances[user_id]
+
+    async def _commit(self, entries: List[LedgerEntry], previous: Dict[int, int]):
+        """ジャーナルに永続化してから未反映リストに積む。失敗したらメモリ上の残高を戻す。"""
+        try:
+            await self.journal.append(entries)
+        except Exception:
+            self._balances.update(previous)
+            raise
+        self._pending.extend(entries)
+        self.operations += 1
+
+    # ---- 公開API ----
+    async def debit(self, user_id: int, amount: int, reason: str) -> Tuple[bool, int]:
+        """残高が足りる場合のみ減算する。戻り値は (成功したか, 処理後の残高)。"""
+        async with self._operation(), self._locked([user_id]):
+            balance = await self._ensure_loaded(user_id)
+            if balance < amount:
+                return False, balance
+            self._balances[user_id] = balance - amount
+            await self._commit([LedgerEntry.new(user_id, -amount, reason)], {user_id: balance})
+            return True, balance - amount
+
+    async def credit(self, user_id: int, amount: int, reason: str) -> int:
+        """加算して処理後の残高を返す。"""
+        async with self._operation(), self._locked([user_id]):
+            balance = await self._ensure_loaded(user_id)
+            if amount == 0:
+                return balance
+            self._balances[user_id] = balance + amount
+            await self._commit([LedgerEntry.new(user_id, amount, reason)], {user_id: balance})
+            return balance + amount
+
+    async def transfer(self, sender_id: int, receiver_id: int, amount: int, reason: str) -> Tuple[bool, int]:
+        """送金する。戻り値は (成功したか, 送金者の処理後の残高)。"""
+        async with self._operation(), self._locked([sender_id, receiver_id]):
+            sender_balance = await self._ensure_loaded(sender_id)
+            receiver_balance = await self._ensure_loaded(receiver_id)
+            if sender_balance < amount:
+                return False, sender_balance
+            self._balances[sender_id] = sender_balance - amount
+            self._balances[receiver_id] = receiver_balance + amount
+            await self._commit(
+                [LedgerEntry.new(sender_id, -amount, reason), LedgerEntry.new(receiver_id, amount, reason)],
+                {sender_id: sender_balance, receiver_id: receiver_balance}
+            )
+            return True, sender_balance - amount
+
+    def cached_balance(self, user_id: int) -> Optional[int]:
+        """キャッシュ中なら最新の残高（DB未反映分を含む）を返す。"""
+        return self._balances.get(user_id)
+
+    async def flush(self):
+        """未反映の変動をDBにまとめて書き込み、済んだ分をジャーナルから消す。"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            started = time.perf_counter()
+            try:
+                await self.store.apply_ledger(batch)
+            except Exception:
+                # 次回に再送する（ジャーナルには残っている）
+                self._pending[:0] = batch
+                raise
+            self.flushes += 1
+            self.flushed_entries += len(batch)
+            self.last_flush_seconds = time.perf_counter() - started
+            await self.journal.compact(entry.entry_id for entry in batch)
+        self._evict_idle()
+
+    def _evict_idle(self):
+        pending_users = {entry.user_id for entry in self._pending}
+        threshold = time.monotonic() - self.idle_seconds
+        # ロック待ちのコルーチンが参照を持っている可能性があるので、ロック自体は捨てない
+        for user_id, last_used in list(self._last_used.items()):
+            lock = self._user_locks.get(user_id)
+            if last_used < threshold and user_id not in pending_users and not (lock and lock.locked()):
+                self._balances.pop(user_id, None)
+                self._last_used.pop(user_id, None)
+
+    @asynccontextmanager
+    async def exclusive(self, *user_ids: int):
+        """
+        指定ユーザーの変動を反映してキャッシュから外し、ブロック中はキャッシュ経由の操作を止める。
+        usersテーブルのクレジットを直接更新する処理はこの中で行う。
+        """
+        async with self._operation(), self._locked(user_ids):
+            await self.flush()
+            for user_id in user_ids:
+                self._balances.pop(user_id, None)
+                self._last_used.pop(user_id, None)
+            yield
+
+    @asynccontextmanager
+    async def exclusive_all(self):
+        """全ユーザー分を反映してキャッシュを空にし、ブロック中はキャッシュ経由の操作を全て止める。"""
+        async with self._exclusive_lock:
+            self._open.clear()
+            try:
+                await self._drained.wait()
+                await self.flush()
+                self._balances.clear()
+                self._last_used.clear()
+                yield
+            finally:
+                self._open.set()
+
+    async def replay(self):
+        """起動時に、前回DBへ反映できなかったジャーナルを反映する（反映済みの分は無視される）。"""
+        entries = self.journal.read_all()
+        if entries:
+            await self.store.apply_ledger(entries)
+            await self.journal.compact(entry.entry_id for entry in entries)
+            print(f"[LOG] Replayed {len(entries)} credit journal entries.")
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "cached_users": len(self._balances),
+            "pending_entries": len(self._pending),
+            "operations": self.operations,
+            "flushes": self.flushes,
+            "flushed_entries": self.flushed_entries,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
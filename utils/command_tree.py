@@ -0,0 +1,72 @@
+import traceback
+from typing import Optional
+
+from discord import Interaction, InteractionType, app_commands
+from discord.app_commands import AppCommandError, CheckFailure, CommandInvokeError, MissingAnyRole
+
+from utils.perf import Span, perf
+
+# interaction.extras に計測中のSpanを置くキー
+_SPAN_KEY = "perf_span"
+
+# =====================
+# スラッシュコマンドの共通処理
+# =====================
+def _command_name(interaction: Interaction) -> str:
+    """サブコマンドまで含めたコマンド名（例: "admin_credit set"）。"""
+    data = interaction.data or {}
+    parts = [data.get("name", "unknown")]
+    options = data.get("options", [])
+    # type 1 = サブコマンド, 2 = サブコマンドグループ
+    while options and options[0].get("type") in (1, 2):
+        parts.append(options[0]["name"])
+        options = options[0].get("options", [])
+    return " ".join(parts)
+
+
+class BotCommandTree(app_commands.CommandTree):
+    """
+    全てのスラッシュコマンドの所要時間を計測し、エラーを1か所で処理するCommandTree。
+
+    計測は discord.py の公開フックだけで行う。interaction_check（コマンドと同じタスクで、実行の直前に呼ばれる）で
+    始め、成功すれば app_command_completion イベント、失敗すれば on_error で終える。
+    """
+
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        client.add_listener(self._on_command_completion, "on_app_command_completion")
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        # オートコンプリートは計測しない
+        if interaction.type is InteractionType.application_command:
+            interaction.extras[_SPAN_KEY] = perf.start("command", _command_name(interaction))
+        return True
+
+    def _finish_span(self, interaction: Interaction, outcome: Optional[str] = None):
+        span: Optional[Span] = interaction.extras.pop(_SPAN_KEY, None)
+        if span is None:
+            return
+        if outcome is not None:
+            span.outcome = outcome
+        perf.finish(span)
+
+    async def _on_command_completion(self, interaction: Interaction, command):
+        self._finish_span(interaction)
+
+    async def on_error(self, interaction: Interaction, error: AppCommandError):
+        """スラッシュコマンドのエラーを処理するグローバルハンドラ"""
+        if isinstance(error, MissingAnyRole):
+            self._finish_span(interaction, "denied")
+            await interaction.response.send_message("このコマンドを実行する権限がないぞ！", ephemeral=True)
+            return
+
+        self._finish_span(interaction, "denied" if isinstance(error, CheckFailure) else "error")
+        # 予期しないエラーはどのコマンドで起きたかとトレースバックをコンソールに出力
+        original = error.original if isinstance(error, CommandInvokeError) else error
+        print(f"An unhandled app command error occurred in /{_command_name(interaction)}: {original!r}")
+        traceback.print_exception(type(original), original, original.__traceback__)
+        # ユーザーには汎用的なメッセージを返す
+        if not interaction.response.is_done():
+            await interaction.response.send_message("コマンドの実行中に予期せぬエラーが発生したぞ。", ephemeral=True)
+        else:
+            await interaction.followup.send("コマンドの実行中に予期せぬエラーが発生したぞ。", ephemeral=True)
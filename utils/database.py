@@ -1,8 +1,16 @@
 import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Tuple
 import psycopg2
 import psycopg2.extras
+import psycopg2.extensions
+import psycopg2.pool
 from urllib.parse import urlparse
 
+from utils.migrations import migrate
+
 def get_db_connection():
     """データベースへの接続を取得します（Render対応）"""
     database_url = os.getenv("DATABASE_URL")
@@ -20,61 +28,220 @@ def get_db_connection():
         sslmode="require"
     )
 
-def setup_database():
-    """データベースのテーブルをセットアップします。"""
-    conn = get_db_connection()
-    with conn.cursor() as cur:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                top100 INT,
-                nd_rate INT,
-                ad_rate INT,
-                player_id BIGINT,
-                achievements TEXT,
-                age INT,
-                birthday VARCHAR(5),
-                credits INT DEFAULT 0,
-                last_daily TIMESTAMP WITH TIME ZONE,
-                last_taxed_credits INT DEFAULT 0,
-                dmps_player_id TEXT,
-                dmps_rank INT,
-                dmps_points INT
-            )
-        """)
-
-        # 存在しない可能性のあるカラムを追加
-        columns_to_add = {
-            "credits": "INT DEFAULT 0",
-            "last_daily": "TIMESTAMP WITH TIME ZONE",
-            "last_taxed_credits": "INT DEFAULT 0",
-            "dmps_player_id": "TEXT",
-            "dmps_rank": "INT",
-            "dmps_points": "INT"
-        }
-
-        cur.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = 'users'
-        """)
-        existing_columns = [row[0] for row in cur.fetchall()]
-
-        for col, col_type in columns_to_add.items():
-            if col not in existing_columns:
-                cur.execute(f"ALTER TABLE users ADD COLUMN {col} {col_type};")
-
-    conn.commit()
-    conn.close()
-
-def get_user_profile(user_id: int):
-    """指定されたユーザーIDのプロフィールデータを取得します。"""
+# =====================
+# 接続プール
+# =====================
+class DatabasePool:
+    """
+    スレッドセーフなPostgreSQL接続プール。
+    最大数まで使い回し、空きが無い場合は返却を待つ。
+    一定時間アイドルだった接続は貸し出し前に生存確認する。
+    """
+
+    def __init__(self, min_size: int = 1, max_size: int = 5, healthcheck_seconds: int = 30, acquire_timeout: float = 30.0):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.healthcheck_seconds = healthcheck_seconds
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[object, float]] = []  # (接続, 返却時刻)
+        self._size = 0  # 現在プールが保持している接続数（貸出中 + アイドル）
+        self._closed = False
+
+        # 統計
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._discarded = 0
+        self._healthchecks_failed = 0
+
+    # ---- 内部処理 ----
+    def _connect(self):
+        conn = get_db_connection()
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+    # ---- 公開API ----
+    def warmup(self):
+        """最小数まで接続を事前に確立する。"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self):
+        """接続を借りる。空きが無ければ他の利用者の返却を待つ。"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._in_use += 1
+                    conn, returned_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise psycopg2.pool.PoolError("timed out waiting for a database connection")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        try:
+            if conn is not None:
+                idle_for = time.monotonic() - returned_at
+                if conn.closed or (idle_for >= self.healthcheck_seconds and not self._is_healthy(conn)):
+                    with self._cond:
+                        self._healthchecks_failed += 1
+                        self._discarded += 1
+                    self._discard(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard: bool = False):
+        """接続を返却する。壊れた接続やトランザクション途中の接続は破棄する。"""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        discard = discard or bool(conn.closed)
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard or self._closed:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        with文で接続を借りる。正常終了時はcommit、例外時はrollbackして返却する。
+        """
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except BaseException:
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    def stats(self) -> Dict[str, int]:
+        """プールサイズ調整用の統計情報。"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "created": self._created,
+                "discarded": self._discarded,
+                "healthchecks_failed": self._healthchecks_failed,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+    def close(self):
+        """アイドル接続を全て閉じ、以降の貸し出しを拒否する。"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_active_pool: Optional[DatabasePool] = None
+
+def set_active_pool(pool: Optional[DatabasePool]):
+    """db_connection() が使うプールを設定します（MyBotが所有）。"""
+    global _active_pool
+    _active_pool = pool
+
+@contextmanager
+def db_connection():
+    """
+    プールから接続を借りるコンテキストマネージャ。
+    プール未設定時（スクリプト実行など）は単発の接続を使う。
+    """
+    if _active_pool is not None:
+        with _active_pool.connection() as conn:
+            yield conn
+        return
+
     conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute(
-            "SELECT * FROM users WHERE user_id = %s",
-            (user_id,)
-        )
-        user_data = cur.fetchone()
-    conn.close()
-    return user_data
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def setup_database():
+    """データベースのスキーマを最新にします（最新なら schema_migrations を1回確認するだけ）。"""
+    with db_connection() as conn:
+        migrate(conn)
@@ -0,0 +1,162 @@
+import random
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# =====================
+# ダイス式の解析と実行（/roll）
+# =====================
+MAX_DICE = 10_000_000       # 1項あたりのダイス数の上限
+MAX_SIDES = 1_000_000
+MAX_TERMS = 10
+DETAIL_LIMIT = 100          # これ以下のダイス数なら出目を1つずつ表示する
+MULTINOMIAL_MAX_SIDES = 10_000  # これ以下の面数は面ごとの出現数を多項分布から直接サンプリングする
+CHUNK_SIZE = 1_000_000
+
+_TOKEN_PATTERN = re.compile(r'\s*([+-])?\s*(?:(\d*)d(\d+|%)(?:(kh|kl)(\d+))?|(\d+))\s*', re.IGNORECASE)
+
+@dataclass
+class DiceTerm:
+    sign: int
+    count: int
+    sides: int
+    keep: Optional[str] = None   # "kh"（高い方を残す）/ "kl"（低い方を残す）
+    keep_count: int = 0
+
+    @property
+    def notation(self) -> str:
+        keep = f"{self.keep}{self.keep_count}" if self.keep else ""
+        return f"{self.count}d{self.sides}{keep}"
+
+    @property
+    def kept(self) -> int:
+        return min(self.keep_count, self.count) if self.keep else self.count
+
+
+@dataclass
+class TermResult:
+    term: DiceTerm
+    total: int
+    low: int                                  # 残した出目の最小
+    high: int                                 # 残した出目の最大
+    rolls: Optional[List[int]] = None         # 少数のときだけ出目を全て持つ
+    dropped: List[int] = field(default_factory=list)  # rolls 中の捨てた出目の位置
+    face_counts: Optional["np.ndarray"] = None  # 多数のとき、残した出目の面ごとの出現数（index 0 が1の目）
+
+
+@dataclass
+class RollResult:
+    expression: str
+    total: int
+    terms: List[TermResult]
+    modifier: int
+
+    @property
+    def detailed(self) -> bool:
+        return all(result.rolls is not None for result in self.terms)
+
+
+def parse_expression(text: str) -> Tuple[List[DiceTerm], int]:
+    """`4d6kh3`, `2d20+5`, `1000000d6 - 2d4` のような式を (ダイスの項, 固定値の合計) に分解する。"""
+    text = text.strip()
+    if not text:
+        raise ValueError("ダイス式を入力してくれ！")
+    position, terms, modifier = 0, [], 0
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError("ダイス式の形式が正しくないぞ！例: `3d6`, `4d6kh3`, `2d20+5`")
+        if position > 0 and not match.group(1):
+            raise ValueError("項と項の間には + か - を入れてくれ。")
+        position = match.end()
+        sign = -1 if match.group(1) == "-" else 1
+        if match.group(6) is not None:
+            modifier += sign * int(match.group(6))
+            continue
+        count = int(match.group(2) or 1)
+        sides = 100 if match.group(3) == "%" else int(match.group(3))
+        keep, keep_count = (match.group(4) or "").lower() or None, int(match.group(5) or 0)
+        if not (0 < count <= MAX_DICE and 0 < sides <= MAX_SIDES):
+            raise ValueError(f"ダイスの数は1〜{MAX_DICE:,}、面の数は1〜{MAX_SIDES:,}で指定してくれ！")
+        if keep and keep_count < 1:
+            raise ValueError("残す個数は1以上で指定してくれ。")
+        terms.append(DiceTerm(sign, count, sides, keep, keep_count))
+    if len(terms) > MAX_TERMS:
+        raise ValueError(f"ダイスの項は{MAX_TERMS}個までにしてくれ。")
+    return terms, modifier
+
+
+def _roll_detailed(term: DiceTerm, rng: random.Random) -> TermResult:
+    rolls = [rng.randint(1, term.sides) for _ in range(term.count)]
+    dropped: List[int] = []
+    if term.keep:
+        order = sorted(range(len(rolls)), key=rolls.__getitem__, reverse=(term.keep == "kh"))
+        dropped = sorted(order[term.kept:])
+    dropped_set = set(dropped)
+    kept = [roll for i, roll in enumerate(rolls) if i not in dropped_set]
+    return TermResult(term, sum(kept), min(kept), max(kept), rolls=rolls, dropped=dropped)
+
+
+def _roll_counts(term: DiceTerm, generator: "np.random.Generator") -> TermResult:
+    import numpy as np
+    # 面ごとの出現数を多項分布から1回でサンプリングする（ダイス数によらず面の数に比例した手間）
+    counts = generator.multinomial(term.count, np.full(term.sides, 1 / term.sides))
+    if term.keep:
+        # 高い（低い）面から順に残す個数だけ取り、残りを捨てる
+        ordered = counts[::-1] if term.keep == "kh" else counts
+        remaining = np.maximum(term.kept - (np.cumsum(ordered) - ordered), 0)
+        kept = np.minimum(ordered, remaining)
+        counts = kept[::-1] if term.keep == "kh" else kept
+    faces = np.nonzero(counts)[0]
+    total = int(np.dot(counts, np.arange(1, term.sides + 1, dtype=np.int64)))
+    return TermResult(term, total, int(faces[0]) + 1, int(faces[-1]) + 1, face_counts=counts)
+
+
+def _roll_chunked(term: DiceTerm, generator: "np.random.Generator") -> TermResult:
+    import numpy as np
+    # 面が多い場合は一定量ずつ生成して合計と最小・最大だけを集計する
+    if term.keep:
+        raise ValueError(f"{MULTINOMIAL_MAX_SIDES:,}面を超えるダイスを{DETAIL_LIMIT}個より多く振るときは kh/kl を使えないぞ。")
+    total, low, high, remaining = 0, term.sides, 1, term.count
+    while remaining:
+        size = min(remaining, CHUNK_SIZE)
+        chunk = generator.integers(1, term.sides + 1, size=size, dtype=np.int64)
+        total += int(chunk.sum())
+        low, high = min(low, int(chunk.min())), max(high, int(chunk.max()))
+        remaining -= size
+    return TermResult(term, total, low, high)
+
+
+def roll(expression: str, rng: Optional[random.Random] = None, generator: Optional["np.random.Generator"] = None) -> RollResult:
+    """
+    ダイス式を振る。ダイス数が多い項は配列を作らずに集計だけを返す。
+    NumPyは多数のダイスを振るときだけ読み込む。
+    """
+    terms, modifier = parse_expression(expression)
+    rng = rng or random.Random()
+    if generator is None and any(term.count > DETAIL_LIMIT for term in terms):
+        import numpy as np
+        generator = np.random.default_rng()
+    results = []
+    for term in terms:
+        if term.count <= DETAIL_LIMIT:
+            results.append(_roll_detailed(term, rng))
+        elif term.sides <= MULTINOMIAL_MAX_SIDES:
+            results.append(_roll_counts(term, generator))
+        else:
+            results.append(_roll_chunked(term, generator))
+    total = sum(result.term.sign * result.total for result in results) + modifier
+    return RollResult(expression.strip(), total, results, modifier)
+
+
+def histogram(face_counts: "np.ndarray", bins: int = 10) -> List[Tuple[int, int, int]]:
+    """面ごとの出現数を最大 bins 区間にまとめる。戻り値は (区間の最小の目, 最大の目, 出現数)。"""
+    import numpy as np
+    sides = len(face_counts)
+    if sides <= bins:
+        return [(face + 1, face + 1, int(count)) for face, count in enumerate(face_counts)]
+    edges = np.linspace(0, sides, bins + 1).astype(int)
+    return [(int(start) + 1, int(end), int(face_counts[start:end].sum())) for start, end in zip(edges[:-1], edges[1:])]
@@ -0,0 +1,68 @@
+import random
+from collections import Counter
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from config import GACHA_RATES, GACHA_PRIZES
+
+# これを超える回数は1行ずつではなくレアリティ別の集計で表示する
+DETAIL_PULL_LIMIT = 10
+MAX_PULLS = 1000
+
+@dataclass(frozen=True)
+class Pull:
+    rarity: str
+    rank: int      # 0が最高レア
+    prize: str     # 先頭の【レアリティ】を除いた本文
+
+
+@dataclass
+class PullSummary:
+    count: int
+    counts: List[Tuple[str, int]]  # レアリティ順の (レアリティ, 排出数)。0件のレアリティも含む
+    best: Pull
+
+
+class GachaEngine:
+    """
+    レアリティ表と景品表から起動時に1度だけ組み立てるガチャ抽選器。
+    累積重みを前計算しておき、N回分を random.choices の1回の呼び出しで抽選する。
+    レアリティの順位は rates の定義順（先頭が最高レア）。
+    """
+
+    def __init__(self, rates: Dict[str, float], prizes: Dict[str, List[str]], rng: Optional[random.Random] = None):
+        self.rarities: Tuple[str, ...] = tuple(rates)
+        self._indices = range(len(self.rarities))
+        self._cum_weights = list(accumulate(rates[rarity] for rarity in self.rarities))
+        self._prizes: Tuple[Tuple[str, ...], ...] = tuple(
+            tuple(prize.replace(f"【{rarity}】", "").strip() for prize in prizes.get(rarity, [])) or ("エラー",)
+            for rarity in self.rarities
+        )
+        self._rng = rng or random.Random()
+
+    def prize_texts(self) -> List[str]:
+        """全景品の本文（絵文字の事前置換用）。"""
+        return [prize for prizes in self._prizes for prize in prizes]
+
+    def _draw_ranks(self, count: int) -> List[int]:
+        return self._rng.choices(self._indices, cum_weights=self._cum_weights, k=count)
+
+    def _pull_at(self, rank: int) -> Pull:
+        return Pull(self.rarities[rank], rank, self._rng.choice(self._prizes[rank]))
+
+    def pull(self, count: int) -> List[Pull]:
+        """count回抽選し、レアリティの高い順に並べて返す。"""
+        return [self._pull_at(rank) for rank in sorted(self._draw_ranks(count))]
+
+    def pull_summary(self, count: int) -> PullSummary:
+        """count回抽選し、レアリティ別の排出数と最高レアの1枚だけを返す。"""
+        counter = Counter(self._draw_ranks(count))
+        return PullSummary(
+            count=count,
+            counts=[(rarity, counter.get(rank, 0)) for rank, rarity in enumerate(self.rarities)],
+            best=self._pull_at(min(counter))
+        )
+
+
+gacha_engine = GachaEngine(GACHA_RATES, GACHA_PRIZES)
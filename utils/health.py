@@ -0,0 +1,166 @@
+import asyncio
+import math
+import time
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+from utils.metrics import metrics
+
+# =====================
+# ヘルスチェックとメトリクスのHTTPサーバー
+# =====================
+# Botと同じイベントループ上で動く。スレッドや別のWebフレームワークは使わない。
+#   /         … Keep Alive 用（Render等のポートの確認）
+#   /healthz  … プロセスとイベントループが応答しているか
+#   /readyz   … ゲートウェイ接続・DB・大会スケジュールの鮮度を確認し、どれかが駄目なら503
+#   /metrics  … Prometheus形式のメトリクス
+
+class HealthServer:
+    def __init__(self, bot, host: str, port: int, db_timeout: float = 2.0, db_cache_seconds: float = 5.0,
+                 schedule_max_age: float = 5400.0):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.db_timeout = db_timeout
+        self.db_cache_seconds = db_cache_seconds
+        self.schedule_max_age = schedule_max_age
+        self._runner: Optional[web.AppRunner] = None
+        # 監視が頻繁に来てもDBを叩きすぎないよう、直近の結果をしばらく使い回す
+        self._db_result: Optional[Tuple[float, bool, str]] = None
+        self._db_check: Optional[asyncio.Task] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/", self.home)
+        self.app.router.add_get("/healthz", self.healthz)
+        self.app.router.add_get("/readyz", self.readyz)
+        self.app.router.add_get("/metrics", self.metrics_page)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"[LOG] Health server listening on {self.host}:{self.port}")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ---- ハンドラ ----
+    async def home(self, request: web.Request) -> web.Response:
+        return web.Response(text="Discord bot is running!")
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        checks = {
+            "gateway": self._check_gateway(),
+            "database": await self._check_database(),
+            "schedule": self._check_schedule(),
+        }
+        ready = all(ok for ok, _ in checks.values())
+        return web.json_response(
+            {"ready": ready, "checks": {name: {"ok": ok, "detail": detail} for name, (ok, detail) in checks.items()}},
+            status=200 if ready else 503
+        )
+
+    async def metrics_page(self, request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    # ---- 各チェック ----
+    def _check_gateway(self) -> Tuple[bool, str]:
+        if self.bot.is_closed():
+            return False, "closed"
+        if not self.bot.is_ready():
+            return False, "connecting"
+        latency = self.bot.latency
+        if not math.isfinite(latency):
+            return False, "no heartbeat"
+        return True, f"latency {latency * 1000:.0f}ms"
+
+    async def _check_database(self) -> Tuple[bool, str]:
+        if self._db_result is not None and time.monotonic() - self._db_result[0] < self.db_cache_seconds:
+            return self._db_result[1:]
+        # 同時に来たチェックは1本のpingを共有する
+        if self._db_check is None or self._db_check.done():
+            self._db_check = asyncio.create_task(self._ping_database())
+        return await asyncio.shield(self._db_check)
+
+    async def _ping_database(self) -> Tuple[bool, str]:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(loop.run_in_executor(self.bot.db_executor, self._ping), self.db_timeout)
+            result = (True, f"{(time.perf_counter() - started) * 1000:.0f}ms")
+        except asyncio.TimeoutError:
+            result = (False, f"timeout after {self.db_timeout:.1f}s")
+        except Exception as e:
+            result = (False, type(e).__name__)
+        self._db_result = (time.monotonic(), *result)
+        return result
+
+    def _ping(self):
+        with self.bot.db_pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+
+    def _check_schedule(self) -> Tuple[bool, str]:
+        age = self.bot.schedule_store.age_seconds()
+        if age is None:
+            return False, "not fetched yet"
+        if age > self.schedule_max_age:
+            return False, f"stale ({age / 60:.0f}min)"
+        return True, f"{age / 60:.0f}min old"
+
+
+def bot_metrics_collector(bot):
+    """Botが持つ各部品の統計を、/metrics の収集時に読み出す関数を返す。"""
+
+    def collect():
+        pool = bot.db_pool.stats()
+        yield ("db_pool_connections", "DB接続プールの接続数", "gauge",
+               [({"state": "in_use"}, pool["in_use"]), ({"state": "idle"}, pool["idle"]),
+                ({"state": "waiting"}, pool["waiting"]), ({"state": "max"}, pool["max_size"])])
+        yield ("db_pool_created_total", "作成したDB接続の数", "counter", [({}, pool["created"])])
+        yield ("db_pool_discarded_total", "破棄したDB接続の数", "counter", [({}, pool["discarded"])])
+
+        latency = bot.latency
+        yield ("gateway_latency_seconds", "ゲートウェイのハートビート遅延", "gauge",
+               [({}, latency if math.isfinite(latency) else float("nan"))])
+        yield ("gateway_ready", "ゲートウェイに接続済みなら1", "gauge", [({}, int(bot.is_ready() and not bot.is_closed()))])
+        yield ("guilds", "参加しているサーバー数", "gauge", [({}, len(bot.guilds))])
+
+        schedule = bot.schedule_store.status()
+        age = schedule["age_seconds"]
+        yield ("schedule_age_seconds", "大会スケジュールを取得してからの経過秒数", "gauge",
+               [({}, age if age is not None else float("nan"))])
+        yield ("schedule_consecutive_failures", "大会スケジュール取得の連続失敗回数", "gauge",
+               [({}, schedule["consecutive_failures"])])
+
+        balances = bot.user_repo.balances
+        if balances is not None:
+            stats = balances.stats()
+            yield ("balance_cache_users", "残高キャッシュ中のユーザー数", "gauge", [({}, stats["cached_users"])])
+            yield ("balance_cache_pending_entries", "DBに未反映のクレジット変動数", "gauge", [({}, stats["pending_entries"])])
+            yield ("balance_cache_flushed_entries_total", "DBに反映したクレジット変動数", "counter", [({}, stats["flushed_entries"])])
+
+        animations = bot.animations.stats()
+        yield ("slot_animations_active", "回転表示中のスロット数", "gauge", [({}, animations["active"])])
+        yield ("slot_animation_frames_total", "スロットの描画フレーム数", "counter",
+               [({"result": "rendered"}, animations["frames_rendered"]), ({"result": "skipped"}, animations["frames_skipped"]),
+                ({"result": "rate_limited"}, animations["rate_limited"])])
+
+        loop = bot.loop_monitor.stats()
+        yield ("event_loop_lag_recent_seconds", "直近1分間のイベントループの遅延", "gauge",
+               [({"quantile": "0.5"}, loop["p50"]), ({"quantile": "0.99"}, loop["p99"]), ({"quantile": "1"}, loop["max"])])
+        yield ("event_loop_stalled_seconds", "今イベントループが止まっている秒数（止まっていなければ0）", "gauge",
+               [({}, loop["stalled_now"])])
+
+        if bot.startup_timings:
+            yield ("startup_phase_seconds", "起動処理の各段階にかかった秒数", "gauge",
+                   [({"phase": name}, seconds) for name, seconds in bot.startup_timings.items()])
+
+    return collect
@@ -1,22 +1,41 @@
 
 import re
+from typing import Dict, Iterable
 from discord.ext import commands
 
+_EMOJI_PATTERN = re.compile(r':(\w+):')
+
+class EmojiIndex:
+    """
+    ボットが利用可能なカスタム絵文字の 名前->絵文字文字列 の索引。
+    絵文字・参加サーバーの変化イベントで rebuild() し、
+    static_texts（ガチャの景品文など）はその時点で置換済みの文字列を作っておく。
+    """
+
+    def __init__(self, static_texts: Iterable[str] = ()):
+        self._static_texts = tuple(dict.fromkeys(static_texts))
+        self._emoji_map: Dict[str, str] = {}
+        self._rendered: Dict[str, str] = {}
+
+    def rebuild(self, emojis: Iterable):
+        # 同名の絵文字は後に見つかった方を使う（従来の辞書内包表記と同じ）
+        self._emoji_map = {emoji.name: str(emoji) for emoji in emojis}
+        self._rendered = {text: self._substitute(text) for text in self._static_texts}
+
+    def _substitute(self, text: str) -> str:
+        emoji_map = self._emoji_map
+        return _EMOJI_PATTERN.sub(lambda m: emoji_map.get(m.group(1), m.group(0)), text)
+
+    def format(self, text: str) -> str:
+        rendered = self._rendered.get(text)
+        return rendered if rendered is not None else self._substitute(text)
+
+    def __len__(self) -> int:
+        return len(self._emoji_map)
+
+
 def format_emojis(text: str, bot_instance: commands.Bot) -> str:
     """
     テキスト内の :emoji_name: 形式の文字列を、ボットが利用可能なカスタム絵文字に置換する。
     """
-    # :word: というパターンの文字列をすべて見つける
-    potential_emoji_names = re.findall(r':(\w+):', text)
-    if not potential_emoji_names:
-        return text
-
-    # ボットがアクセスできる全絵文字の 名前->絵文字オブジェクト の辞書を作成
-    emoji_map = {emoji.name: str(emoji) for emoji in bot_instance.emojis}
-
-    # 見つかった絵文字名を置換していく
-    for name in potential_emoji_names:
-        if name in emoji_map:
-            text = text.replace(f':{name}:', emoji_map[name])
-    
-    return text
+    return bot_instance.emoji_index.format(text)
@@ -0,0 +1,192 @@
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from config import JST
+from utils.metrics import metrics
+
+# =====================
+# イベントループの遅延の監視
+# =====================
+# ループ側のタスクが interval ごとに起きて「予定より何秒遅れて起きたか」を記録し、
+# 別スレッドの見張りが「最後に起きてから threshold 以上経っている」のを見つけたら、
+# その時点のループのスレッドのスタックを取り出して、どこで止まっているかを記録する。
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_lag = metrics.histogram("event_loop_lag_seconds", "イベントループの遅延（予定より遅れて起きた秒数）",
+                         buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+_blocked_total = metrics.counter("event_loop_blocked_total", "イベントループがしきい値以上止まった回数")
+_blocked_seconds = metrics.counter("event_loop_blocked_seconds_total", "しきい値以上止まっていた時間の合計")
+
+
+@dataclass
+class BlockingSite:
+    """同じ場所で止まった記録をまとめたもの。"""
+    location: str                   # 止まっていたプロジェクト内の一番内側の行
+    stack: List[str]
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seen: Optional[datetime] = None
+
+
+@dataclass
+class _Stall:
+    started: float
+    location: str
+    stack: List[str] = field(default_factory=list)
+
+
+def _summarize_stack(frame) -> tuple:
+    """(場所, 表示用のスタック)。場所はプロジェクト内の一番内側のフレーム（無ければ一番内側）。"""
+    entries = traceback.extract_stack(frame)
+
+    def in_project(entry) -> bool:
+        return os.path.abspath(entry.filename).startswith(_PROJECT_ROOT + os.sep)
+
+    def label(entry) -> str:
+        path = os.path.abspath(entry.filename)
+        name = os.path.relpath(path, _PROJECT_ROOT) if in_project(entry) else os.path.basename(path)
+        return f"{name}:{entry.lineno} {entry.name}"
+
+    project = [entry for entry in entries if in_project(entry)]
+    location = label((project or entries)[-1])
+    # イベントループ本体の部分は省き、止まっているコールバック（Handle._run の内側）だけを残す
+    boundaries = [i for i, entry in enumerate(entries)
+                  if entry.name == "_run" and os.path.basename(entry.filename) == "events.py"]
+    start = boundaries[-1] + 1 if boundaries else max(0, len(entries) - 8)
+    stack = [label(entry) + (f" — {entry.line}" if entry.line else "") for entry in entries[start:]]
+    return location, stack
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, max_sites: int = 50, window: float = 60.0):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_sites = max_sites
+        self._recent: Deque[tuple] = deque()     # (time.monotonic(), lag) の直近 window 秒分
+        self._window = window
+        self._sites: Dict[str, BlockingSite] = {}
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._stall: Optional[_Stall] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.blocked_count = 0
+
+    def start(self):
+        """イベントループ上で呼ぶ。"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def close(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join, 1.0)
+            self._watchdog = None
+
+    # ---- ループ側 ----
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            _lag.observe(lag)
+            with self._lock:
+                self._last_beat = now
+                self._recent.append((now, lag))
+                while self._recent and self._recent[0][0] < now - self._window:
+                    self._recent.popleft()
+                stall, self._stall = self._stall, None
+            if stall is not None:
+                self._finish_stall(stall, now - stall.started)
+
+    def _finish_stall(self, stall: _Stall, seconds: float):
+        self.blocked_count += 1
+        _blocked_total.inc()
+        _blocked_seconds.inc(seconds)
+        with self._lock:
+            site = self._sites.get(stall.location)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    # 一番少ない場所を捨てる
+                    del self._sites[min(self._sites, key=lambda key: self._sites[key].total_seconds)]
+                site = self._sites[stall.location] = BlockingSite(stall.location, stall.stack)
+            site.count += 1
+            site.total_seconds += seconds
+            site.max_seconds = max(site.max_seconds, seconds)
+            site.last_seen = datetime.now(JST)
+            site.stack = stall.stack
+        print(f"[LOG] Event loop blocked for {seconds * 1000:.0f}ms at {stall.location}")
+
+    # ---- 見張りスレッド側 ----
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            with self._lock:
+                since = self._last_beat
+                already = self._stall is not None
+            # 心拍の予定時刻（since + interval）から threshold 以上遅れていたら止まっている
+            if already or time.monotonic() - since < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            location, stack = _summarize_stack(frame)
+            del frame
+            with self._lock:
+                if self._last_beat == since and self._stall is None:
+                    # 止まり始めたのは最後の心拍の予定時刻
+                    self._stall = _Stall(since + self.interval, location, stack)
+
+    # ---- 集計 ----
+    def stats(self) -> Dict:
+        with self._lock:
+            lags = sorted(lag for _, lag in self._recent)
+            stalled = time.monotonic() - self._last_beat - self.interval if self._stall is not None else 0.0
+
+        def percentile(q):
+            return lags[max(0, math.ceil(q * len(lags)) - 1)] if lags else 0.0
+        return {
+            "samples": len(lags),
+            "p50": percentile(0.50),
+            "p99": percentile(0.99),
+            "max": lags[-1] if lags else 0.0,
+            "blocked": self.blocked_count,
+            "sites": len(self._sites),
+            "stalled_now": max(0.0, stalled),
+        }
+
+    def report(self, limit: int = 10) -> List[BlockingSite]:
+        """止まっていた時間の合計が長い順。"""
+        with self._lock:
+            sites = list(self._sites.values())
+        return sorted(sites, key=lambda site: site.total_seconds, reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
@@ -0,0 +1,182 @@
+"""
+スキーマのマイグレーション。
+
+適用済みのバージョンを schema_migrations テーブルに記録し、未適用のものだけを順に実行する。
+起動時はバージョンを1回問い合わせるだけで、最新なら何もしない。
+
+ローカルのPostgresに対して直接実行することもできる:
+
+    python -m utils.migrations --database-url postgresql://postgres@localhost/postgres
+    python -m utils.migrations --database-url ... --status
+"""
+import argparse
+from typing import List, Optional, Tuple
+
+import psycopg2
+import psycopg2.errors
+
+# 複数プロセスが同時に起動しても1つずつ適用されるようにするための advisory lock のキー
+ADVISORY_LOCK_KEY = 0x646d7073  # "dmps"
+
+# =====================
+# マイグレーション一覧（追加は末尾に。適用済みのものは書き換えない）
+# =====================
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "users テーブル", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            top100 INT,
+            nd_rate INT,
+            ad_rate INT,
+            player_id BIGINT,
+            achievements TEXT,
+            age INT,
+            birthday VARCHAR(5),
+            credits INT DEFAULT 0,
+            last_daily TIMESTAMP WITH TIME ZONE,
+            last_taxed_credits INT DEFAULT 0,
+            dmps_player_id TEXT,
+            dmps_rank INT,
+            dmps_points INT
+        )
+        """,
+        # 古いデプロイで後から足されたカラム
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS credits INT DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS last_daily TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS last_taxed_credits INT DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS dmps_player_id TEXT",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS dmps_rank INT",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS dmps_points INT",
+    ]),
+    (2, "ランキング・所得税用のクレジットのインデックス", [
+        # クレジット保有者だけを所持数順に並べる
+        """
+        CREATE INDEX IF NOT EXISTS users_credits_rank_idx
+        ON users (credits DESC, user_id) WHERE credits > 0
+        """,
+    ]),
+    (3, "Tonamel URLキャッシュ", [
+        """
+        CREATE TABLE IF NOT EXISTS tonamel_url_cache (
+            details_url TEXT PRIMARY KEY,
+            tonamel_url TEXT NOT NULL DEFAULT '',
+            checked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """,
+    ]),
+    (4, "クレジット変動の記録（残高キャッシュ用）", [
+        """
+        CREATE TABLE IF NOT EXISTS credit_ledger (
+            entry_id UUID PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            delta BIGINT NOT NULL,
+            reason TEXT NOT NULL DEFAULT '',
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS credit_ledger_created_at_idx ON credit_ledger (created_at)",
+    ]),
+    (5, "誕生日・DMPS連携のインデックス", [
+        # 毎日の誕生日チェック（WHERE birthday = 'MM-DD'）
+        "CREATE INDEX IF NOT EXISTS users_birthday_idx ON users (birthday) WHERE birthday IS NOT NULL",
+        # DMPSポイント更新（WHERE dmps_player_id IS NOT NULL）。連携しているユーザーだけを持つ
+        "CREATE INDEX IF NOT EXISTS users_dmps_player_idx ON users (user_id) WHERE dmps_player_id IS NOT NULL",
+    ]),
+    (6, "Botの状態（コマンド同期のフィンガープリントなど）", [
+        """
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# =====================
+# 実行
+# =====================
+def current_version(conn) -> int:
+    """
+    適用済みの最新バージョン。schema_migrations が無ければ0。
+    テーブルが無い時はトランザクションをロールバックするので、トランザクションの最初に呼ぶこと。
+    """
+    with conn.cursor() as cur:
+        try:
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        except psycopg2.errors.UndefinedTable:
+            conn.rollback()
+            return 0
+        return cur.fetchone()[0]
+
+
+def migrate(conn, target: Optional[int] = None) -> List[int]:
+    """
+    未適用のマイグレーションを適用し、適用したバージョンのリストを返す。
+    新しいトランザクションの最初に呼び、コミットは呼び出し側に任せる。
+    """
+    target = LATEST_VERSION if target is None else target
+    if current_version(conn) >= target:
+        return []
+
+    with conn.cursor() as cur:
+        # 他のプロセスが適用中なら終わるまで待ち、その後に改めてバージョンを確認する
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (ADVISORY_LOCK_KEY,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+            )
+        """)
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        version = cur.fetchone()[0]
+
+        applied = []
+        for number, description, steps in MIGRATIONS:
+            if number <= version or number > target:
+                continue
+            for statement in steps:
+                cur.execute(statement)
+            cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (number, description))
+            print(f"[LOG] Applied migration {number}: {description}")
+            applied.append(number)
+    return applied
+
+
+def status(conn) -> List[Tuple[int, str, Optional[str]]]:
+    """(バージョン, 説明, 適用日時 or None) の一覧。"""
+    applied = {}
+    if current_version(conn) > 0:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version, applied_at FROM schema_migrations")
+            applied = {version: applied_at.isoformat() for version, applied_at in cur.fetchall()}
+    return [(number, description, applied.get(number)) for number, description, _ in MIGRATIONS]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="データベースのマイグレーションを適用する")
+    parser.add_argument("--database-url", required=True, help="例: postgresql://postgres@localhost/postgres")
+    parser.add_argument("--target", type=int, help="このバージョンまで適用する（既定は最新）")
+    parser.add_argument("--status", action="store_true", help="適用状況を表示するだけで何もしない")
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        if args.status:
+            for number, description, applied_at in status(conn):
+                print(f"{number:4d}  {'applied ' + applied_at if applied_at else 'pending':40s}  {description}")
+            return
+        applied = migrate(conn, args.target)
+        conn.commit()
+        print(f"Applied {len(applied)} migration(s). Schema version: {current_version(conn)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
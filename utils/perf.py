@@ -0,0 +1,187 @@
+import functools
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from config import PERF_SAMPLE_SIZE, PERF_SLOW_COMMAND_MS, PERF_SLOW_LOG_SIZE, JST
+from utils.metrics import metrics
+
+# =====================
+# コマンド・定期処理の所要時間の計測
+# =====================
+# 実行中のコマンドやジョブを ContextVar に置き、DB呼び出し（Repository._run）と
+# HTTP呼び出し（HttpClient.get_text）がそこに自分の所要時間を足し込む。
+# 並行して走った呼び出しはそれぞれ足すので、DB・HTTPの時間は全体の時間を超えることがある。
+
+_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_duration = metrics.histogram("command_duration_seconds", "コマンド・定期処理の所要時間", ("kind", "name", "outcome"), _BUCKETS)
+_db_time = metrics.histogram("command_db_seconds", "コマンド・定期処理のうちDB呼び出しにかかった時間", ("kind", "name"), _BUCKETS)
+_http_time = metrics.histogram("command_http_seconds", "コマンド・定期処理のうちHTTP呼び出しにかかった時間", ("kind", "name"), _BUCKETS)
+_slow_total = metrics.counter("slow_commands_total", "しきい値を超えたコマンド・定期処理の数", ("kind", "name"))
+
+
+@dataclass
+class Span:
+    kind: str       # "command" / "task"
+    name: str
+    started: float
+    db_seconds: float = 0.0
+    http_seconds: float = 0.0
+    outcome: str = "ok"
+
+
+@dataclass
+class SlowEntry:
+    at: datetime
+    kind: str
+    name: str
+    seconds: float
+    db_seconds: float
+    http_seconds: float
+    outcome: str
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def mark_failed(outcome: str = "error"):
+    """例外を握りつぶしてエラーメッセージを返すハンドラ用。実行中のコマンドの結果を失敗として記録する。"""
+    span = _current_span.get()
+    if span is not None:
+        span.outcome = outcome
+
+
+@contextmanager
+def track(resource: str):
+    """with の中の時間を実行中のコマンドの DB（"db"）または HTTP（"http"）の時間に足す。"""
+    span = _current_span.get()
+    if span is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if resource == "db":
+            span.db_seconds += elapsed
+        else:
+            span.http_seconds += elapsed
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    # 最近傍ランク法
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class PerfRecorder:
+    """
+    コマンド・定期処理ごとに直近 sample_size 件の所要時間を持ち、/perf のパーセンタイルを出す。
+    Prometheus 用のヒストグラムにも同時に記録する。
+    """
+
+    def __init__(self, sample_size: int = 1000, slow_threshold: float = 2.0, slow_log_size: int = 50):
+        self.sample_size = sample_size
+        self.slow_threshold = slow_threshold
+        self._samples: Dict[tuple, Deque[tuple]] = {}
+        self._counts: Dict[tuple, Dict[str, int]] = {}
+        self.slow_log: Deque[SlowEntry] = deque(maxlen=slow_log_size)
+
+    @contextmanager
+    def span(self, kind: str, name: str):
+        """with の中を1回の実行として計測する。例外が出たら outcome は "error" になる。"""
+        span = Span(kind, name, time.perf_counter())
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException:
+            if span.outcome == "ok":
+                span.outcome = "error"
+            raise
+        finally:
+            _current_span.reset(token)
+            self.record(span, time.perf_counter() - span.started)
+
+    def start(self, kind: str, name: str) -> Span:
+        """
+        開始と終了が別のフックになる計測用（スラッシュコマンド）。呼んだタスクの実行中のコマンドにして、
+        finish() で記録する。ContextVar は戻さないので、タスクの最初で呼ぶこと。
+        """
+        span = Span(kind, name, time.perf_counter())
+        _current_span.set(span)
+        return span
+
+    def finish(self, span: Span):
+        self.record(span, time.perf_counter() - span.started)
+
+    def record(self, span: Span, seconds: float):
+        key = (span.kind, span.name)
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.sample_size)
+            self._counts[key] = {}
+        samples.append((seconds, span.db_seconds, span.http_seconds))
+        self._counts[key][span.outcome] = self._counts[key].get(span.outcome, 0) + 1
+
+        _duration.observe(seconds, kind=span.kind, name=span.name, outcome=span.outcome)
+        _db_time.observe(span.db_seconds, kind=span.kind, name=span.name)
+        _http_time.observe(span.http_seconds, kind=span.kind, name=span.name)
+        if seconds >= self.slow_threshold:
+            _slow_total.inc(kind=span.kind, name=span.name)
+            self.slow_log.append(SlowEntry(datetime.now(JST), span.kind, span.name, seconds,
+                                           span.db_seconds, span.http_seconds, span.outcome))
+            print(f"[SLOW] {span.kind} {span.name}: {seconds * 1000:.0f}ms "
+                  f"(db {span.db_seconds * 1000:.0f}ms / http {span.http_seconds * 1000:.0f}ms, {span.outcome})")
+
+    def summary(self, kind: Optional[str] = None) -> List[Dict]:
+        """名前ごとの件数・結果の内訳・パーセンタイル。p95の大きい順。"""
+        rows = []
+        for (row_kind, name), samples in list(self._samples.items()):
+            if kind is not None and row_kind != kind:
+                continue
+            durations = sorted(seconds for seconds, _, _ in samples)
+            rows.append({
+                "kind": row_kind,
+                "name": name,
+                "count": sum(self._counts[(row_kind, name)].values()),
+                "outcomes": dict(self._counts[(row_kind, name)]),
+                "p50": _percentile(durations, 0.50),
+                "p95": _percentile(durations, 0.95),
+                "p99": _percentile(durations, 0.99),
+                "db_mean": sum(db for _, db, _ in samples) / len(samples),
+                "http_mean": sum(http for _, _, http in samples) / len(samples),
+            })
+        rows.sort(key=lambda row: row["p95"], reverse=True)
+        return rows
+
+    def job(self, name: str):
+        """
+        tasks.loop の本体に付けるデコレータ。@tasks.loop の下に書く。
+            @tasks.loop(minutes=30)
+            @perf.job("refresh_schedule")
+            async def refresh_schedule(self): ...
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span("task", name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+perf = PerfRecorder(
+    sample_size=PERF_SAMPLE_SIZE,
+    slow_threshold=PERF_SLOW_COMMAND_MS / 1000,
+    slow_log_size=PERF_SLOW_LOG_SIZE
+)
@@ -0,0 +1,101 @@
+import functools
+import math
+from typing import List, Optional, Sequence, Tuple
+
+# =====================
+# 超幾何分布（/draw）
+# =====================
+# これ以下の山札は「引く枚数ごとの分布表」をまとめてキャッシュする（よく使う40枚デッキの残り枚数をカバー）。
+# 表1つで山札の枚数の2乗程度の値を持つので、対象と件数を絞り、それより大きい山札は (N, K, n) ごとにキャッシュする
+TABLE_MAX_DECK_SIZE = 60
+
+@functools.lru_cache(maxsize=64)
+def _pmf_table(deck_size: int, target_cards: int) -> Tuple[Tuple[float, ...], ...]:
+    """引く枚数 n = 0..deck_size ごとの当たり枚数の分布 P(X=k) の表。"""
+    return tuple(_pmf(deck_size, target_cards, n) for n in range(deck_size + 1))
+
+
+def _pmf(N: int, K: int, n: int) -> Tuple[float, ...]:
+    # P(X=k+1) / P(X=k) = (K-k)(n-k) / ((k+1)(N-K-n+k+1)) の漸化式で、最頻値を1とした相対値を
+    # 上下に並べてから正規化する。大きな二項係数を計算せず、オーバーフローもしない。
+    low, high = max(0, n - (N - K)), min(n, K)
+    mode = min(max((n + 1) * (K + 1) // (N + 2), low), high)
+    weights = [0.0] * (high + 1)
+    weights[mode] = 1.0
+    for k in range(mode, high):
+        weights[k + 1] = weights[k] * (K - k) * (n - k) / ((k + 1) * (N - K - n + k + 1))
+    for k in range(mode, low, -1):
+        weights[k - 1] = weights[k] * k * (N - K - n + k) / ((K - k + 1) * (n - k + 1))
+    total = sum(weights)
+    return tuple(w / total for w in weights)
+
+
+@functools.lru_cache(maxsize=1024)
+def _pmf_cached(N: int, K: int, n: int) -> Tuple[float, ...]:
+    return _pmf(N, K, n)
+
+
+def hypergeometric_pmf(deck_size: int, target_cards: int, draw_count: int) -> Tuple[float, ...]:
+    """deck_size枚中target_cards枚の当たりがある山札からdraw_count枚引いたときの P(X=k)（k=0..）。"""
+    if not (0 <= target_cards <= deck_size and 0 <= draw_count <= deck_size):
+        raise ValueError("当たりカードや引く枚数が山札の枚数を超えているぞ。")
+    if deck_size <= TABLE_MAX_DECK_SIZE:
+        return _pmf_table(deck_size, target_cards)[draw_count]
+    return _pmf_cached(deck_size, target_cards, draw_count)
+
+
+def at_least(pmf: Sequence[float], required_hits: int) -> float:
+    """P(X >= required_hits)。"""
+    return min(1.0, sum(pmf[required_hits:]))
+
+
+def draw_curve(deck_size: int, target_cards: int, first_draw: int, turns: int, required_hits: int = 1) -> List[Tuple[int, float]]:
+    """
+    最初にfirst_draw枚引き、その後1ターンに1枚ずつ引いたときの
+    (累計で引いた枚数, 当たりをrequired_hits枚以上引けている確率) の推移。先頭が最初の手札。
+    """
+    last_draw = min(deck_size, first_draw + turns)
+    return [(n, at_least(hypergeometric_pmf(deck_size, target_cards, n), required_hits))
+            for n in range(first_draw, last_draw + 1)]
+
+
+# =====================
+# 多変量超幾何分布の確率計算
+# =====================
+def combo_probability(deck_size: int, draw_count: int, copies: Sequence[int], minimums: Optional[Sequence[int]] = None) -> float:
+    """
+    deck_size枚の山札からdraw_count枚引いたとき、各カードiを minimums[i] 枚以上
+    （省略時は全て1枚以上）同時に引けている確率。
+
+    カードiの母関数 Σ_{j=minimums[i]}^{copies[i]} C(copies[i], j) x^j を順に掛け合わせ
+    （次数はdraw_countで打ち切り）、残りのカードの C(rest, n-j) と組み合わせた
+    x^draw_count の係数を C(deck_size, draw_count) で割る。
+    計算量は O(種類数 × draw_count × 採用枚数) で、包除原理の 2^種類数 にはならない。
+    """
+    minimums = [1] * len(copies) if minimums is None else list(minimums)
+    if len(minimums) != len(copies):
+        raise ValueError("copies と minimums の長さが違うぞ。")
+    if any(c < 0 for c in copies) or any(k < 0 for k in minimums):
+        raise ValueError("枚数は0以上で指定してくれ。")
+    rest = deck_size - sum(copies)
+    if rest < 0 or not 0 <= draw_count <= deck_size:
+        raise ValueError("カードの合計枚数や引く枚数が、山札の枚数を超えているぞ。")
+    if sum(minimums) > draw_count or any(k > c for c, k in zip(copies, minimums)):
+        return 0.0
+
+    # ways[t] = 指定カードからちょうどt枚引き、全ての条件を満たす組み合わせ数
+    ways: List[int] = [1]
+    for c, k in zip(copies, minimums):
+        terms = [(j, math.comb(c, j)) for j in range(k, c + 1)]
+        merged = [0] * min(len(ways) + c, draw_count + 1)
+        for t, w in enumerate(ways):
+            if not w:
+                continue
+            for j, coeff in terms:
+                if t + j > draw_count:
+                    break
+                merged[t + j] += w * coeff
+        ways = merged
+
+    favorable = sum(w * math.comb(rest, draw_count - t) for t, w in enumerate(ways) if w)
+    return favorable / math.comb(deck_size, draw_count)
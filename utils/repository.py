@@ -0,0 +1,534 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Tuple, Iterable
+import psycopg2.extras
+
+from config import PROFILE_ITEMS, TAX_BRACKETS
+from utils.database import DatabasePool
+from utils.balance_cache import BalanceCache, CreditJournal, LedgerEntry
+from utils.perf import track
+
+# =====================
+# 非同期データアクセス層の共通部分
+# =====================
+def create_db_executor(pool: DatabasePool) -> ThreadPoolExecutor:
+    """DB呼び出し専用のスレッドプール。同時実行数はプールの上限に合わせる。"""
+    return ThreadPoolExecutor(max_workers=pool.max_size, thread_name_prefix="db")
+
+
+class Repository:
+    """
+    psycopg2の同期呼び出しを専用スレッドで実行し、
+    イベントループ（ゲートウェイ）を止めないようにするリポジトリの基底クラス。
+    各メソッドは1トランザクションで完結する。
+    """
+
+    def __init__(self, pool: DatabasePool, executor: ThreadPoolExecutor):
+        self.pool = pool
+        self._executor = executor
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        with track("db"):
+            return await loop.run_in_executor(self._executor, functools.partial(self._transaction, func, *args))
+
+    def _transaction(self, func, *args):
+        with self.pool.connection() as conn:
+            return func(conn, *args)
+
+
+# =====================
+# ユーザーデータ
+# =====================
+class UserRepository(Repository):
+    """
+    usersテーブルへのアクセスをまとめた非同期リポジトリ。
+    ランキング上位はメモリにキャッシュし、クレジットを変更するメソッドが呼ばれたら破棄する。
+    balance_journal_path を渡すと、消費・加算・送金は BalanceCache 経由でメモリ上で処理し、
+    DBへはまとめて反映する（ランキングへの反映は flush_balances() の時点になる）。
+    """
+
+    def __init__(self, pool: DatabasePool, executor: ThreadPoolExecutor, leaderboard_cache_size: int = 100,
+                 balance_journal_path: Optional[str] = None, balance_idle_seconds: float = 600):
+        super().__init__(pool, executor)
+        self.leaderboard_cache_size = leaderboard_cache_size
+        self._leaderboard: Optional[Tuple[List[Dict], int]] = None  # (上位の行, クレジット保有者数)
+        self._leaderboard_version = 0
+        self.balances: Optional[BalanceCache] = None
+        if balance_journal_path:
+            self.balances = BalanceCache(self, CreditJournal(balance_journal_path), idle_seconds=balance_idle_seconds)
+
+    def invalidate_leaderboard(self):
+        self._leaderboard = None
+        self._leaderboard_version += 1
+
+    @asynccontextmanager
+    async def _direct_credits(self, *user_ids: int):
+        """
+        usersテーブルのクレジットを直接更新する処理を囲む。
+        残高キャッシュ使用時は該当ユーザー（指定が無ければ全員）の変動を先に反映してキャッシュから外す。
+        """
+        if self.balances is None:
+            yield
+        elif user_ids:
+            async with self.balances.exclusive(*user_ids):
+                yield
+        else:
+            async with self.balances.exclusive_all():
+                yield
+
+    # ---- プロフィール ----
+    async def get_profile(self, user_id: int) -> Optional[Dict]:
+        profile = await self._run(self._get_profile, user_id)
+        # DB未反映の変動があるので、キャッシュ中の残高を優先する
+        cached = self.balances.cached_balance(user_id) if self.balances else None
+        if profile is not None and cached is not None:
+            profile['credits'] = cached
+        return profile
+
+    @staticmethod
+    def _get_profile(conn, user_id: int) -> Optional[Dict]:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
+            row = cur.fetchone()
+        return dict(row) if row else None
+
+    async def save_achievements(self, user_id: int, top100: Optional[int], nd_rate: Optional[int], ad_rate: Optional[int], achievements: Optional[str]):
+        await self._run(self._save_achievements, user_id, top100, nd_rate, ad_rate, achievements)
+
+    @staticmethod
+    def _save_achievements(conn, user_id, top100, nd_rate, ad_rate, achievements):
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO users (user_id, top100, nd_rate, ad_rate, achievements)
+                VALUES (%s,%s,%s,%s,%s)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    top100=EXCLUDED.top100,
+                    nd_rate=EXCLUDED.nd_rate,
+                    ad_rate=EXCLUDED.ad_rate,
+                    achievements=EXCLUDED.achievements
+            """, (user_id, top100, nd_rate, ad_rate, achievements))
+
+    async def set_profile_item(self, user_id: int, item_key: str, value):
+        if item_key not in PROFILE_ITEMS:
+            raise ValueError(f"Unknown profile item: {item_key}")
+        await self._run(self._set_profile_item, user_id, item_key, value)
+
+    @staticmethod
+    def _set_profile_item(conn, user_id: int, item_key: str, value):
+        with conn.cursor() as cur:
+            sql = f"INSERT INTO users (user_id, {item_key}) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET {item_key} = %s;"
+            cur.execute(sql, (user_id, value, value))
+
+    async def delete_user(self, user_id: int):
+        async with self._direct_credits(user_id):
+            await self._run(self._delete_user, user_id)
+        self.invalidate_leaderboard()
+
+    @staticmethod
+    def _delete_user(conn, user_id: int):
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+
+    # ---- クレジット ----
+    async def claim_daily(self, user_id: int, now: datetime, amount: int) -> Tuple[bool, int]:
+        """デイリーボーナスを付与する。戻り値は (付与したか, 付与後の所持クレジット)。"""
+        async with self._direct_credits(user_id):
+            claimed, credits = await self._run(self._claim_daily, user_id, now, amount)
+        if claimed:
+            self.invalidate_leaderboard()
+        return claimed, credits
+
+    @staticmethod
+    def _claim_daily(conn, user_id: int, now: datetime, amount: int) -> Tuple[bool, int]:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO users (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING;", (user_id,))
+            cur.execute("SELECT credits, last_daily FROM users WHERE user_id = %s FOR UPDATE;", (user_id,))
+            credits, last_daily = cur.fetchone()
+            credits = credits or 0
+            if last_daily is not None and last_daily.astimezone(now.tzinfo).date() >= now.date():
+                return False, credits
+            credits += amount
+            cur.execute("UPDATE users SET credits = %s, last_daily = %s WHERE user_id = %s;", (credits, now, user_id))
+        return True, credits
+
+    async def spend_credits(self, user_id: int, amount: int, reason: str = "spend") -> Tuple[bool, int]:
+        """残高が足りる場合のみ減算する。戻り値は (成功したか, 処理後の所持クレジット)。"""
+        if self.balances is not None:
+            return await self.balances.debit(user_id, amount, reason)
+        spent, credits = await self._run(self._spend_credits, user_id, amount)
+        if spent:
+            self.invalidate_leaderboard()
+        return spent, credits
+
+    @staticmethod
+    def _spend_credits(conn, user_id: int, amount: int) -> Tuple[bool, int]:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, 0) ON CONFLICT (user_id) DO NOTHING;", (user_id,))
+            cur.execute("SELECT credits FROM users WHERE user_id = %s FOR UPDATE;", (user_id,))
+            credits = cur.fetchone()[0] or 0
+            if credits < amount:
+                return False, credits
+            cur.execute("UPDATE users SET credits = %s WHERE user_id = %s;", (credits - amount, user_id))
+        return True, credits - amount
+
+    async def add_credits(self, user_id: int, amount: int, reason: str = "add") -> int:
+        """クレジットを加算し、加算後の所持クレジットを返す。"""
+        if self.balances is not None:
+            return await self.balances.credit(user_id, amount, reason)
+        credits = await self._run(self._add_credits, user_id, amount)
+        if amount:
+            self.invalidate_leaderboard()
+        return credits
+
+    @staticmethod
+    def _add_credits(conn, user_id: int, amount: int) -> int:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO users (user_id, credits) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET credits = COALESCE(users.credits, 0) + %s RETURNING credits;",
+                (user_id, amount, amount)
+            )
+            return cur.fetchone()[0]
+
+    async def set_credits(self, user_id: int, amount: int):
+        async with self._direct_credits(user_id):
+            await self._run(self._set_credits, user_id, amount)
+        self.invalidate_leaderboard()
+
+    @staticmethod
+    def _set_credits(conn, user_id: int, amount: int):
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET credits = %s;", (user_id, amount, amount))
+
+    async def transfer_credits(self, sender_id: int, receiver_id: int, amount: int) -> Tuple[bool, int]:
+        """送金する。戻り値は (成功したか, 送金者の処理後の所持クレジット)。"""
+        if self.balances is not None:
+            return await self.balances.transfer(sender_id, receiver_id, amount, "gift")
+        sent, sender_credits = await self._run(self._transfer_credits, sender_id, receiver_id, amount)
+        if sent:
+            self.invalidate_leaderboard()
+        return sent, sender_credits
+
+    @staticmethod
+    def _transfer_credits(conn, sender_id: int, receiver_id: int, amount: int) -> Tuple[bool, int]:
+        with conn.cursor() as cur:
+            cur.execute("SELECT credits FROM users WHERE user_id = %s FOR UPDATE;", (sender_id,))
+            row = cur.fetchone()
+            sender_credits = (row[0] if row else 0) or 0
+            if sender_credits < amount:
+                return False, sender_credits
+            cur.execute("UPDATE users SET credits = credits - %s WHERE user_id = %s;", (amount, sender_id))
+            cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, %s) ON CONFLICT (user_id) DO UPDATE SET credits = users.credits + %s;", (receiver_id, amount, amount))
+        return True, sender_credits - amount
+
+    # ---- 残高キャッシュ（BalanceCache）から使うDB操作 ----
+    async def load_balance(self, user_id: int) -> int:
+        """ユーザー行を用意して現在の所持クレジットを返す。"""
+        return await self._run(self._load_balance, user_id)
+
+    @staticmethod
+    def _load_balance(conn, user_id: int) -> int:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO users (user_id, credits) VALUES (%s, 0) ON CONFLICT (user_id) DO NOTHING;", (user_id,))
+            cur.execute("SELECT credits FROM users WHERE user_id = %s;", (user_id,))
+            return cur.fetchone()[0] or 0
+
+    async def apply_ledger(self, entries: List[LedgerEntry]):
+        """
+        変動をcredit_ledgerに記録し、ユーザーごとに合算してusersに反映する。
+        記録済みのentry_idは読み飛ばすので、同じエントリを何度反映しても結果は変わらない。
+        """
+        if not entries:
+            return
+        await self._run(self._apply_ledger, entries)
+        self.invalidate_leaderboard()
+
+    @staticmethod
+    def _apply_ledger(conn, entries: List[LedgerEntry]):
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(cur, """
+                WITH inserted AS (
+                    INSERT INTO credit_ledger (entry_id, user_id, delta, reason, created_at)
+                    VALUES %s
+                    ON CONFLICT (entry_id) DO NOTHING
+                    RETURNING user_id, delta
+                ),
+                totals AS (
+                    SELECT user_id, SUM(delta) AS delta FROM inserted GROUP BY user_id
+                )
+                UPDATE users u SET credits = COALESCE(u.credits, 0) + t.delta
+                FROM totals t
+                WHERE u.user_id = t.user_id
+            """, [(e.entry_id, e.user_id, e.delta, e.reason, e.created_at) for e in entries],
+                template="(%s::uuid, %s::bigint, %s::bigint, %s, to_timestamp(%s))", page_size=len(entries))
+
+    async def prune_ledger(self, older_than: timedelta) -> int:
+        """
+        古いcredit_ledgerの行を削除する。ジャーナル再生時の重複判定に使うので、
+        older_than はジャーナルが残り得る期間（Botの停止期間）より十分長くすること。
+        """
+        return await self._run(self._prune_ledger, older_than)
+
+    @staticmethod
+    def _prune_ledger(conn, older_than: timedelta) -> int:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM credit_ledger WHERE created_at < now() - %s", (older_than,))
+            return cur.rowcount
+
+    async def flush_balances(self):
+        """残高キャッシュの未反映分をDBに書き込む。"""
+        if self.balances is not None:
+            await self.balances.flush()
+
+    # ---- ランキング ----
+    async def leaderboard_page(self, page: int, page_size: int = 10) -> Tuple[List[Dict], int]:
+        """
+        ランキングの指定ページ（0始まり）を返す。戻り値は (行のリスト, クレジット保有者数)。
+        各行は rank（順位）, user_id, credits を持つ。キャッシュ範囲内ならDBに問い合わせない。
+        """
+        top, total = await self._cached_leaderboard()
+        start = page * page_size
+        if start + page_size <= len(top) or len(top) >= total:
+            return top[start:start + page_size], total
+        rows = await self._run(self._leaderboard_rows, page_size, start)
+        return rows, total
+
+    async def leaderboard_position(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """ユーザーの順位と所持クレジット。クレジットを持っていなければNone。"""
+        top, _ = await self._cached_leaderboard()
+        for row in top:
+            if row['user_id'] == user_id:
+                return row['rank'], row['credits']
+        return await self._run(self._leaderboard_position, user_id)
+
+    async def _cached_leaderboard(self) -> Tuple[List[Dict], int]:
+        cached = self._leaderboard
+        if cached is not None:
+            return cached
+        version = self._leaderboard_version
+        top, total = await self._run(self._leaderboard_snapshot, self.leaderboard_cache_size)
+        # 取得中にクレジットが変わっていたら、その結果はキャッシュしない
+        if version == self._leaderboard_version:
+            self._leaderboard = (top, total)
+        return top, total
+
+    @classmethod
+    def _leaderboard_snapshot(cls, conn, limit: int) -> Tuple[List[Dict], int]:
+        rows = cls._leaderboard_rows(conn, limit, 0)
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM users WHERE credits > 0;")
+            total = cur.fetchone()[0]
+        return rows, total
+
+    @staticmethod
+    def _leaderboard_rows(conn, limit: int, offset: int) -> List[Dict]:
+        # (credits DESC, user_id) のインデックスを順に読むだけで済む
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("""
+                SELECT user_id, credits FROM users
+                WHERE credits > 0
+                ORDER BY credits DESC, user_id
+                LIMIT %s OFFSET %s;
+            """, (limit, offset))
+            return [{"rank": offset + i, **row} for i, row in enumerate(cur.fetchall(), 1)]
+
+    @staticmethod
+    def _leaderboard_position(conn, user_id: int) -> Optional[Tuple[int, int]]:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT u.credits,
+                       (SELECT count(*) FROM users o WHERE o.credits > 0 AND o.credits > u.credits)
+                     + (SELECT count(*) FROM users o WHERE o.credits > 0 AND o.credits = u.credits AND o.user_id < u.user_id)
+                     + 1
+                FROM users u
+                WHERE u.user_id = %s AND u.credits > 0;
+            """, (user_id,))
+            row = cur.fetchone()
+        return (row[1], row[0]) if row else None
+
+    async def collect_income_tax(self) -> Tuple[int, int]:
+        """週次の所得税を徴収する。戻り値は (徴収総額, 課税人数)。"""
+        async with self._direct_credits():
+            result = await self._run(self._collect_income_tax)
+        self.invalidate_leaderboard()
+        return result
+
+    @staticmethod
+    def _collect_income_tax(conn) -> Tuple[int, int]:
+        # 前回課税時からの増加分に TAX_BRACKETS の税率・控除を CASE 式で当てはめ、UPDATE 1文で徴収する。
+        # 税額は従来のPython実装（float演算 → int() で切り捨て）と一致するよう float8 + trunc で計算する。
+        tax_case = " ".join(
+            ["WHEN u.increase <= %s::float8 THEN trunc(u.increase * %s::float8 - %s::float8)"] * len(TAX_BRACKETS)
+        )
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                WITH assessed AS (
+                    SELECT u.user_id,
+                           CASE WHEN u.increase > 0
+                                THEN GREATEST(CASE {tax_case} ELSE 0 END, 0)::bigint
+                                ELSE 0 END AS tax
+                    FROM (
+                        SELECT user_id, credits - COALESCE(last_taxed_credits, 0) AS increase
+                        FROM users WHERE credits > 0
+                    ) u
+                ),
+                updated AS (
+                    UPDATE users SET
+                        credits = users.credits - a.tax,
+                        last_taxed_credits = users.credits - a.tax
+                    FROM assessed a
+                    WHERE users.user_id = a.user_id
+                    RETURNING a.tax
+                )
+                SELECT COALESCE(SUM(tax), 0), COUNT(*) FILTER (WHERE tax > 0) FROM updated
+            """, [value for bracket in TAX_BRACKETS for value in bracket])
+            total_tax_collected, users_taxed_count = cur.fetchone()
+        return int(total_tax_collected), users_taxed_count
+
+    # ---- 誕生日 ----
+    async def celebrate_birthdays(self, today_str: str) -> List[Dict]:
+        """今日が誕生日のユーザーを返し、年齢登録済みのユーザーは年齢を1つ進める。"""
+        return await self._run(self._celebrate_birthdays, today_str)
+
+    @staticmethod
+    def _celebrate_birthdays(conn, today_str: str) -> List[Dict]:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT user_id, age FROM users WHERE birthday = %s", (today_str,))
+            birthday_users = [dict(row) for row in cur.fetchall()]
+
+            user_ids_to_update = [user['user_id'] for user in birthday_users if user['age'] is not None]
+            if user_ids_to_update:
+                cur.execute("UPDATE users SET age = age + 1 WHERE user_id = ANY(%s)", (user_ids_to_update,))
+                print(f"[LOG] Incremented age for users: {user_ids_to_update}")
+        return birthday_users
+
+    # ---- DMPS ----
+    async def list_dmps_players(self) -> List[Dict]:
+        return await self._run(self._list_dmps_players)
+
+    @staticmethod
+    def _list_dmps_players(conn) -> List[Dict]:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT user_id, dmps_player_id, dmps_points FROM users WHERE dmps_player_id IS NOT NULL;")
+            return [dict(row) for row in cur.fetchall()]
+
+    async def update_dmps_stats(self, user_id: int, rank: int, points: int):
+        await self._run(self._update_dmps_stats, user_id, rank, points)
+
+    @staticmethod
+    def _update_dmps_stats(conn, user_id: int, rank: int, points: int):
+        with conn.cursor() as cur:
+            cur.execute("UPDATE users SET dmps_rank = %s, dmps_points = %s WHERE user_id = %s;", (rank, points, user_id))
+
+    async def apply_dmps_stats(self, stats: List[Tuple[int, int, int]], credits_per_point: int) -> List[Dict]:
+        """
+        (user_id, rank, points) をまとめて書き込み、ポイント増加分のGTVを付与する。
+        増加量は書き込み時点のdmps_pointsとの差で計算する。
+        戻り値は各ユーザーの point_increase と credits_granted。
+        """
+        if not stats:
+            return []
+        async with self._direct_credits():
+            applied = await self._run(self._apply_dmps_stats, stats, credits_per_point)
+        self.invalidate_leaderboard()
+        return applied
+
+    @staticmethod
+    def _apply_dmps_stats(conn, stats: List[Tuple[int, int, int]], credits_per_point: int) -> List[Dict]:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            rows = psycopg2.extras.execute_values(cur, f"""
+                WITH fetched (user_id, rank, points) AS (VALUES %s),
+                previous AS (
+                    SELECT u.user_id, COALESCE(u.dmps_points, 0) AS old_points
+                    FROM users u JOIN fetched f ON f.user_id = u.user_id
+                    FOR UPDATE OF u
+                )
+                UPDATE users u SET
+                    dmps_rank = f.rank,
+                    dmps_points = f.points,
+                    credits = COALESCE(u.credits, 0) + GREATEST(f.points - p.old_points, 0) * {int(credits_per_point)}
+                FROM fetched f JOIN previous p ON p.user_id = f.user_id
+                WHERE u.user_id = f.user_id
+                RETURNING u.user_id,
+                          f.points - p.old_points AS point_increase,
+                          GREATEST(f.points - p.old_points, 0) * {int(credits_per_point)} AS credits_granted
+            """, stats, template="(%s::bigint, %s::int, %s::int)", page_size=len(stats), fetch=True)
+        return [dict(row) for row in rows]
+
+
+# =====================
+# Tonamel URLキャッシュ
+# =====================
+class TonamelUrlRepository(Repository):
+    """
+    大会詳細ページURL → Tonamel URL の対応を永続化するキャッシュ。
+    Tonamel URLが無かった結果（空文字）も短めの期限で保存する。
+    """
+
+    def __init__(self, pool: DatabasePool, executor: ThreadPoolExecutor, ttl: timedelta, negative_ttl: timedelta):
+        super().__init__(pool, executor)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    async def get_many(self, details_urls: Iterable[str]) -> Dict[str, str]:
+        """期限内のキャッシュだけを返す。"""
+        urls = list(set(details_urls))
+        if not urls:
+            return {}
+        return await self._run(self._get_many, urls)
+
+    def _get_many(self, conn, urls: List[str]) -> Dict[str, str]:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT details_url, tonamel_url FROM tonamel_url_cache
+                WHERE details_url = ANY(%s)
+                  AND checked_at > now() - CASE WHEN tonamel_url = '' THEN %s ELSE %s END
+            """, (urls, self.negative_ttl, self.ttl))
+            return dict(cur.fetchall())
+
+    async def put_many(self, mapping: Dict[str, str]):
+        if mapping:
+            await self._run(self._put_many, mapping)
+
+    def _put_many(self, conn, mapping: Dict[str, str]):
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO tonamel_url_cache (details_url, tonamel_url, checked_at)
+                VALUES %s
+                ON CONFLICT (details_url) DO UPDATE SET
+                    tonamel_url = EXCLUDED.tonamel_url,
+                    checked_at = EXCLUDED.checked_at
+            """, list(mapping.items()), template="(%s, %s, now())")
+            # 期限切れの行はついでに掃除する
+            cur.execute("DELETE FROM tonamel_url_cache WHERE checked_at < now() - %s", (max(self.ttl, self.negative_ttl),))
+
+
+# =====================
+# Botの状態
+# =====================
+class BotStateRepository(Repository):
+    """再起動をまたいで覚えておきたい小さな値（コマンドツリーのフィンガープリントなど）を保存する。"""
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get, key)
+
+    @staticmethod
+    def _get(conn, key: str) -> Optional[str]:
+        with conn.cursor() as cur:
+            cur.execute("SELECT value FROM bot_state WHERE key = %s", (key,))
+            row = cur.fetchone()
+            return row[0] if row else None
+
+    async def set(self, key: str, value: str):
+        await self._run(self._set, key, value)
+
+    @staticmethod
+    def _set(conn, key: str, value: str):
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO bot_state (key, value) VALUES (%s, %s)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = now()
+            """, (key, value))
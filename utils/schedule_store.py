@@ -0,0 +1,86 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional, Dict, List
+
+from config import JST
+from utils.scraper import fetch_and_parse_tournaments
+
+# =====================
+# 大会スケジュールのスナップショット
+# =====================
+class ScheduleStore:
+    """
+    最後に取得できた大会一覧をメモリに保持する（stale-while-revalidate）。
+    古くなったスナップショットもそのまま返し、更新は裏で1本だけ走らせる。
+    取得に失敗した場合は前回のスナップショットを使い続ける。
+    """
+
+    def __init__(self, refresh_interval: float, url_cache=None):
+        self.refresh_interval = refresh_interval
+        self.url_cache = url_cache
+        self._tournaments: Optional[List[Dict]] = None
+        self._fetched_at: Optional[float] = None  # time.monotonic()
+        self._fetched_at_jst: Optional[datetime] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.last_error_at: Optional[datetime] = None
+        self.consecutive_failures = 0
+
+    @property
+    def tournaments(self) -> Optional[List[Dict]]:
+        return self._tournaments
+
+    def age_seconds(self) -> Optional[float]:
+        if self._fetched_at is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    def is_stale(self) -> bool:
+        age = self.age_seconds()
+        return age is None or age >= self.refresh_interval
+
+    async def refresh(self) -> bool:
+        """サイトから取り直す。実行中の更新があればそれを待つ。成功したらTrue。"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self) -> bool:
+        try:
+            tournaments = await fetch_and_parse_tournaments(url_cache=self.url_cache)
+        except Exception as e:
+            print(f"[LOG] Schedule refresh error: {e}")
+            tournaments = None
+
+        if tournaments is None:
+            self.consecutive_failures += 1
+            self.last_error_at = datetime.now(JST)
+            print(f"[LOG] Schedule refresh failed ({self.consecutive_failures} in a row); keeping previous snapshot.")
+            return False
+
+        self._tournaments = tournaments
+        self._fetched_at = time.monotonic()
+        self._fetched_at_jst = datetime.now(JST)
+        self.consecutive_failures = 0
+        return True
+
+    async def get(self) -> Optional[List[Dict]]:
+        """
+        手元のスナップショットを即座に返す。古ければ裏で更新を始める。
+        まだ一度も取得できていない場合だけ取得完了を待つ。
+        """
+        if self._tournaments is None:
+            await self.refresh()
+        elif self.is_stale() and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._tournaments
+
+    def status(self) -> Dict:
+        return {
+            "count": len(self._tournaments) if self._tournaments is not None else None,
+            "age_seconds": self.age_seconds(),
+            "fetched_at": self._fetched_at_jst,
+            "refreshing": self._refresh_task is not None and not self._refresh_task.done(),
+            "consecutive_failures": self.consecutive_failures,
+            "last_error_at": self.last_error_at,
+        }
@@ -1,79 +1,127 @@
 import asyncio
-import requests
+import aiohttp
+import functools
 import re
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from typing import Optional, Dict, List
+import time
+from urllib.parse import urljoin, urlparse
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 
-from config import BASE_URL, DMPS_BASE_URL
+from config import (
+    BASE_URL, DMPS_BASE_URL, SCRAPER_CONCURRENCY, SCRAPER_HOST_INTERVAL_MS, SCRAPER_TIMEOUT_SECONDS,
+    DMPS_STATS_FRESH_MINUTES, JST
+)
+from utils.perf import track
 
 # =====================
-# 共通：安全なHTTP取得
+# 共通：共有HTTPクライアント
 # =====================
-def safe_get(url: str, encoding: str, timeout: int = 10) -> Optional[str]:
-    try:
-        response = requests.get(
-            url,
-            timeout=timeout,
-            headers={
-                "User-Agent": "Mozilla/5.0 (compatible; DiscordBot/1.0)"
-            }
-        )
-        response.raise_for_status()
-        response.encoding = encoding
-        return response.text
-    except requests.RequestException as e:
-        print(f"[LOG] Request failed: {url} | {e}")
-        return None
+USER_AGENT = "Mozilla/5.0 (compatible; DiscordBot/1.0)"
 
+class HostRateLimiter:
+    """ホストごとにリクエスト開始間隔の下限を守るためのリミッター。"""
 
-# =====================
-# Tonamel URL取得
-# =====================
-async def get_tonamel_url(details_page_url: str) -> str:
-    html = await asyncio.to_thread(
-        safe_get,
-        details_page_url,
-        "cp932"
-    )
-    if not html:
-        return ""
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._next_allowed: Dict[str, float] = {}
 
-    soup = BeautifulSoup(html, "html.parser")
+    async def wait(self, host: str):
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_allowed.get(host, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_allowed[host] = loop.time() + self.min_interval
 
-    for keyword in ("大会HP", "リモート使用アプリ"):
-        span = soup.find("span", string=re.compile(keyword))
-        if not span:
-            continue
 
-        td = span.find_parent("td")
-        if not td:
-            continue
+class HttpClient:
+    """
+    keep-aliveで接続を使い回す共有HTTPクライアント。
+    同時リクエスト数とホストごとの間隔を制限する。
+    """
 
-        a = td.find("a", href=True)
-        if a and "tonamel.com" in a["href"]:
-            return a["href"]
+    def __init__(self, concurrency: int, host_interval: float, timeout: float):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._limiter = HostRateLimiter(host_interval)
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._concurrency = max(1, concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
 
-    return ""
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self._timeout,
+                headers={"User-Agent": USER_AGENT},
+                connector=aiohttp.TCPConnector(limit=self._concurrency, keepalive_timeout=30)
+            )
+        return self._session
+
+    async def get_text(self, url: str, encoding: str) -> Optional[str]:
+        """URLを取得して指定の文字コードで復号する。失敗時はNone。"""
+        with track("http"):
+            return await self._get_text(url, encoding)
+
+    async def _get_text(self, url: str, encoding: str) -> Optional[str]:
+        async with self._semaphore:
+            await self._limiter.wait(urlparse(url).hostname or "")
+            try:
+                async with self._get_session().get(url) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"[LOG] Request failed: {url} | {e!r}")
+                return None
+        return body.decode(encoding, errors="replace")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+http_client = HttpClient(
+    concurrency=SCRAPER_CONCURRENCY,
+    host_interval=SCRAPER_HOST_INTERVAL_MS / 1000,
+    timeout=SCRAPER_TIMEOUT_SECONDS
+)
 
 
 # =====================
-# 大会一覧取得（非同期）
+# HTML解析（通信なし）
 # =====================
-async def fetch_and_parse_tournaments() -> List[Dict]:
-    html = await asyncio.to_thread(
-        safe_get,
-        BASE_URL,
-        "shift_jis"
-    )
-    if not html:
-        return []
+# ページ全体ではなく必要な要素だけを木にする（SoupStrainer）。
+# 解析結果は全体を解析した場合と同じになる。
+# bs4の読み込みは重いので、起動時ではなく最初の解析時に行う。
+# 大会一覧ページは table#main がページの大半を占め、絞っても速くならなかったので全体を解析する
+_STRAINERS = {
+    # spanはtd外のものも残し、「最初に見つかったspan」が全体解析時と一致するようにする
+    "details": ((["td", "span"],), {}),
+    "dmps": (("td",), {"attrs": {"class": "tx2022", "align": "left"}}),
+}
 
-    soup = BeautifulSoup(html, "html.parser")
+@functools.lru_cache(maxsize=None)
+def _strainer(name: str):
+    from bs4 import SoupStrainer
+    args, kwargs = _STRAINERS[name]
+    return SoupStrainer(*args, **kwargs)
+
+
+def _soup(html: str, only: Optional[str] = None):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "html.parser", parse_only=_strainer(only) if only else None)
+
+
+def parse_schedule(html: str) -> Optional[List[Dict]]:
+    """
+    schedulehost.asp のHTMLから大会一覧を取り出す。
+    urlには詳細ページのURLが入る。table#main が無ければNone。
+    """
+    soup = _soup(html)
     table = soup.find("table", id="main")
     if not table:
-        return []
+        return None
 
     tournaments: List[Dict] = []
 
@@ -87,8 +135,6 @@ async def fetch_and_parse_tournaments() -> List[Dict]:
         relative_url = onclick.split("'")[1] if "'" in onclick else ""
         details_page_url = urljoin(BASE_URL, relative_url)
 
-        tonamel_url = await get_tonamel_url(details_page_url)
-
         try:
             tournaments.append({
                 "date": datetime.strptime(
@@ -99,13 +145,108 @@ async def fetch_and_parse_tournaments() -> List[Dict]:
                 "format": cols[4].get_text(strip=True),
                 "capacity": cols[6].get_text(strip=True),
                 "time": cols[7].get_text(strip=True),
-                "url": tonamel_url or details_page_url,
+                "url": details_page_url,
             })
         except ValueError:
             continue
 
-        # Render対策：sleepは必ずasync
-        await asyncio.sleep(0.2)
+    return tournaments
+
+
+def parse_tonamel_url(html: str) -> str:
+    """大会詳細ページのHTMLからTonamelのURLを探す。無ければ空文字。"""
+    soup = _soup(html, "details")
+
+    for keyword in ("大会HP", "リモート使用アプリ"):
+        span = soup.find("span", string=re.compile(keyword))
+        if not span:
+            continue
+
+        td = span.find_parent("td")
+        if not td:
+            continue
+
+        a = td.find("a", href=True)
+        if a and "tonamel.com" in a["href"]:
+            return a["href"]
+
+    return ""
+
+
+def parse_dmps_stats(html: str) -> Optional[Dict[str, int]]:
+    """userresult.asp のHTMLからランキングとポイントを取り出す。"""
+    soup = _soup(html, "dmps")
+
+    ranking_td = soup.find("td", class_="tx2022", align="left")
+    if not ranking_td:
+        return None
+
+    spans_20px = ranking_td.find_all("span", style="font-size:20px;")
+    if len(spans_20px) < 2:
+        return None
+
+    rank = int(re.sub(r"\D", "", spans_20px[0].get_text()))
+    points = int(re.sub(r"\D", "", spans_20px[1].get_text()))
+
+    return {
+        "rank": rank,
+        "points": points
+    }
+
+
+# =====================
+# Tonamel URL取得
+# =====================
+async def get_tonamel_url(details_page_url: str) -> Optional[str]:
+    """
+    詳細ページからTonamelのURLを探す。
+    見つからなければ空文字、ページ自体を取得できなければNoneを返す。
+    """
+    html = await http_client.get_text(details_page_url, "cp932")
+    if not html:
+        return None
+    return parse_tonamel_url(html)
+
+
+# =====================
+# 大会一覧取得（非同期）
+# =====================
+async def fetch_and_parse_tournaments(url_cache=None) -> Optional[List[Dict]]:
+    """
+    大会一覧を取得する。サイトから取得できなかった場合はNoneを返す。
+    url_cache（get_many / put_many を持つオブジェクト）を渡すと、
+    既知の詳細ページはキャッシュを使い、新しい行だけ取得する。
+    """
+    html = await http_client.get_text(BASE_URL, "shift_jis")
+    if not html:
+        return None
+
+    tournaments = parse_schedule(html)
+    if tournaments is None:
+        return None
+    details_page_urls = [t["url"] for t in tournaments]
+
+    known_urls: Dict[str, str] = {}
+    if url_cache is not None:
+        try:
+            known_urls = await url_cache.get_many(details_page_urls)
+        except Exception as e:
+            print(f"[LOG] Tonamel URL cache lookup failed: {e}")
+
+    # 未知の詳細ページだけを、共有クライアントの同時数・間隔制限の範囲で並行取得する
+    new_urls = list(dict.fromkeys(url for url in details_page_urls if url not in known_urls))
+    fetched = await asyncio.gather(*(get_tonamel_url(url) for url in new_urls))
+    fetched_urls = {url: tonamel_url for url, tonamel_url in zip(new_urls, fetched) if tonamel_url is not None}
+
+    if url_cache is not None and fetched_urls:
+        try:
+            await url_cache.put_many(fetched_urls)
+        except Exception as e:
+            print(f"[LOG] Tonamel URL cache update failed: {e}")
+
+    resolved_urls = {**known_urls, **fetched_urls}
+    for tournament, details_page_url in zip(tournaments, details_page_urls):
+        tournament["url"] = resolved_urls.get(details_page_url) or tournament["url"]
 
     tournaments.sort(key=lambda x: (x["date"], x["time"]))
     return tournaments
@@ -117,35 +258,63 @@ async def fetch_and_parse_tournaments() -> List[Dict]:
 async def fetch_dmps_user_stats(dmps_player_id: str) -> Optional[Dict[str, int]]:
     url = f"{DMPS_BASE_URL}?UserID={dmps_player_id}"
 
-    try:
-        response = await asyncio.to_thread(
-            requests.get,
-            url,
-            timeout=10,
-            headers={
-                "User-Agent": "Mozilla/5.0 (compatible; DiscordBot/1.0)"
-            }
-        )
-        response.raise_for_status()
-        response.encoding = "shift_jis"
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        ranking_td = soup.find("td", class_="tx2022", align="left")
-        if not ranking_td:
-            return None
-
-        spans_20px = ranking_td.find_all("span", style="font-size:20px;")
-        if len(spans_20px) < 2:
-            return None
-
-        rank = int(re.sub(r"\D", "", spans_20px[0].get_text()))
-        points = int(re.sub(r"\D", "", spans_20px[1].get_text()))
-
-        return {
-            "rank": rank,
-            "points": points
-        }
+    html = await http_client.get_text(url, "shift_jis")
+    if not html:
+        return None
 
+    try:
+        return parse_dmps_stats(html)
     except Exception as e:
         print(f"[LOG] DMPS fetch error ({dmps_player_id}): {e}")
         return None
+
+
+# =====================
+# DMPS 成績キャッシュ（single-flight）
+# =====================
+class DmpsStatsCache:
+    """
+    プレイヤーごとに最後に取得できた成績を保持する。
+    同じプレイヤーへの同時リクエストは実行中の1回の取得にまとめる。
+    取得に失敗した結果はキャッシュしない。
+    """
+
+    def __init__(self, fresh_seconds: float):
+        self.fresh_seconds = fresh_seconds
+        self._entries: Dict[str, Tuple[Dict[str, int], float, datetime]] = {}  # (成績, monotonic, 取得時刻)
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, dmps_player_id: str, max_age: Optional[float] = None) -> Tuple[Optional[Dict[str, int]], Optional[datetime]]:
+        """
+        max_age秒以内に取得した成績があればそれを返し、無ければ取得する。
+        max_age=0 で必ず取り直す（実行中の取得があればそれに相乗りする）。
+        戻り値は (成績, 最後に取得に成功した時刻)。
+        """
+        max_age = self.fresh_seconds if max_age is None else max_age
+        entry = self._entries.get(dmps_player_id)
+        if entry and max_age > 0 and time.monotonic() - entry[1] <= max_age:
+            return entry[0], entry[2]
+
+        task = self._inflight.get(dmps_player_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(dmps_player_id))
+            self._inflight[dmps_player_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(dmps_player_id, None))
+        stats = await asyncio.shield(task)
+
+        if stats is None:
+            return None, self.last_success(dmps_player_id)
+        return stats, self._entries[dmps_player_id][2]
+
+    async def _fetch(self, dmps_player_id: str) -> Optional[Dict[str, int]]:
+        stats = await fetch_dmps_user_stats(dmps_player_id)
+        if stats:
+            self._entries[dmps_player_id] = (stats, time.monotonic(), datetime.now(JST))
+        return stats
+
+    def last_success(self, dmps_player_id: str) -> Optional[datetime]:
+        entry = self._entries.get(dmps_player_id)
+        return entry[2] if entry else None
+
+
+dmps_stats_cache = DmpsStatsCache(fresh_seconds=DMPS_STATS_FRESH_MINUTES * 60)
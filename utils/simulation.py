@@ -0,0 +1,124 @@
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+# =====================
+# デュエマの対戦開始シミュレーション（/simulate）
+# =====================
+SHIELD_COUNT = 5
+HAND_COUNT = 5
+
+_TERM_PATTERN = re.compile(r'^(?:(?P<zone>[Ss]):)?(?P<cards>[A-Za-z](?:\|[A-Za-z])*)(?::(?P<count>\d+))?$')
+
+@dataclass(frozen=True)
+class Term:
+    """「cards のいずれかを合計 count 枚以上」。zone は "hand" か "shields"。"""
+    cards: Tuple[int, ...]
+    count: int
+    zone: str
+
+
+def parse_condition(text: str, card_types: int) -> List[Term]:
+    """
+    条件式を読む。カンマ区切りの各項を全て満たすことが条件になる。
+      A       … 手札にAが1枚以上
+      A|B     … 手札にAかBが（合計）1枚以上
+      A|B:2   … 手札にAとBが合計2枚以上
+      S:C     … シールドにCが1枚以上
+    """
+    terms = []
+    for raw in text.split(","):
+        match = _TERM_PATTERN.match(raw.strip().replace(" ", ""))
+        if not match:
+            raise ValueError(f"条件 `{raw.strip()}` の形式が正しくないぞ。例: `A|B, C:2, S:D`")
+        cards = tuple(sorted({ord(c.upper()) - ord("A") for c in match["cards"].split("|")}))
+        if cards[-1] >= card_types:
+            raise ValueError(f"条件 `{raw.strip()}` に採用していないカードが含まれているぞ。")
+        count = int(match["count"] or 1)
+        if count < 1:
+            raise ValueError("条件の枚数は1以上で指定してくれ。")
+        terms.append(Term(cards, count, "shields" if match["zone"] else "hand"))
+    if not terms:
+        raise ValueError("条件を1つ以上指定してくれ。")
+    return terms
+
+
+@dataclass
+class SimulationResult:
+    trials: int
+    elapsed: float
+    # (ターン, 見たカード枚数, 成功数)。ターン0は初手
+    successes: List[Tuple[int, int, int]]
+
+    def rows(self, z: float = 1.96):
+        """(ターン, 見た枚数, 確率, 信頼区間の下限, 上限) を返す。"""
+        return [(turn, seen, hits / self.trials, *wilson_interval(hits, self.trials, z))
+                for turn, seen, hits in self.successes]
+
+
+def wilson_interval(successes: int, trials: int, z: float = 1.96) -> Tuple[float, float]:
+    """二項比率のWilsonスコア信頼区間（既定は95%）。"""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def simulate(deck_size: int, copies: Sequence[int], terms: Sequence[Term], turns: int, going_first: bool = True,
+             max_trials: int = 200_000, time_budget: float = 2.0, batch_size: int = 20_000,
+             seed: Optional[int] = None) -> SimulationResult:
+    """
+    山札をまとめてシャッフルし、先頭5枚をシールド、次の5枚を初手、以降を1ターン1枚のドローとして
+    各ターン終了時点（ドロー後）に条件を満たしている割合を数える。先攻は1ターン目にドローしない。
+    max_trials に達するか time_budget 秒を使い切ったら打ち切る（最低1バッチは実行する）。
+    """
+    # NumPyの読み込みは重いので、起動時ではなく最初のシミュレーション時に行う
+    import numpy as np
+
+    rest = deck_size - sum(copies)
+    if rest < 0:
+        raise ValueError("カードの合計枚数が山札の枚数を超えているぞ。")
+    draws = [turn - 1 if going_first else turn for turn in range(1, turns + 1)]
+    seen_per_turn = [HAND_COUNT] + [HAND_COUNT + max(d, 0) for d in draws]
+    if SHIELD_COUNT + seen_per_turn[-1] > deck_size:
+        raise ValueError("山札の枚数に対してターン数が多すぎるぞ。")
+
+    rng = np.random.default_rng(seed)
+    # カードの種類番号を並べた1デッキ分の配列（採用カード以外は -1）
+    deck = np.array([i for i, c in enumerate(copies) for _ in range(c)] + [-1] * rest, dtype=np.int8)
+    max_seen = seen_per_turn[-1]
+    seen_index = np.array(seen_per_turn) - 1
+
+    successes = np.zeros(len(seen_per_turn), dtype=np.int64)
+    trials = 0
+    started = time.perf_counter()
+    while trials < max_trials:
+        size = min(batch_size, max_trials - trials)
+        decks = rng.permuted(np.broadcast_to(deck, (size, deck_size)), axis=1)
+        shields = decks[:, :SHIELD_COUNT]
+        drawn = decks[:, SHIELD_COUNT:SHIELD_COUNT + max_seen]
+
+        ok = np.ones((size, len(seen_per_turn)), dtype=bool)
+        for term in terms:
+            if term.zone == "shields":
+                count = np.isin(shields, term.cards).sum(axis=1)
+                ok &= (count >= term.count)[:, None]
+            else:
+                # 見た枚数ごとの累計枚数から、各ターン時点の枚数を取り出す
+                cumulative = np.cumsum(np.isin(drawn, term.cards), axis=1, dtype=np.int16)
+                ok &= cumulative[:, seen_index] >= term.count
+        successes += ok.sum(axis=0)
+        trials += size
+        if time.perf_counter() - started >= time_budget:
+            break
+
+    return SimulationResult(
+        trials=trials,
+        elapsed=time.perf_counter() - started,
+        successes=[(turn, seen, int(hits)) for turn, (seen, hits) in enumerate(zip(seen_per_turn, successes))]
+    )
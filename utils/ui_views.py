@@ -4,11 +4,8 @@ from typing import Optional
 import re
 import asyncio
 import random
-import psycopg2
-import psycopg2.extras
 
 from config import PROFILE_ITEMS
-from utils.database import get_db_connection, get_user_profile
 
 # =====================
 # プロフィール登録モーダル
@@ -42,19 +39,7 @@ class AchievementModal(ui.Modal, title='実績情報の登録'):
         updates["achievements"] = self.achievements.value or None
 
         try:
-            conn = get_db_connection()
-            with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO users (user_id, top100, nd_rate, ad_rate, achievements)
-                    VALUES (%s,%s,%s,%s,%s)
-                    ON CONFLICT (user_id) DO UPDATE SET
-                        top100=EXCLUDED.top100,
-                        nd_rate=EXCLUDED.nd_rate,
-                        ad_rate=EXCLUDED.ad_rate,
-                        achievements=EXCLUDED.achievements
-                """, (self.target_user.id, *updates.values()))
-            conn.commit()
-            conn.close()
+            await interaction.client.user_repo.save_achievements(self.target_user.id, **updates)
             await interaction.response.send_message("更新したぞ！", ephemeral=True)
         except Exception as e:
             print(e)
@@ -71,11 +56,11 @@ class RegisterView(ui.View):
 
     @ui.button(label="実績を登録", style=discord.ButtonStyle.primary)
     async def register_achievements(self, interaction: Interaction, _):
-        data = get_user_profile(self.target_user.id)
+        data = await interaction.client.user_repo.get_profile(self.target_user.id)
         await interaction.response.send_modal(AchievementModal(self.target_user, data))
 
 # =====================
-# スロット View（429対策済）
+# スロット View（回転表示はBot共通の AnimationScheduler が描画する）
 # =====================
 
 class SlotView(ui.View):
@@ -84,89 +69,190 @@ class SlotView(ui.View):
         self.user_id = user_id
         self.bet = bet
         self.interaction = interaction
+        self.channel_id = interaction.channel_id
         self.message: Optional[discord.Message] = None
+        self.embed: Optional[discord.Embed] = None
+        self.finished = False
+        self._final_embed: Optional[discord.Embed] = None
+        # リールの状態の変更と描画をスケジューラとストップで交互に行うためのロック（編集の通信中は持たない）
+        self._edit_lock = asyncio.Lock()
+        # ストップのたびに増える。通信中のフレームがストップより古い状態を描いたかの判定に使う
+        self._version = 0
 
         self.reels = ['🍒','🍊','🍇','🔔','７','🍉']
         self.result = ['🎰','🎰','🎰']
         self.active_reel = 0
-        self.spin_task: Optional[asyncio.Task] = None
 
         for i in range(3):
-            self.add_item(ui.Button(
+            button = ui.Button(
                 label=f"ストップ {i+1}",
                 style=discord.ButtonStyle.primary,
                 disabled=(i != 0),
-                custom_id=str(i),
-                callback=self.stop_callback
-            ))
+                custom_id=str(i)
+            )
+            button.callback = self.stop_callback
+            self.add_item(button)
+
+    @property
+    def animations(self):
+        return self.interaction.client.animations
 
     async def start(self):
         self.message = await self.interaction.original_response()
-        self.spin_task = asyncio.create_task(self.spin())
+        self.embed = self.message.embeds[0]
+        self.animations.register(self)
 
-    async def safe_edit(self):
-        if not self.message:
-            return
-        try:
-            embed = self.message.embeds[0]
-            embed.description = f"**> `{' | '.join(self.result)}` <**"
-            await self.message.edit(embed=embed, view=self)
-        except (discord.NotFound, discord.HTTPException):
-            pass
+    def _render(self) -> discord.Embed:
+        self.embed.description = f"**> `{' | '.join(self.result)}` <**"
+        return self.embed
 
-    async def spin(self):
-        while True:
+    async def animate(self) -> bool:
+        """スケジューラから呼ばれ、回転中のリールを1コマ進めて描画する。"""
+        async with self._edit_lock:
+            if self.finished or self.is_finished():
+                return False
             self.result[self.active_reel] = random.choice(self.reels)
-            await self.safe_edit()
-            await asyncio.sleep(1.2)  # ← 429防止の要
-            if not self.spin_task or self.spin_task.cancelled():
-                break
+            embed, version = self._render(), self._version
+        # 編集の送信内容は呼んだ時点で確定する。429で待たされてもストップの応答は止めない
+        try:
+            await self.message.edit(embed=embed, view=self)
+        except discord.NotFound:
+            return False
+        if self._version != version:
+            # 通信中にストップが押され、このフレームがストップの応答より後に届いたかもしれない。
+            # 回転中なら次のフレームが最新の状態で描き直す。終了していたら結果を描き直す
+            if self.finished:
+                if self._final_embed is not None:
+                    try:
+                        await self.message.edit(embed=self._final_embed, view=None)
+                    except discord.HTTPException:
+                        pass
+                return False
+        return True
 
     async def stop_callback(self, interaction: Interaction):
         if interaction.user.id != self.user_id:
             await interaction.response.send_message("君のスロットじゃないぞ！", ephemeral=True)
             return
 
-        await interaction.response.defer()
+        async with self._edit_lock:
+            already_finished = self.finished
+            if not already_finished:
+                self.result[self.active_reel] = random.choice(self.reels)
+                self.active_reel += 1
+                self._version += 1
+                if self.active_reel >= 3:
+                    self.finished = True
+                else:
+                    for i, item in enumerate(self.children):
+                        item.disabled = (i != self.active_reel)
+                    embed = self._render()
 
-        if self.spin_task:
-            self.spin_task.cancel()
+        if already_finished:
+            await interaction.response.defer()
+        elif self.finished:
+            await self.finish(interaction)
+        else:
+            # インタラクション応答で編集するので、チャンネルの編集予算を待たずに即反映される
+            await interaction.response.edit_message(embed=embed, view=self)
+            self.animations.touch(self)
 
-        self.result[self.active_reel] = random.choice(self.reels)
-
-        self.active_reel += 1
-        if self.active_reel >= 3:
-            await self.finish()
-            return
-
-        for i, item in enumerate(self.children):
-            item.disabled = (i != self.active_reel)
-
-        self.spin_task = asyncio.create_task(self.spin())
-        await self.safe_edit()
-
-    async def finish(self):
+    async def finish(self, interaction: Interaction):
+        self.finished = True
+        self.animations.unregister(self)
+        self.stop()
         payout = self.bet * (10 if len(set(self.result)) == 1 else 0)
 
         try:
-            conn = get_db_connection()
-            with conn.cursor() as cur:
-                cur.execute(
-                    "UPDATE users SET credits = credits + %s WHERE user_id=%s RETURNING credits",
-                    (payout, self.user_id)
-                )
-                credits = cur.fetchone()[0]
-            conn.commit()
-            conn.close()
-
-            embed = self.message.embeds[0]
+            credits = await self.interaction.client.user_repo.add_credits(self.user_id, payout, reason="slot_payout")
+
+            embed = self._render()
             embed.clear_fields()
             embed.add_field(name="結果", value=" | ".join(self.result))
             embed.add_field(name="配当", value=f"{payout} GTV")
             embed.add_field(name="残高", value=f"{credits} GTV")
+            self._final_embed = embed
 
-            self.stop()
-            await self.message.edit(embed=embed, view=None)
+            await interaction.response.edit_message(embed=embed, view=None)
 
         except Exception as e:
             print(e)
+
+    async def on_timeout(self):
+        self.finished = True
+        self.animations.unregister(self)
+
+# =====================
+# ランキング View（ページ送り）
+# =====================
+
+class LeaderboardView(ui.View):
+    PAGE_SIZE = 10
+    RANK_EMOJIS = {1: '🥇', 2: '🥈', 3: '🥉'}
+
+    def __init__(self, user_repo, guild: Optional[discord.Guild]):
+        super().__init__(timeout=180)
+        self.user_repo = user_repo
+        self.guild = guild
+        self.page = 0
+        self.total = 0
+        self.highlight_user_id: Optional[int] = None
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-self.total // self.PAGE_SIZE))
+
+    async def build_embed(self) -> Optional[discord.Embed]:
+        """現在のページのEmbedを作る。誰もクレジットを持っていなければNone。"""
+        rows, self.total = await self.user_repo.leaderboard_page(self.page, self.PAGE_SIZE)
+        if self.total == 0:
+            return None
+        if not rows and self.page > 0:
+            self.page = self.page_count - 1
+            rows, self.total = await self.user_repo.leaderboard_page(self.page, self.PAGE_SIZE)
+
+        description = []
+        for record in rows:
+            member = self.guild.get_member(record['user_id']) if self.guild else None
+            name = member.display_name if member else "不明なユーザー"
+            rank_emoji = self.RANK_EMOJIS.get(record['rank'], f"`{record['rank']}.`")
+            line = f"{rank_emoji} **{name}** - `{record['credits']}` GTV"
+            if record['user_id'] == self.highlight_user_id:
+                line = f"▶ {line}"
+            description.append(line)
+
+        embed = discord.Embed(title="🏆 GTVクレジット ランキング 🏆", color=discord.Color.gold(), description="\n".join(description))
+        embed.set_footer(text=f"{self.page + 1} / {self.page_count} ページ（{self.total}人）")
+
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+        return embed
+
+    async def _show(self, interaction: Interaction):
+        embed = await self.build_embed()
+        if embed is None:
+            await interaction.response.edit_message(content="まだ誰もGTVクレジットを持っていないみたいだな。", embed=None, view=None)
+            return
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: Interaction, _):
+        self.page = max(0, self.page - 1)
+        await self._show(interaction)
+
+    @ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, _):
+        self.page += 1
+        await self._show(interaction)
+
+    @ui.button(label="自分の順位", style=discord.ButtonStyle.primary)
+    async def my_rank(self, interaction: Interaction, _):
+        position = await self.user_repo.leaderboard_position(interaction.user.id)
+        if position is None:
+            await interaction.response.send_message("君はまだランキングに載っていないぞ。GTVクレジットを集めよう！", ephemeral=True)
+            return
+        rank, credits = position
+        self.page = (rank - 1) // self.PAGE_SIZE
+        self.highlight_user_id = interaction.user.id
+        await self._show(interaction)
+        await interaction.followup.send(f"君の順位は **{rank}位** (`{credits}` GTV) だぞ！", ephemeral=True)